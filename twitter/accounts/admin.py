@@ -1,7 +1,17 @@
 from django.contrib import admin
-from .models import Profile, Reply, Tweet, ProfileImage, Likes, Vote, Choice, Question
+from .models import (
+    Profile,
+    Reply,
+    Tweet,
+    ProfileImage,
+    Likes,
+    Vote,
+    Choice,
+    Question,
+    Job,
+)
+from . import jobs
 from django.contrib.auth import get_user_model
-from mptt.admin import MPTTModelAdmin
 
 
 class ProfileImageAdmin(admin.ModelAdmin):
@@ -55,8 +65,21 @@ class LikesAdmin(admin.ModelAdmin):
     list_display = ("user", "tweet", "reply")
 
 
+@admin.action(description="Retry selected dead jobs")
+def retry_jobs(modeladmin, request, queryset):
+    retried = jobs.retry(queryset)
+    modeladmin.message_user(request, f"{retried} dead jobs queued again.")
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("task", "queue", "status", "priority", "attempts", "run_at")
+    list_filter = ["status", "queue"]
+    search_fields = ["task"]
+    actions = [retry_jobs]
+
+
 admin.site.register(Tweet, TweetAdmin)
-admin.site.register(Reply, MPTTModelAdmin)
+admin.site.register(Reply)
 admin.site.register(get_user_model(), PlayerAdmin)
 admin.site.register(Profile, ProfileAdmin)
 admin.site.register(ProfileImage, ProfileImageAdmin)
@@ -64,3 +87,4 @@ admin.site.register(Vote, VoteAdmin)
 admin.site.register(Likes, LikesAdmin)
 admin.site.register(Question)
 admin.site.register(Choice)
+admin.site.register(Job, JobAdmin)
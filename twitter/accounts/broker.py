@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import BrokerEvent
+
+
+class LocalBackend:
+    """
+    Delivers straight to this process's subscribers.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, channel, message):
+        self.broker.deliver(channel, message)
+
+    def start(self):
+        pass
+
+
+class DatabaseBackend:
+    """
+    Shares events between workers through the BrokerEvent table, a local
+    stand-in for Redis pub/sub: publishing inserts a row and every process
+    with subscribers polls for rows newer than the last one it delivered.
+    """
+
+    def __init__(self, broker, poll_interval=0.2, retention=60):
+        self.broker = broker
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._poller = None
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        BrokerEvent.objects.create(channel=channel, message=message)
+
+    def start(self):
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(
+                    target=self._run, name="broker-poller", daemon=True
+                )
+                self._poller.start()
+
+    def _run(self):
+        last_id = BrokerEvent.objects.order_by("-id").values_list("id", flat=True)
+        last_id = last_id.first() or 0
+        pruned = time.monotonic()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                events = BrokerEvent.objects.filter(id__gt=last_id).order_by("id")
+                for event in events.values_list("id", "channel", "message"):
+                    last_id, channel, message = event
+                    self.broker.deliver(channel, message)
+                if time.monotonic() - pruned > self.retention:
+                    cutoff = timezone.now() - timedelta(seconds=self.retention)
+                    BrokerEvent.objects.filter(created_at__lt=cutoff).delete()
+                    pruned = time.monotonic()
+            except DatabaseError:
+                pass
+            finally:
+                close_old_connections()
+
+
+class Broker:
+    """
+    In-process pub/sub for GraphQL subscriptions. `publish` may be called
+    from any thread; each subscriber gets its own asyncio queue on the loop
+    it subscribed from. The backend decides how a published message
+    reaches the subscribers of every worker.
+    """
+
+    def __init__(self, backend="accounts.broker.LocalBackend", queue_size=100):
+        self.backend = import_string(backend)(self)
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        self.backend.publish(channel, message)
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, message)
+            except RuntimeError:
+                # the subscriber's loop closed before it could unsubscribe
+                pass
+
+    def _offer(self, queue, message):
+        # a subscriber that stopped reading loses messages rather than memory
+        if not queue.full():
+            queue.put_nowait(message)
+
+    async def subscribe(self, *channels):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        self.backend.start()
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(subscriber)
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self._lock:
+                for channel in channels:
+                    self._subscribers[channel].discard(subscriber)
+                    if not self._subscribers[channel]:
+                        del self._subscribers[channel]
+
+
+broker = Broker(
+    backend=getattr(settings, "BROKER_BACKEND", "accounts.broker.LocalBackend"),
+)
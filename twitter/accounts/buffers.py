@@ -0,0 +1,128 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from .caching import entity_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    Write-behind aggregation of counter deltas.
+
+    Deltas are summed per (model, field, pk) in memory and written with one
+    UPDATE per (model, field) once `max_pending` deltas are queued or
+    `flush_interval` seconds have passed, so a hot row takes one write per
+    flush instead of one per like.
+    """
+
+    def __init__(self, enabled=True, flush_interval=1.0, max_pending=500):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._flushing = {}
+        self._queued = 0
+        self._last_flush = time.monotonic()
+        self._flusher = None
+
+    def add(self, model, pk, **deltas):
+        if pk is None:
+            return
+        with self._lock:
+            for field, delta in deltas.items():
+                self._pending[(model, field)][pk] += delta
+            self._queued += 1
+            due = (
+                self._queued >= self.max_pending
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        self._ensure_flusher()
+        if due:
+            self.flush()
+
+    def pending(self, model, pk, field):
+        # deltas being flushed still count until their UPDATE has run
+        with self._lock:
+            return sum(
+                deltas.get((model, field), {}).get(pk, 0)
+                for deltas in (self._pending, self._flushing)
+            )
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                self._flushing = self._pending
+                self._pending = defaultdict(lambda: defaultdict(int))
+                self._queued = 0
+                self._last_flush = time.monotonic()
+            try:
+                self._write(self._flushing)
+            except Exception:
+                # keep the deltas for the next flush, on top of any added since
+                with self._lock:
+                    for key, deltas in self._flushing.items():
+                        for pk, delta in deltas.items():
+                            self._pending[key][pk] += delta
+                    self._flushing = {}
+                    self._queued += 1
+                raise
+            with self._lock:
+                self._flushing = {}
+
+    def _write(self, pending):
+        written = []
+        # all or nothing, so a retried flush can't apply a delta twice
+        with transaction.atomic():
+            for (model, field), deltas in pending.items():
+                deltas = {pk: delta for pk, delta in deltas.items() if delta}
+                if not deltas:
+                    continue
+                delta = Case(
+                    *[When(pk=pk, then=Value(value)) for pk, value in deltas.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+                model.objects.filter(pk__in=deltas).update(
+                    **{field: Greatest(F(field) + delta, 0)}
+                )
+                written.append((model, deltas))
+        for model, deltas in written:
+            entity_cache.invalidate(model, *deltas)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(
+                    target=self._run_flusher, name="counter-buffer", daemon=True
+                )
+                self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._queued:
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("counter flush failed, retrying")
+                finally:
+                    close_old_connections()
+
+
+counter_buffer = CounterBuffer(
+    enabled=getattr(settings, "COUNTER_BUFFER_ENABLED", True),
+    flush_interval=getattr(settings, "COUNTER_BUFFER_FLUSH_INTERVAL", 1.0),
+    max_pending=getattr(settings, "COUNTER_BUFFER_MAX_PENDING", 500),
+)
+atexit.register(counter_buffer.flush)
@@ -0,0 +1,179 @@
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from . import identity
+
+
+class EntityCache:
+    """
+    Read-through cache of model instances by primary key.
+
+    L1 is a per-process LRU whose entries expire after `l1_ttl` seconds, L2
+    is the Django cache backend `alias`. Every key has a version stamp in
+    L2 that invalidation bumps, so an entry rebuilt from a read that raced
+    a write is never served. Only one worker rebuilds a missing key at a
+    time, the others wait up to `lock_wait` seconds for it.
+
+    L2, and with it the version stamps and the rebuild lock, is only shared
+    between processes when the backend is, e.g. Redis; the LocMemCache
+    Django falls back to is per process. An invalidation drops the L1 entry
+    of the process that made it only, so other processes may serve the old
+    row from their L1 for up to `l1_ttl` seconds.
+
+    `private_fields` maps a model label to fields left out of the cached
+    copy, such as password hashes; they are deferred and loaded from the
+    database if an instance reads them.
+    """
+
+    def __init__(
+        self,
+        enabled=True,
+        alias="default",
+        l1_size=1000,
+        l1_ttl=5.0,
+        l2_ttl=300,
+        lock_ttl=5,
+        lock_wait=0.5,
+        private_fields=None,
+    ):
+        self.enabled = enabled
+        self.alias = alias
+        self.l1_size = l1_size
+        self.l1_ttl = l1_ttl
+        self.l2_ttl = l2_ttl
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.private_fields = private_fields or {}
+        self._lock = threading.Lock()
+        self._l1 = OrderedDict()
+        self._stats = Counter()
+
+    @property
+    def l2(self):
+        return caches[self.alias]
+
+    def _key(self, model, pk):
+        return f"entity:{model._meta.label_lower}:{pk}"
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["l1_size"] = len(self._l1)
+        stats["l2_backend"] = type(self.l2).__name__
+        return stats
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry[1]
+
+    def _l1_set(self, key, blob):
+        with self._lock:
+            self._l1[key] = (time.monotonic() + self.l1_ttl, blob)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_size:
+                self._l1.popitem(last=False)
+
+    def _l2_get(self, key):
+        found = self.l2.get_many([key, f"{key}:v"])
+        entry, version = found.get(key), found.get(f"{key}:v", 0)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return None
+
+    def get(self, model, pk):
+        if not self.enabled:
+            return model.objects.get(pk=pk)
+        pk = model._meta.pk.to_python(pk)
+        key = self._key(model, pk)
+        blob = self._l1_get(key)
+        if blob is not None:
+            self._count("l1_hits")
+            return pickle.loads(blob)
+        blob = self._l2_get(key)
+        if blob is not None:
+            self._count("l2_hits")
+            self._l1_set(key, blob)
+            return pickle.loads(blob)
+        self._count("misses")
+        return self._rebuild(model, pk, key)
+
+    def _rebuild(self, model, pk, key):
+        lock = f"{key}:lock"
+        deadline = time.monotonic() + self.lock_wait
+        while not self.l2.add(lock, 1, self.lock_ttl):
+            if time.monotonic() >= deadline:
+                # the rebuilding worker is slow, don't queue behind it
+                self._count("lock_timeouts")
+                return model.objects.get(pk=pk)
+            time.sleep(0.01)
+            blob = self._l2_get(key)
+            if blob is not None:
+                self._count("waited_hits")
+                self._l1_set(key, blob)
+                return pickle.loads(blob)
+        try:
+            version = self.l2.get(f"{key}:v", 0)
+            private = self.private_fields.get(model._meta.label_lower, ())
+            obj = model.objects.defer(*private).get(pk=pk)
+            blob = pickle.dumps(obj)
+            self.l2.set(key, (version, blob), self.l2_ttl)
+            self._l1_set(key, blob)
+            self._count("rebuilds")
+            return obj
+        finally:
+            self.l2.delete(lock)
+
+    def _invalidate(self, keys):
+        with self._lock:
+            for key in keys:
+                self._l1.pop(key, None)
+        for key in keys:
+            self.l2.delete(key)
+            try:
+                self.l2.incr(f"{key}:v")
+            except ValueError:
+                self.l2.set(f"{key}:v", 1, self.l2_ttl)
+
+    def invalidate(self, model, *pks):
+        if not pks:
+            return
+        identity.discard(model, *pks)
+        if not self.enabled:
+            return
+        keys = [self._key(model, pk) for pk in pks]
+        self._count("invalidations")
+        self._invalidate(keys)
+        # again once committed, in case a reader cached the old row meanwhile
+        transaction.on_commit(lambda: self._invalidate(keys))
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+            self._stats.clear()
+
+
+entity_cache = EntityCache(
+    enabled=getattr(settings, "ENTITY_CACHE_ENABLED", True),
+    alias=getattr(settings, "ENTITY_CACHE_ALIAS", "default"),
+    l1_size=getattr(settings, "ENTITY_CACHE_L1_SIZE", 1000),
+    l1_ttl=getattr(settings, "ENTITY_CACHE_L1_TTL", 5.0),
+    l2_ttl=getattr(settings, "ENTITY_CACHE_L2_TTL", 300),
+    private_fields=getattr(
+        settings, "ENTITY_CACHE_PRIVATE_FIELDS", {"accounts.user": ["password"]}
+    ),
+)
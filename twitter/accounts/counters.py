@@ -0,0 +1,109 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from .buffers import counter_buffer
+from .caching import entity_cache
+
+
+def _expressions(deltas):
+    return {field: Greatest(F(field) + delta, 0) for field, delta in deltas.items()}
+
+
+def adjust(model, pk, **deltas):
+    if pk is None:
+        return
+    model.objects.filter(pk=pk).update(**_expressions(deltas))
+    entity_cache.invalidate(model, pk)
+
+
+def adjust_many(model, pks, condition=None, **deltas):
+    model.objects.filter(condition or Q(), pk__in=pks).update(**_expressions(deltas))
+    entity_cache.invalidate(model, *pks)
+
+
+def adjust_buffered(model, pk, **deltas):
+    if pk is None:
+        return
+    if not counter_buffer.enabled:
+        return adjust(model, pk, **deltas)
+    transaction.on_commit(lambda: counter_buffer.add(model, pk, **deltas))
+
+
+class CounterFields:
+    """
+    Model mixin for rows whose `counter_fields` only change through the
+    relative UPDATEs above. Saving a row that was already stored leaves
+    them out unless `update_fields` names them, so an edit can't write back
+    the counts it was read with over increments made since.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        return super().save(*args, **kwargs)
+
+
+def current(instance, field):
+    return getattr(instance, field) + counter_buffer.pending(
+        type(instance), instance.pk, field
+    )
+
+
+def counter_specs(get_model=apps.get_model):
+    User = get_model("accounts", "User")
+    Tweet = get_model("accounts", "Tweet")
+    Reply = get_model("accounts", "Reply")
+    Choice = get_model("accounts", "Choice")
+    Likes = get_model("accounts", "Likes")
+    Vote = get_model("accounts", "Vote")
+    Follow = User.followers.through
+    return [
+        (Tweet, "likes_count", Likes, "tweet"),
+        (Tweet, "replies_count", Reply, "tweet"),
+        (Reply, "likes_count", Likes, "reply"),
+        (Choice, "votes_count", Vote, "choice"),
+        (User, "tweets_count", Tweet, "user"),
+        (User, "followers_count", Follow, "from_user"),
+        (User, "following_count", Follow, "to_user"),
+    ]
+
+
+def recount(model, field, source, fk, chunk_size=1000, condition=None):
+    total = (
+        source.objects.filter(condition or Q(), **{fk: OuterRef("pk")})
+        .order_by()
+        .values(fk)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    pks = model.objects.order_by("pk").values_list("pk", flat=True)
+    last_pk, updated = None, 0
+    while True:
+        chunk = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return updated
+        updated += model.objects.filter(pk__in=chunk).update(
+            **{field: Coalesce(Subquery(total), 0)}
+        )
+        last_pk = chunk[-1]
+
+
+def recount_all(get_model=apps.get_model, chunk_size=1000):
+    for model, field, source, fk in counter_specs(get_model):
+        yield model, field, recount(model, field, source, fk, chunk_size)
@@ -0,0 +1,37 @@
+from django.db import IntegrityError, transaction
+from .models import Likes, Vote
+
+# Uniqueness is enforced by the (user, tweet), (user, reply) and
+# (user, choice) constraints, so these helpers never check before writing.
+# A second like or vote is a no-op that returns the existing row.
+
+
+def _insert_once(model, **fields):
+    try:
+        with transaction.atomic():
+            return model.objects.create(**fields), True
+    except IntegrityError:
+        # only a duplicate is a no-op, a missing user or target is raised
+        existing = model.objects.filter(**fields).first()
+        if existing is None:
+            raise
+        return existing, False
+
+
+def like(user, tweet=None, reply=None):
+    return _insert_once(Likes, user=user, tweet=tweet, reply=reply)
+
+
+def unlike(user, tweet=None, reply=None):
+    target = {"tweet": tweet} if tweet is not None else {"reply": reply}
+    deleted, _ = Likes.objects.filter(user=user, **target).delete()
+    return Likes(user=user, tweet=tweet, reply=reply), bool(deleted)
+
+
+def vote(user, choice):
+    return _insert_once(Vote, user=user, choice=choice)
+
+
+def unvote(user, choice):
+    deleted, _ = Vote.objects.filter(user=user, choice=choice).delete()
+    return Vote(user=user, choice=choice), bool(deleted)
@@ -0,0 +1,76 @@
+from .models import Reply, Tweet, User
+
+# NewsFeed.verb values, entries without a verb carry their own description
+TWEETED = "tweet"
+REPLIED = "reply"
+LIKED = "like"
+FOLLOWED = "follow"
+MENTIONED = "mention"
+
+SNIPPET_LENGTH = 30
+
+
+def target(obj):
+    """
+    Return the (object_type, object_id) a NewsFeed entry stores for `obj`.
+    """
+    if obj is None:
+        return "", None
+    return ("tweet" if isinstance(obj, Tweet) else "reply"), obj.pk
+
+
+def actors(name, count):
+    if count == 1:
+        return name
+    others = "other" if count == 2 else "others"
+    return f"{name} and {count - 1} {others}"
+
+
+def _describe(entry, usernames, objects):
+    who = actors(usernames.get(entry.from_user_id, ""), entry.actor_count)
+    if entry.verb == FOLLOWED:
+        return f"{who} followed you"
+    obj = objects.get((entry.object_type, entry.object_id))
+    if obj is None:
+        text = "[deleted]"
+    elif entry.verb == REPLIED and obj.parent_id is not None:
+        text = f"{obj.context[:SNIPPET_LENGTH]} to {usernames.get(entry.to_user_id)}..."
+    else:
+        text = f"{obj.context[:SNIPPET_LENGTH]}..."
+    if entry.verb == TWEETED:
+        return f"{who} tweeted {text}"
+    if entry.verb == MENTIONED:
+        return f"{who} mentioned you in {text}"
+    if entry.verb == LIKED:
+        return f"{who} liked your {entry.object_type} {text}"
+    return f"{who} replied with {text}"
+
+
+def render(entries):
+    """
+    Fill in the description of every typed entry in `entries` from current
+    usernames and texts, with one query per model for the whole batch, and
+    return `entries`.
+    """
+    typed = [entry for entry in entries if entry.verb]
+    if not typed:
+        return entries
+    user_ids, ids = set(), {"tweet": set(), "reply": set()}
+    for entry in typed:
+        user_ids.add(entry.from_user_id)
+        if entry.verb == REPLIED:
+            user_ids.add(entry.to_user_id)
+        if entry.object_type in ids:
+            ids[entry.object_type].add(entry.object_id)
+    usernames = dict(User.objects.filter(id__in=user_ids).values_list("id", "username"))
+    objects = {}
+    for object_type, model, fields in (
+        ("tweet", Tweet, ["context"]),
+        ("reply", Reply, ["context", "parent"]),
+    ):
+        if ids[object_type]:
+            found = model.objects.only(*fields).in_bulk(ids[object_type])
+            objects.update(((object_type, pk), obj) for pk, obj in found.items())
+    for entry in typed:
+        entry.description = _describe(entry, usernames, objects)
+    return entries
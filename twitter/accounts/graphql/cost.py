@@ -0,0 +1,174 @@
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    ValueNode,
+    VariableNode,
+    get_named_type,
+    is_composite_type,
+    is_list_type,
+    value_from_ast,
+)
+from graphql.type import GraphQLNonNull
+from graphql.validation import ValidationRule
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+# fields that cost more than one row fetch, keyed by "Type.field"
+FIELD_WEIGHTS = {
+    "Query.searchTweets": 10,
+    "Query.conversation": 10,
+    "Query.home": 5,
+    "Query.trending": 2,
+    "Tweet.owner": 1,
+    "Reply.owner": 1,
+    "ReplyOfReply.owner": 1,
+    "Choice.votes": 1,
+    # conversation() builds the whole tree in one query
+    "ReplyThread.children": 0,
+}
+
+# how many items a list field without a `first` argument is assumed to return
+LIST_SIZES = {
+    "Query.trending": 10,
+}
+DEFAULT_LIST_SIZE = DEFAULT_PAGE_SIZE
+
+
+def _is_structural(type_name):
+    # connection wrappers add no queries of their own, the page size is
+    # charged on the field that returns the connection
+    return type_name == "PageInfo" or type_name.endswith(("Connection", "Edge"))
+
+
+class Estimate:
+    """
+    Static cost and depth of one operation. Every field that fetches
+    something costs its weight, and everything selected under a list is
+    charged once per item the list may hold.
+    """
+
+    def __init__(self, schema, fragments, variables=None):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+
+    def _argument(self, field, node, name):
+        for argument in node.arguments:
+            if argument.name.value != name:
+                continue
+            value = argument.value
+            if isinstance(value, VariableNode):
+                return self.variables.get(value.name.value)
+            if isinstance(value, ValueNode):
+                return value_from_ast(value, field.args[name].type)
+        return None
+
+    def _size(self, parent, field, node, key):
+        if "first" in field.args:
+            first = self._argument(field, node, "first")
+            if not isinstance(first, int) or first < 1:
+                return DEFAULT_PAGE_SIZE
+            return min(first, MAX_PAGE_SIZE)
+        field_type = field.type
+        if isinstance(field_type, GraphQLNonNull):
+            field_type = field_type.of_type
+        if not is_list_type(field_type) or _is_structural(parent.name):
+            return 1
+        return LIST_SIZES.get(key, DEFAULT_LIST_SIZE)
+
+    def _fields(self, parent, selection_set, seen):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent, selection
+            elif isinstance(selection, InlineFragmentNode):
+                scope = parent
+                if selection.type_condition is not None:
+                    scope = self.schema.get_type(selection.type_condition.name.value)
+                if scope is not None:
+                    yield from self._fields(scope, selection.selection_set, seen)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in seen:
+                    continue
+                scope = self.schema.get_type(fragment.type_condition.name.value)
+                if scope is not None:
+                    yield from self._fields(
+                        scope, fragment.selection_set, seen | {name}
+                    )
+
+    def measure(self, parent, selection_set, seen=frozenset()):
+        """
+        Return the (cost, depth) of a selection set on `parent`.
+        """
+        cost = depth = 0
+        for scope, node in self._fields(parent, selection_set, seen):
+            name = node.name.value
+            fields = getattr(scope, "fields", {})
+            if name.startswith("__") or name not in fields:
+                continue
+            field = fields[name]
+            named = get_named_type(field.type)
+            key = f"{scope.name}.{name}"
+            weight = FIELD_WEIGHTS.get(key)
+            if weight is None:
+                weight = int(
+                    is_composite_type(named) and not _is_structural(scope.name)
+                )
+            child_cost = child_depth = 0
+            if node.selection_set is not None and is_composite_type(named):
+                child_cost, child_depth = self.measure(named, node.selection_set, seen)
+            size = self._size(scope, field, node, key)
+            cost += weight + size * child_cost
+            depth = max(depth, child_depth + 1)
+        return cost, depth
+
+
+def limit_rule(max_cost, max_depth, variables, report):
+    """
+    Build a validation rule that rejects operations over `max_cost` or
+    `max_depth` and hands each operation's estimate to `report`.
+    """
+
+    class QueryCostRule(ValidationRule):
+        def enter_operation_definition(self, node, *_):
+            context = self.context
+            root = context.schema.get_root_type(node.operation)
+            if root is None:
+                return
+            fragments = {
+                definition.name.value: definition
+                for definition in context.document.definitions
+                if definition.kind == "fragment_definition"
+            }
+            estimate = Estimate(context.schema, fragments, variables)
+            cost, depth = estimate.measure(root, node.selection_set)
+            name = node.name.value if node.name else None
+            report(name, cost, depth)
+            if depth > max_depth:
+                self.report_error(
+                    GraphQLError(
+                        f"Query depth {depth} exceeds the limit of {max_depth}.",
+                        node,
+                        extensions={
+                            "code": "QUERY_TOO_DEEP",
+                            "depth": depth,
+                            "maxDepth": max_depth,
+                        },
+                    )
+                )
+            if cost > max_cost:
+                self.report_error(
+                    GraphQLError(
+                        f"Query cost {cost} exceeds the budget of {max_cost}.",
+                        node,
+                        extensions={
+                            "code": "QUERY_TOO_COSTLY",
+                            "cost": cost,
+                            "maxCost": max_cost,
+                        },
+                    )
+                )
+
+    return QueryCostRule
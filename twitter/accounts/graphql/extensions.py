@@ -0,0 +1,96 @@
+from contextlib import ExitStack
+from django.conf import settings
+from graphql import specified_rules
+from strawberry.extensions import Extension
+from .. import identity
+from . import persisted
+from .cost import limit_rule
+
+
+class IdentityMapExtension(Extension):
+    """
+    Share one identity map across an operation's resolvers when it runs
+    outside IdentityMapMiddleware, and report its savings under
+    `extensions` in DEBUG.
+    """
+
+    def on_request_start(self):
+        self._stack = ExitStack()
+        self.identity_map = self._stack.enter_context(identity.scope())
+
+    def on_request_end(self):
+        self._stack.close()
+
+    def get_results(self):
+        if not settings.DEBUG:
+            return {}
+        return {"identityMap": {"avoided": self.identity_map.avoided}}
+
+
+class QueryCostExtension(Extension):
+    """
+    Reject operations whose static cost or depth is over
+    GRAPHQL_MAX_COST or GRAPHQL_MAX_DEPTH before any resolver runs, and
+    report the cost of the ones that do run under `extensions`.
+    """
+
+    def on_request_start(self):
+        self.estimate = None
+        rule = limit_rule(
+            getattr(settings, "GRAPHQL_MAX_COST", 1000),
+            getattr(settings, "GRAPHQL_MAX_DEPTH", 10),
+            self.execution_context.variables,
+            self.report,
+        )
+        self.execution_context.validation_rules += (rule,)
+
+    def report(self, name, cost, depth):
+        wanted = self.execution_context.operation_name
+        if wanted is None or wanted == name:
+            self.estimate = {"cost": cost, "depth": depth}
+
+    def get_results(self):
+        if self.estimate is None:
+            return {}
+        return {
+            "cost": {
+                **self.estimate,
+                "maxCost": getattr(settings, "GRAPHQL_MAX_COST", 1000),
+                "maxDepth": getattr(settings, "GRAPHQL_MAX_DEPTH", 10),
+            }
+        }
+
+
+class DocumentCacheExtension(Extension):
+    """
+    Reuse the parsed AST of a query seen before, and skip the schema's
+    validation rules for one that already passed them. Rules added by
+    other extensions, like the cost limit, still run every time.
+    """
+
+    def on_request_start(self):
+        self.key = persisted.sha256(self.execution_context.query)
+        self.document = persisted.documents.get(self.key)
+
+    def on_parsing_start(self):
+        if self.document is not None and self.document.ast is not None:
+            self.execution_context.graphql_document = self.document.ast
+
+    def on_parsing_end(self):
+        ast = self.execution_context.graphql_document
+        if ast is not None and (self.document is None or self.document.ast is None):
+            self.document = persisted.documents.add(
+                self.key, self.execution_context.query, ast
+            )
+
+    def on_validation_start(self):
+        if self.document is not None and self.document.validated:
+            self.execution_context.validation_rules = tuple(
+                rule
+                for rule in self.execution_context.validation_rules
+                if rule not in specified_rules
+            )
+
+    def on_validation_end(self):
+        if self.document is not None and not self.execution_context.errors:
+            self.document.validated = True
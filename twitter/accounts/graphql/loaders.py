@@ -0,0 +1,103 @@
+import functools
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from strawberry.dataloader import DataLoader
+from .. import events, models, threads
+
+
+def by_id(model, keys):
+    objects = model.objects.in_bulk(keys)
+    return [objects.get(key) for key in keys]
+
+
+def grouped(queryset, field, keys):
+    groups = defaultdict(list)
+    for obj in queryset.filter(**{f"{field}__in": keys}):
+        groups[getattr(obj, field)].append(obj)
+    return [groups[key] for key in keys]
+
+
+def load_users(keys):
+    return by_id(models.User, keys)
+
+
+def load_questions(keys):
+    return by_id(models.Question, keys)
+
+
+def load_replies_by_tweet(keys):
+    return grouped(models.Reply.objects.all(), "tweet_id", keys)
+
+
+def load_choices_by_question(keys):
+    return grouped(models.Choice.objects.order_by("id"), "question_id", keys)
+
+
+def load_descriptions(entries):
+    return [entry.description for entry in events.render(list(entries))]
+
+
+def in_thread(fn):
+    """
+    Turn a sync ORM function into a coroutine function that runs it on the
+    default thread pool, so concurrent requests don't queue on Django's
+    single thread-sensitive executor. Pool threads keep their connection
+    between calls and drop it after an error.
+    """
+
+    def run(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            close_old_connections()
+            raise
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await sync_to_async(run, thread_sensitive=False)(*args, **kwargs)
+
+    return wrapper
+
+
+def load_tweets(keys):
+    return by_id(models.Tweet, keys)
+
+
+def load_replies(keys):
+    return by_id(models.Reply, keys)
+
+
+def load_choices(keys):
+    return by_id(models.Choice, keys)
+
+
+def load_profiles(keys):
+    return by_id(models.Profile, keys)
+
+
+def load_profile_images(keys):
+    return by_id(models.ProfileImage, keys)
+
+
+def loader(load_fn):
+    return DataLoader(load_fn=in_thread(load_fn))
+
+
+class Loaders:
+    """
+    Request-scoped DataLoaders, one batched query per field per request.
+    """
+
+    def __init__(self):
+        self.users = loader(load_users)
+        self.tweets = loader(load_tweets)
+        self.replies = loader(load_replies)
+        self.choices = loader(load_choices)
+        self.profiles = loader(load_profiles)
+        self.profile_images = loader(load_profile_images)
+        self.questions = loader(load_questions)
+        self.replies_by_tweet = loader(load_replies_by_tweet)
+        self.choices_by_question = loader(load_choices_by_question)
+        self.descendants = loader(threads.descendants)
+        self.descriptions = loader(load_descriptions)
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+from django.conf import settings
+from django.db import IntegrityError
+from ..models import PersistedQuery
+
+
+def sha256(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message, code, status=400):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.status = status
+
+    def as_response_data(self):
+        return {
+            "errors": [{"message": self.message, "extensions": {"code": self.code}}]
+        }
+
+
+@dataclass
+class Document:
+    query: str
+    ast: Optional[Any] = None
+    validated: bool = False
+    persisted: bool = False
+
+
+class DocumentCache:
+    """
+    Query documents keyed by their sha256, holding the text, the parsed AST
+    once something parsed it, whether it passed the schema's validation
+    rules and whether it is in the PersistedQuery allow-list. Allow-listed
+    documents are kept for good, so each is parsed once per process; the
+    rest, including hashes clients register on the fly, share a bounded
+    LRU.
+    """
+
+    def __init__(self, size=500):
+        self.size = size
+        self._lock = threading.Lock()
+        self._documents = OrderedDict()
+        self._persisted = {}
+
+    def get(self, key):
+        with self._lock:
+            document = self._persisted.get(key)
+            if document is not None:
+                return document
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def add(self, key, query, ast=None, persisted=False):
+        with self._lock:
+            document = self._persisted.get(key) or self._documents.get(key)
+            if document is None:
+                document = Document(query)
+            if ast is not None and document.ast is None:
+                document.ast = ast
+            if persisted or document.persisted:
+                document.persisted = True
+                self._documents.pop(key, None)
+                self._persisted[key] = document
+                return document
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.size:
+                self._documents.popitem(last=False)
+            return document
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._persisted.clear()
+
+
+documents = DocumentCache(size=getattr(settings, "GRAPHQL_DOCUMENT_CACHE_SIZE", 500))
+
+
+def lookup(key, persisted_only=False):
+    """
+    Return the query text for a hash, or None. Hashes registered on the fly
+    only count when `persisted_only` is false.
+    """
+    document = documents.get(key)
+    if document is not None and (document.persisted or not persisted_only):
+        return document.query
+    query = PersistedQuery.objects.filter(sha256=key).values_list("query", flat=True)
+    query = query.first()
+    if query is not None:
+        documents.add(key, query, persisted=True)
+    return query
+
+
+def register(query):
+    """
+    Add a query to the PersistedQuery allow-list, see
+    `manage.py register_persisted_queries`.
+    """
+    key = sha256(query)
+    try:
+        PersistedQuery.objects.get_or_create(sha256=key, defaults={"query": query})
+    except IntegrityError:
+        # registered concurrently by another request
+        pass
+    documents.add(key, query, persisted=True)
+    return key
+
+
+def resolve(data):
+    """
+    Fill in the query of a request body that only carries a persisted query
+    hash. A client sending a new hash with its query registers it in this
+    process's document cache only, never in the allow-list. With
+    GRAPHQL_PERSISTED_QUERIES_ONLY only allow-listed queries get through.
+    """
+    only_persisted = getattr(settings, "GRAPHQL_PERSISTED_QUERIES_ONLY", False)
+    extensions = data.get("extensions") or {}
+    if isinstance(extensions, str):
+        extensions = json.loads(extensions)
+    persisted = extensions.get("persistedQuery")
+    query = data.get("query")
+    if persisted is None:
+        if only_persisted and query is not None and lookup(sha256(query), True) is None:
+            raise PersistedQueryError(
+                "Only persisted queries are allowed.", "PERSISTED_QUERY_NOT_ALLOWED"
+            )
+        return data
+    if persisted.get("version", 1) != 1:
+        raise PersistedQueryError(
+            "Unsupported persisted query version.", "PERSISTED_QUERY_NOT_SUPPORTED"
+        )
+    key = persisted.get("sha256Hash")
+    if query is None:
+        query = lookup(key, only_persisted) if key else None
+        if query is None:
+            # clients retry with the full query after this exact message
+            raise PersistedQueryError(
+                "PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND", status=200
+            )
+        return {**data, "query": query}
+    if sha256(query) != key:
+        raise PersistedQueryError(
+            "provided sha does not match query", "PERSISTED_QUERY_HASH_MISMATCH"
+        )
+    if lookup(key, only_persisted) is None:
+        if only_persisted:
+            raise PersistedQueryError(
+                "Only persisted queries are allowed.", "PERSISTED_QUERY_NOT_ALLOWED"
+            )
+        documents.add(key, query)
+    return data
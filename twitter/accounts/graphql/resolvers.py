@@ -1,72 +1,197 @@
 import typing
+from django.core.exceptions import ValidationError
 from django.utils import timezone
-from .types import Tweet
-from .. import models
+from .types import (
+    Connection,
+    Edge,
+    PageInfo,
+    Tweet,
+    User,
+    Reply,
+    NewsFeed,
+    ReplyThread,
+    Trend,
+)
+from .. import inbox, models, search, tags, threads, timelines, trends
+from ..pagination import paginate
+from .loaders import in_thread
 import strawberry
+from strawberry.types import Info
 
 
-def users():
-    return models.User.objects.all()
+def viewer(info) -> models.User:
+    """
+    The user the request is authenticated as, for fields scoped to their
+    own data. Call it on a worker thread, it may load the user.
+    """
+    user = info.context.request.user
+    if not user.is_authenticated:
+        raise ValidationError("authentication required")
+    return user
 
 
+def connection(queryset, first=None, after=None, before=None) -> Connection:
+    return page_connection(paginate(queryset, first=first, after=after, before=before))
+
+
+def page_connection(page) -> Connection:
+    return Connection(
+        page_info=PageInfo(
+            has_next_page=page.has_next,
+            has_previous_page=page.has_previous,
+            start_cursor=page.start_cursor,
+            end_cursor=page.end_cursor,
+        ),
+        edges=[Edge(cursor=page.cursor_for(item), node=item) for item in page.items],
+    )
+
+
+@in_thread
+def users(
+    first: typing.Optional[int] = None,
+    after: typing.Optional[str] = None,
+    before: typing.Optional[str] = None,
+) -> Connection[User]:
+    return connection(models.User.objects.all(), first, after, before)
+
+
+@in_thread
 def user(id: strawberry.ID):
     return models.User.objects.get(id=id)
 
 
+@in_thread
 def profiles():
-    return models.Profile.objects.all()
+    return list(models.Profile.objects.all())
 
 
+@in_thread
 def profile(id: strawberry.ID):
     return models.Profile.objects.get(id=id)
 
 
-def tweets():
-    return models.Tweet.objects.filter(created_at__lte=timezone.now())
+@in_thread
+def tweets(
+    first: typing.Optional[int] = None,
+    after: typing.Optional[str] = None,
+    before: typing.Optional[str] = None,
+) -> Connection[Tweet]:
+    queryset = models.Tweet.objects.filter(created_at__lte=timezone.now())
+    return connection(queryset, first, after, before)
+
+
+@in_thread
+def search_tweets(
+    query: str,
+    first: typing.Optional[int] = None,
+    after: typing.Optional[str] = None,
+    before: typing.Optional[str] = None,
+) -> Connection[Tweet]:
+    return page_connection(
+        search.search(query, models.Tweet, first=first, after=after, before=before)
+    )
+
 
+@in_thread
+def tagged_tweets(
+    tag: str,
+    first: typing.Optional[int] = None,
+    after: typing.Optional[str] = None,
+    before: typing.Optional[str] = None,
+) -> Connection[Tweet]:
+    return connection(tags.tagged(tag), first, after, before)
 
+
+@in_thread
+def mentioned_tweets(
+    user_id: strawberry.ID,
+    first: typing.Optional[int] = None,
+    after: typing.Optional[str] = None,
+    before: typing.Optional[str] = None,
+) -> Connection[Tweet]:
+    return connection(tags.mentioning(user_id), first, after, before)
+
+
+@in_thread
 def tweet(id: strawberry.ID):
     return models.Tweet.objects.get(id=id)
 
 
-def replies():
-    return models.Reply.objects.filter(created_at__lte=timezone.now())
+@in_thread
+def replies(
+    first: typing.Optional[int] = None,
+    after: typing.Optional[str] = None,
+    before: typing.Optional[str] = None,
+) -> Connection[Reply]:
+    queryset = models.Reply.objects.filter(created_at__lte=timezone.now())
+    return connection(queryset, first, after, before)
 
 
+@in_thread
 def reply(id: strawberry.ID):
     return models.Reply.objects.get(id=id)
 
 
+@in_thread
+def conversation(
+    tweet_id: strawberry.ID,
+    max_depth: typing.Optional[int] = None,
+    max_children: typing.Optional[int] = None,
+) -> typing.List[ReplyThread]:
+    return threads.conversation(tweet_id, max_depth, max_children)
+
+
+@in_thread
 def questions():
-    return models.Question.objects.all()
+    return list(models.Question.objects.all())
 
 
+@in_thread
 def question(id: strawberry.ID):
     return models.Question.objects.get(id=id)
 
 
+@in_thread
 def choices():
-    return models.Choice.objects.all()
+    return list(models.Choice.objects.all())
 
 
+@in_thread
 def choice(id: strawberry.ID):
     return models.Choice.objects.get(id=id)
 
 
-def newsfeeds():
-    return models.NewsFeed.objects.all()
+@in_thread
+def newsfeeds(
+    info: Info,
+    first: typing.Optional[int] = None,
+    after: typing.Optional[str] = None,
+    before: typing.Optional[str] = None,
+) -> Connection[NewsFeed]:
+    return connection(inbox.inbox(viewer(info).id), first, after, before)
 
 
-def newsfeed(id: strawberry.ID):
-    return models.NewsFeed.objects.get(id=id)
+@in_thread
+def newsfeed(info: Info, id: strawberry.ID):
+    return inbox.inbox(viewer(info).id).get(id=id)
 
 
-def home(id: strawberry.ID) -> typing.List[Tweet]:
+@in_thread
+def home(
+    id: strawberry.ID,
+    first: typing.Optional[int] = None,
+    after: typing.Optional[str] = None,
+    before: typing.Optional[str] = None,
+) -> Connection[Tweet]:
     by_user = models.User.objects.get(id=id)
-    user_following = by_user.following.all()
-    following_tweets = models.Tweet.objects.filter(
-        user__following__id__in=user_following
-    )
-    user_tweets = models.Tweet.objects.filter(user=by_user)
-    tweet_list = (following_tweets | user_tweets).distinct()
-    return tweet_list
+    return connection(timelines.home_timeline(by_user), first, after, before)
+
+
+@in_thread
+def trending(
+    window: str = trends.DEFAULT_WINDOW, limit: int = 10
+) -> typing.List[Trend]:
+    if window not in trends.WINDOWS:
+        raise ValidationError(f"window must be one of {', '.join(trends.WINDOWS)}")
+    top = trends.trends.top(window, max(1, min(limit, 50)))
+    return [Trend(tag=tag, count=count) for tag, count in top]
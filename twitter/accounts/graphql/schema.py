@@ -8,6 +8,11 @@ from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.validators import validate_email, URLValidator
 from django.utils.crypto import get_random_string
 from . import resolvers
+from strawberry.types import Info
+from .loaders import Loaders, in_thread
+from .. import engagement, identity, inbox, live, tags, timelines
+from ..broker import broker
+from ..caching import entity_cache
 
 from .input import (
     RegisterUserInput,
@@ -25,11 +30,14 @@ from .types import (
     Tweet,
     Reply,
     ReplyOfReply,
+    ReplyThread,
     Choice,
     Question,
     NewsFeed,
     Vote,
     Likes,
+    Connection,
+    Trend,
 )
 from .. import models
 
@@ -103,7 +111,7 @@ def get_user(email, password):
 
 def get_user_by_id(id):
     try:
-        return models.User.objects.get(id=id)
+        return identity.load(models.User, id, entity_cache.get)
     except ObjectDoesNotExist:
         raise ValidationError("user doesnt exist")
 
@@ -117,35 +125,35 @@ def get_user_by_email(email):
 
 def get_tweet_by_id(id):
     try:
-        return models.Tweet.objects.get(id=id)
+        return identity.load(models.Tweet, id, entity_cache.get)
     except ObjectDoesNotExist:
         raise ValidationError("tweet doesnt exist")
 
 
 def get_reply_by_id(id):
     try:
-        return models.Reply.objects.get(id=id)
+        return identity.load(models.Reply, id, entity_cache.get)
     except ObjectDoesNotExist:
         raise ValidationError("reply doesnt exist")
 
 
 def get_question_by_id(id):
     try:
-        return models.Question.objects.get(id=id)
+        return identity.load(models.Question, id, entity_cache.get)
     except ObjectDoesNotExist:
         raise ValidationError("question doesnt exist")
 
 
 def get_choice_by_id(id):
     try:
-        return models.Choice.objects.get(id=id)
+        return identity.load(models.Choice, id, entity_cache.get)
     except ObjectDoesNotExist:
         raise ValidationError("Choice doesnt exist")
 
 
 def get_newsfeed_by_id(id):
     try:
-        return models.NewsFeed.objects.get(id=id)
+        return identity.load(models.NewsFeed, id, entity_cache.get)
     except ObjectDoesNotExist:
         raise ValidationError("newsfeed doesnt exist")
 
@@ -185,26 +193,40 @@ def get_refresh_payload(user):
 
 @strawberry.type
 class Query:
-    users: typing.List[User] = strawberry.field(resolver=resolvers.users)
+    users: Connection[User] = strawberry.field(resolver=resolvers.users)
     user: User = strawberry.field(resolver=resolvers.user)
     profiles: typing.List[Profile] = strawberry.field(resolver=resolvers.profiles)
     profile: Profile = strawberry.field(resolver=resolvers.profile)
-    tweets: typing.List[Tweet] = strawberry.field(resolver=resolvers.tweets)
+    tweets: Connection[Tweet] = strawberry.field(resolver=resolvers.tweets)
     tweet: Tweet = strawberry.field(resolver=resolvers.tweet)
-    replies: typing.List[Reply] = strawberry.field(resolver=resolvers.replies)
+    search_tweets: Connection[Tweet] = strawberry.field(
+        resolver=resolvers.search_tweets
+    )
+    tagged_tweets: Connection[Tweet] = strawberry.field(
+        resolver=resolvers.tagged_tweets
+    )
+    mentioned_tweets: Connection[Tweet] = strawberry.field(
+        resolver=resolvers.mentioned_tweets
+    )
+    replies: Connection[Reply] = strawberry.field(resolver=resolvers.replies)
     reply: Reply = strawberry.field(resolver=resolvers.reply)
+    conversation: typing.List[ReplyThread] = strawberry.field(
+        resolver=resolvers.conversation
+    )
     questions: typing.List[Question] = strawberry.field(resolver=resolvers.questions)
     question: Question = strawberry.field(resolver=resolvers.question)
     choices: typing.List[Choice] = strawberry.field(resolver=resolvers.choices)
     choice: Choice = strawberry.field(resolver=resolvers.choice)
-    newsfeeds: typing.List[NewsFeed] = strawberry.field(resolver=resolvers.newsfeeds)
+    newsfeeds: Connection[NewsFeed] = strawberry.field(resolver=resolvers.newsfeeds)
     newsfeed: NewsFeed = strawberry.field(resolver=resolvers.newsfeed)
-    home: Tweet = strawberry.field(resolver=resolvers.home)
+    home: Connection[Tweet] = strawberry.field(resolver=resolvers.home)
+    trending: typing.List[Trend] = strawberry.field(resolver=resolvers.trending)
 
 
 @strawberry.type
 class Mutation:
     @strawberry.mutation
+    @in_thread
     def register_user(self, user: RegisterUserInput) -> User:
         if not validate_user_input(user):
             raise ValidationError("user info is not supplied correctly")
@@ -227,6 +249,7 @@ class Mutation:
         )
 
     @strawberry.mutation
+    @in_thread
     def update_user(self, id: strawberry.ID, user: RegisterUserInput) -> User:
         validate_user_input(user)
 
@@ -248,9 +271,11 @@ class Mutation:
             password=user.password,
             profile=profile,
         )
+        entity_cache.invalidate(models.User, *user_qs.values_list("id", flat=True))
         return user_qs.first()
 
     @strawberry.mutation
+    @in_thread
     def delete_user(self, id: strawberry.ID) -> User:
         try:
             user = get_user_by_id(id=id)
@@ -260,6 +285,7 @@ class Mutation:
             raise ValidationError("user didnt exist in the first place")
 
     @strawberry.mutation
+    @in_thread
     def create_jwt(self, email: str, password: str) -> Token:
         user = get_user(email, password)
         token = jwt.encode(
@@ -276,6 +302,7 @@ class Mutation:
         )
 
     @strawberry.mutation
+    @in_thread
     def refresh_jwt(self, token_input: RefreshTokenInput) -> RefreshToken:
         payload = get_payload_from_token(token_input.token)
         email = payload.get("email")
@@ -289,6 +316,7 @@ class Mutation:
         return RefreshToken(user=user, token=token)
 
     @strawberry.mutation
+    @in_thread
     def verify_token(self, token: str) -> VerifyToken:
         payload = jwt.decode(token, key=settings.SECRET_KEY, algorithms="HS256")
         email = payload.get("email")
@@ -296,53 +324,62 @@ class Mutation:
         return VerifyToken(is_valid=True, user=user, payload=payload)
 
     @strawberry.mutation
+    @in_thread
     def change_password(self, id: strawberry.ID, password: str) -> User:
         try:
             user_qs = models.User.objects.filter(id=id)
         except ObjectDoesNotExist:
             raise ValidationError({"message": "user doesnt exist"})
         user_qs.update(password=password)
+        entity_cache.invalidate(models.User, id)
         return user_qs.first()
 
     @strawberry.mutation
+    @in_thread
     def deactivate_account(self, id: strawberry.ID) -> User:
         user = get_user_by_id(id)
         if not user.is_active:
             raise ValidationError({"message": "user already deactivated"})
         user.is_active = False
-        user.save()
+        user.save(update_fields=["is_active"])
         return user
 
     @strawberry.mutation
+    @in_thread
     def activate_account(self, id: strawberry.ID) -> User:
         user = get_user_by_id(id)
         if user.is_active:
             raise ValidationError({"message": "user already activated"})
         user.is_active = True
-        user.save()
+        user.save(update_fields=["is_active"])
         return user
 
     @strawberry.mutation
+    @in_thread
     def follow_user(self, user_id: strawberry.ID, target_id: strawberry.ID) -> User:
         user_to_follow = get_user_by_id(id=target_id)
         user = get_user_by_id(id=user_id)
         if user.following.filter(id=target_id).exists():
             raise ValidationError(f"you already follow {user_to_follow.username}")
         user.following.add(user_to_follow)
+        timelines.backfill(user, user_to_follow)
         return user
 
     @strawberry.mutation
+    @in_thread
     def unfollow_user(self, user_id: strawberry.ID, target_id: strawberry.ID) -> User:
         user_to_unfollow = get_user_by_id(id=target_id)
         user = get_user_by_id(id=user_id)
         if user.following.filter(id=target_id).exists():
             user.following.remove(user_to_unfollow)
+            timelines.prune(user, user_to_unfollow)
             return user
         raise ValidationError(
             f"message: you already have {user_to_unfollow.username} unfollowed"
         )
 
     @strawberry.mutation
+    @in_thread
     def create_tweet(self, user_id: strawberry.ID, tweet_input: TweetInput) -> Tweet:
         user = get_user_by_id(id=user_id)
         question = models.Question.objects.create(
@@ -364,6 +401,7 @@ class Mutation:
         )
 
     @strawberry.mutation
+    @in_thread
     def update_tweet(self, tweet_id: strawberry.ID, tweet_input: TweetInput) -> Tweet:
         tweet_qs = models.Tweet.objects.filter(id=tweet_id)
         tweet_qs.update(
@@ -372,9 +410,14 @@ class Mutation:
             created_at=tweet_input.created_at,
             people_you_follow=tweet_input.people_you_follow,
         )
-        return tweet_qs.first()
+        entity_cache.invalidate(models.Tweet, tweet_id)
+        tweet = tweet_qs.first()
+        if tweet is not None:
+            tags.index(tweet)
+        return tweet
 
     @strawberry.mutation
+    @in_thread
     def reply_to_tweet(
         self, id: strawberry.ID, user_id: strawberry.ID, reply_input: ReplyInput
     ) -> Reply:
@@ -393,6 +436,7 @@ class Mutation:
         )
 
     @strawberry.mutation
+    @in_thread
     def update_reply_to_tweet(
         self, reply_id: strawberry.ID, reply_input: ReplyInput
     ) -> Reply:
@@ -402,9 +446,14 @@ class Mutation:
             file=reply_input.file,
             created_at=reply_input.created_at,
         )
-        return reply_qs.first()
+        entity_cache.invalidate(models.Reply, reply_id)
+        reply = reply_qs.first()
+        if reply is not None:
+            tags.index(reply)
+        return reply
 
     @strawberry.mutation
+    @in_thread
     def retweet(self, user_id: strawberry.ID, tweet_id: strawberry.ID) -> Tweet:
         tweet = get_tweet_by_id(id=tweet_id)
         user = get_user_by_id(id=user_id)
@@ -416,6 +465,7 @@ class Mutation:
         )
 
     @strawberry.mutation
+    @in_thread
     def retweet_reply(self, id: strawberry.ID, user_id: strawberry.ID) -> Reply:
         reply = get_reply_by_id(id=id)
         user = get_user_by_id(id=user_id)
@@ -427,6 +477,7 @@ class Mutation:
         )
 
     @strawberry.mutation
+    @in_thread
     def reply_to_reply(
         self, user_id: strawberry.ID, reply_id: strawberry.ID, reply_input: ReplyInput
     ) -> ReplyOfReply:
@@ -441,60 +492,61 @@ class Mutation:
         )
 
     @strawberry.mutation
+    @in_thread
     def vote_choice(self, id: strawberry.ID, user_id: strawberry.ID) -> Vote:
         choice = get_choice_by_id(id=id)
         user = get_user_by_id(id=user_id)
-        if choice.user_can_vote(user) is True:
-            return models.Vote.objects.create(user=user, choice=choice)
-        raise ValidationError("user already voted for  that choice")
+        vote, _ = engagement.vote(user, choice)
+        return vote
 
     @strawberry.mutation
+    @in_thread
     def unvote_choice(self, id: strawberry.ID, user_id: strawberry.ID) -> Vote:
         choice = get_choice_by_id(id=id)
         user = get_user_by_id(id=user_id)
-        if choice.user_can_vote(user) is True:
+        vote, deleted = engagement.unvote(user, choice)
+        if not deleted:
             raise ValidationError("user already unvoted that choice")
-        vote = get_vote_by_choice(user=user, choice=choice)
-        vote.delete()
         return vote
 
     @strawberry.mutation
+    @in_thread
     def like_tweet(self, id: strawberry.ID, user_id: strawberry.ID) -> Likes:
         tweet = get_tweet_by_id(id=id)
         user = get_user_by_id(id=user_id)
-        if tweet.user_can_like(user) is True:
-            return models.Likes.objects.create(user=user, tweet=tweet)
-        raise ValidationError("user already liked that tweet")
+        like, _ = engagement.like(user, tweet=tweet)
+        return like
 
     @strawberry.mutation
+    @in_thread
     def like_reply(self, id: strawberry.ID, user_id: strawberry.ID) -> Likes:
         reply = get_reply_by_id(id=id)
         user = get_user_by_id(id=user_id)
-        if reply.user_can_like(user) is True:
-            return models.Likes.objects.create(user=user, reply=reply)
-        raise ValidationError("user already liked that tweet")
+        like, _ = engagement.like(user, reply=reply)
+        return like
 
     @strawberry.mutation
+    @in_thread
     def dislike_tweet(self, id: strawberry.ID, user_id: strawberry.ID) -> Likes:
         tweet = get_tweet_by_id(id=id)
         user = get_user_by_id(id=user_id)
-        if tweet.user_can_like(user) is True:
+        like, deleted = engagement.unlike(user, tweet=tweet)
+        if not deleted:
             raise ValidationError("user already disliked that tweet")
-        like = get_like_by_tweet(user=user, tweet=tweet)
-        like.delete()
         return like
 
     @strawberry.mutation
+    @in_thread
     def dislike_reply(self, id: strawberry.ID, user_id: strawberry.ID) -> Likes:
         reply = get_reply_by_id(id=id)
         user = get_user_by_id(id=user_id)
-        if reply.user_can_like(user) is True:
+        like, deleted = engagement.unlike(user, reply=reply)
+        if not deleted:
             raise ValidationError("user already disliked that reply")
-        like = get_like_by_reply(user=user, reply=reply)
-        like.delete()
         return like
 
     @strawberry.mutation
+    @in_thread
     def create_newsfeed(self, news_feed_input: NewsFeedInput) -> NewsFeed:
         from_user = get_user_by_id(id=news_feed_input.from_user)
         to_user = get_user_by_id(id=news_feed_input.to_user)
@@ -504,3 +556,53 @@ class Mutation:
             created_at=news_feed_input.created_at,
             description=news_feed_input.description,
         )
+
+    @strawberry.mutation
+    @in_thread
+    def mark_newsfeeds_read(
+        self,
+        info: Info,
+        ids: typing.Optional[typing.List[strawberry.ID]] = None,
+    ) -> User:
+        user_id = resolvers.viewer(info).id
+        inbox.mark_read(user_id, ids)
+        return models.User.objects.get(id=user_id)
+
+    @strawberry.mutation
+    @in_thread
+    def mark_all_read(self, info: Info) -> User:
+        user_id = resolvers.viewer(info).id
+        inbox.mark_all_read(user_id)
+        return models.User.objects.get(id=user_id)
+
+
+async def live_objects(info, model, channels):
+    async for object_id in broker.subscribe(*channels):
+        obj = await in_thread(model.objects.filter(id=object_id).first)()
+        if obj is not None:
+            # fresh loaders so each event resolves current rows
+            info.context.loaders = Loaders()
+            yield obj
+
+
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def newsfeed_added(self, info: Info) -> typing.AsyncGenerator[NewsFeed, None]:
+        user_id = resolvers.viewer(info).id
+        followed = await in_thread(live.followed_ids)(user_id)
+        channels = [live.newsfeed_channel(user_id)]
+        channels += [live.activity_channel(followed_id) for followed_id in followed]
+        async for entry in live_objects(info, models.NewsFeed, channels):
+            yield entry
+
+    @strawberry.subscription
+    async def home_timeline_updated(
+        self, info: Info
+    ) -> typing.AsyncGenerator[Tweet, None]:
+        user_id = resolvers.viewer(info).id
+        followed = await in_thread(live.followed_ids)(user_id)
+        channels = [live.tweets_channel(user_id)]
+        channels += [live.tweets_channel(followed_id) for followed_id in followed]
+        async for tweet in live_objects(info, models.Tweet, channels):
+            yield tweet
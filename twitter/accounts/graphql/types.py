@@ -3,6 +3,10 @@ import typing
 from strawberry.schema.types.base_scalars import Date
 import strawberry
 from strawberry.scalars import JSON
+from strawberry.types import Info
+from .loaders import in_thread
+
+T = typing.TypeVar("T")
 
 
 @strawberry.type
@@ -21,26 +25,48 @@ class ProfileImage:
 @strawberry.type
 class Profile:
     id: strawberry.ID
-    images: ProfileImage
     bio: str
     locations: str
     website: str
     birth_date: str
 
+    @strawberry.field
+    async def images(self, info: Info) -> ProfileImage:
+        return await info.context.loaders.profile_images.load(self.images_id)
+
 
 @strawberry.type
 class Likes:
     id: typing.Optional[strawberry.ID]
-    user: "User"
-    tweet: typing.Optional["Tweet"]
-    reply: typing.Optional["Reply"]
+
+    @strawberry.field
+    async def user(self, info: Info) -> "User":
+        return await info.context.loaders.users.load(self.user_id)
+
+    @strawberry.field
+    async def tweet(self, info: Info) -> typing.Optional["Tweet"]:
+        if self.tweet_id is None:
+            return None
+        return await info.context.loaders.tweets.load(self.tweet_id)
+
+    @strawberry.field
+    async def reply(self, info: Info) -> typing.Optional["Reply"]:
+        if self.reply_id is None:
+            return None
+        return await info.context.loaders.replies.load(self.reply_id)
 
 
 @strawberry.type
 class Vote:
     id: typing.Optional[strawberry.ID]
-    user: "User"
-    choice: "Choice"
+
+    @strawberry.field
+    async def user(self, info: Info) -> "User":
+        return await info.context.loaders.users.load(self.user_id)
+
+    @strawberry.field
+    async def choice(self, info: Info) -> "Choice":
+        return await info.context.loaders.choices.load(self.choice_id)
 
 
 @strawberry.type
@@ -60,8 +86,8 @@ class Question:
     pub_date: str
 
     @strawberry.field
-    def _choices(self) -> typing.List[Choice]:
-        return self.choices.all()
+    async def _choices(self, info: Info) -> typing.List[Choice]:
+        return await info.context.loaders.choices_by_question.load(self.id)
 
 
 @strawberry.type
@@ -80,8 +106,8 @@ class ReplyOfReply:
     created_at: str
 
     @strawberry.field
-    def owner(self) -> str:
-        return self.user
+    async def owner(self, info: Info) -> str:
+        return await info.context.loaders.users.load(self.user_id)
 
     @strawberry.field
     def file(self) -> typing.Optional[str]:
@@ -100,12 +126,12 @@ class Reply:
     created_at: str
 
     @strawberry.field
-    def reply_of_reply(self) -> typing.List[ReplyOfReply]:
-        return self.get_descendants(include_self=False)
+    async def reply_of_reply(self, info: Info) -> typing.List[ReplyOfReply]:
+        return await info.context.loaders.descendants.load(self)
 
     @strawberry.field
-    def owner(self) -> str:
-        return self.user
+    async def owner(self, info: Info) -> str:
+        return await info.context.loaders.users.load(self.user_id)
 
     @strawberry.field
     def likes(self) -> int:
@@ -116,6 +142,39 @@ class Reply:
         return self.file.path
 
 
+@strawberry.type
+class Trend:
+    tag: str
+    count: int
+
+
+@strawberry.type
+class ReplyThread:
+    id: strawberry.ID
+    context: str
+    created_at: str
+
+    @strawberry.field
+    def level(self) -> int:
+        return self.depth
+
+    @strawberry.field
+    def owner(self) -> str:
+        return self.user.username
+
+    @strawberry.field
+    def likes(self) -> int:
+        return self.get_likes_count
+
+    @strawberry.field
+    def descendant_count(self) -> int:
+        return self.descendant_count
+
+    @strawberry.field
+    def children(self) -> typing.List["ReplyThread"]:
+        return self.thread_children
+
+
 @strawberry.type
 class Tweet:
     id: strawberry.ID
@@ -126,23 +185,26 @@ class Tweet:
 
     @strawberry.field
     def reply_count(self) -> int:
-        return self.replies.count()
+        return self.get_replies_count
 
     @strawberry.field
-    def replies(self) -> typing.List[Reply]:
-        return self.replies.all()
+    async def replies(self, info: Info) -> typing.List[Reply]:
+        return await info.context.loaders.replies_by_tweet.load(self.id)
 
     @strawberry.field
-    def owner(self) -> str:
-        return self.user.username
+    async def owner(self, info: Info) -> str:
+        user = await info.context.loaders.users.load(self.user_id)
+        return user.username
 
     @strawberry.field
     def file(self) -> typing.Optional[str]:
         return self.file.path
 
     @strawberry.field
-    def _question(self) -> typing.Optional[Question]:
-        return self.question
+    async def _question(self, info: Info) -> typing.Optional[Question]:
+        if self.question_id is None:
+            return None
+        return await info.context.loaders.questions.load(self.question_id)
 
     @strawberry.field
     def likes(self) -> int:
@@ -154,36 +216,45 @@ class User:
     id: typing.Optional[strawberry.ID]
     username: str
     email: str
-    profile: Profile
     is_active: bool
 
+    @strawberry.field
+    async def profile(self, info: Info) -> typing.Optional[Profile]:
+        if self.profile_id is None:
+            return None
+        return await info.context.loaders.profiles.load(self.profile_id)
+
     @strawberry.field
     def followers_count(self) -> int:
-        return self.followers.count()
+        return self.followers_count
 
     @strawberry.field
     def following_count(self) -> int:
-        return self.following.count()
+        return self.following_count
+
+    @strawberry.field
+    def unread_count(self) -> int:
+        return self.unread_count
 
     @strawberry.field
-    def followers(self) -> typing.List[Followers]:
-        return self.followers.all()
+    async def followers(self) -> typing.List[Followers]:
+        return await in_thread(list)(self.followers.all())
 
     @strawberry.field
-    def following(self) -> typing.List[Followers]:
-        return self.following.all()
+    async def following(self) -> typing.List[Followers]:
+        return await in_thread(list)(self.following.all())
 
     @strawberry.field
     def tweet_count(self) -> int:
-        return self.tweets.count()
+        return self.tweets_count
 
     @strawberry.field
-    def all_tweets(self) -> typing.List[Tweet]:
-        return self.tweets.all()
+    async def all_tweets(self) -> typing.List[Tweet]:
+        return await in_thread(list)(self.tweets.all())
 
     @strawberry.field
-    def home_tweets(self) -> typing.List[Tweet]:
-        return self.tweets.filter(user__following=self.id)
+    async def home_tweets(self) -> typing.List[Tweet]:
+        return await in_thread(list)(self.tweets.filter(user__following=self.id))
 
 
 @strawberry.type
@@ -210,7 +281,53 @@ class VerifyToken:
 @strawberry.type
 class NewsFeed:
     id: strawberry.ID
-    from_user: User
-    description: str
     created_at: str
-    to_user: typing.Optional[User]
+    actor_count: int
+    verb: str
+    object_type: str
+    object_id: typing.Optional[strawberry.ID]
+
+    @strawberry.field
+    async def description(self, info: Info) -> str:
+        if not self.verb:
+            return self.description
+        return await info.context.loaders.descriptions.load(self)
+
+    @strawberry.field
+    async def sample_actors(self, info: Info) -> typing.List[User]:
+        return await info.context.loaders.users.load_many(self.sample_actors)
+
+    @strawberry.field
+    def is_read(self) -> bool:
+        # annotated by inbox.with_read_state, entries just created are unread
+        return getattr(self, "is_read", False)
+
+    @strawberry.field
+    async def from_user(self, info: Info) -> User:
+        return await info.context.loaders.users.load(self.from_user_id)
+
+    @strawberry.field
+    async def to_user(self, info: Info) -> typing.Optional[User]:
+        if self.to_user_id is None:
+            return None
+        return await info.context.loaders.users.load(self.to_user_id)
+
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    has_previous_page: bool
+    start_cursor: typing.Optional[str]
+    end_cursor: typing.Optional[str]
+
+
+@strawberry.type
+class Edge(typing.Generic[T]):
+    cursor: str
+    node: T
+
+
+@strawberry.type
+class Connection(typing.Generic[T]):
+    page_info: PageInfo
+    edges: typing.List[Edge[T]]
@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar("identity_map", default=None)
+
+
+class IdentityMap:
+    """
+    The rows one request has already loaded, keyed by model and primary
+    key, so a second lookup returns the same instance instead of a query.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.avoided = 0
+
+    def get(self, model, pk):
+        obj = self.objects.get((model, pk))
+        if obj is not None:
+            self.avoided += 1
+        return obj
+
+    def add(self, *objects):
+        for obj in objects:
+            if obj is not None and obj.pk is not None:
+                self.objects[(type(obj), obj.pk)] = obj
+
+    def discard(self, model, *pks):
+        for pk in pks:
+            self.objects.pop((model, model._meta.pk.to_python(pk)), None)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def scope():
+    """
+    Make an identity map current for the block, reusing the enclosing one
+    when there is one.
+    """
+    identity_map = _current.get()
+    if identity_map is not None:
+        yield identity_map
+        return
+    identity_map = IdentityMap()
+    token = _current.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        _current.reset(token)
+
+
+def load(model, pk, loader):
+    identity_map = _current.get()
+    if identity_map is None:
+        return loader(model, pk)
+    pk = model._meta.pk.to_python(pk)
+    obj = identity_map.get(model, pk)
+    if obj is None:
+        obj = loader(model, pk)
+        identity_map.add(obj)
+    return obj
+
+
+def add(*objects):
+    identity_map = _current.get()
+    if identity_map is not None:
+        identity_map.add(*objects)
+
+
+def discard(model, *pks):
+    identity_map = _current.get()
+    if identity_map is not None:
+        identity_map.discard(model, *pks)
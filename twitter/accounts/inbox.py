@@ -0,0 +1,233 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import islice
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from . import counters, live
+from .caching import entity_cache
+from .models import NewsFeed, NewsFeedActor, NewsFeedRead, User
+
+BATCH_SIZE = getattr(settings, "INBOX_BATCH_SIZE", 500)
+GROUP_WINDOW = getattr(settings, "INBOX_GROUP_WINDOW", 86400)
+SAMPLE_SIZE = getattr(settings, "INBOX_GROUP_SAMPLE_SIZE", 3)
+
+
+def followers_of(user_id):
+    return User.objects.filter(following=user_id).values_list("id", flat=True)
+
+
+def entries(
+    from_user_id,
+    recipient_ids,
+    verb,
+    object_type="",
+    object_id=None,
+    group_key="",
+):
+    """
+    Yield an unsaved `verb` entry per recipient. Nobody is notified of
+    their own actions.
+    """
+    for to_user_id in recipient_ids:
+        if to_user_id is None or to_user_id == from_user_id:
+            continue
+        yield NewsFeed(
+            from_user_id=from_user_id,
+            to_user_id=to_user_id,
+            verb=verb,
+            object_type=object_type,
+            object_id=object_id,
+            group_key=group_key,
+            sample_actors=[from_user_id],
+        )
+
+
+def write(new_entries):
+    """
+    Insert unsaved entries BATCH_SIZE rows at a time and bump every
+    recipient's unread_count by the number they received.
+    """
+    new_entries = iter(new_entries)
+    while True:
+        batch = list(islice(new_entries, BATCH_SIZE))
+        if not batch:
+            return
+        # one timestamp per batch, the one count_unread tests
+        now = timezone.now()
+        for entry in batch:
+            entry.created_at = now
+        NewsFeed.objects.bulk_create(batch)
+        by_count = defaultdict(list)
+        for to_user_id, count in Counter(e.to_user_id for e in batch).items():
+            by_count[count].append(to_user_id)
+        for count, recipient_ids in by_count.items():
+            count_unread(recipient_ids, now, count)
+        for entry in batch:
+            live.publish_newsfeed(entry)
+
+
+def coalesce(
+    from_user_id,
+    to_user_id,
+    group_key,
+    verb,
+    object_type="",
+    object_id=None,
+):
+    """
+    Fold a `verb` event into the recipient's open entry for `group_key`, or
+    start one when there is none or its last event is over GROUP_WINDOW
+    seconds old. A folded entry counts one more actor, points at the
+    latest object, moves to the top of the inbox and is unread again. An
+    actor already counted in the entry is not counted twice.
+    """
+    if to_user_id is None or to_user_id == from_user_id:
+        return
+    since = timezone.now() - timedelta(seconds=GROUP_WINDOW)
+    with transaction.atomic():
+        entry = (
+            NewsFeed.objects.select_for_update()
+            .filter(to_user_id=to_user_id, group_key=group_key)
+            .first()
+        )
+        if entry is not None and entry.created_at < since:
+            # the window closed, later events start a new entry
+            NewsFeed.objects.filter(id=entry.id).update(group_key="")
+            entry = None
+        created = False
+        if entry is None:
+            # unique per open group, of two concurrent first events one creates
+            entry, created = NewsFeed.objects.get_or_create(
+                to_user_id=to_user_id,
+                group_key=group_key,
+                defaults={
+                    "from_user_id": from_user_id,
+                    "verb": verb,
+                    "object_type": object_type,
+                    "object_id": object_id,
+                    "sample_actors": [from_user_id],
+                },
+            )
+        _, new_actor = NewsFeedActor.objects.get_or_create(
+            newsfeed=entry, actor_id=from_user_id
+        )
+        if created or not new_actor:
+            # a created entry is counted and published by its post_save
+            return
+        _fold(entry, from_user_id, object_type, object_id)
+    live.publish_newsfeed(entry)
+
+
+def _fold(entry, from_user_id, object_type, object_id):
+    was_unread = is_unread(entry)
+    entry.actor_count += 1
+    entry.sample_actors = [from_user_id, *entry.sample_actors][:SAMPLE_SIZE]
+    entry.from_user_id = from_user_id
+    entry.object_type, entry.object_id = object_type, object_id
+    entry.created_at = timezone.now()
+    entry.save(
+        update_fields=[
+            "actor_count",
+            "sample_actors",
+            "from_user",
+            "object_type",
+            "object_id",
+            "created_at",
+        ]
+    )
+    if not was_unread:
+        NewsFeedRead.objects.filter(newsfeed=entry).delete()
+        count_unread([entry.to_user_id], entry.created_at)
+
+
+# an entry is read when it is no newer than its recipient's watermark or
+# was marked read on its own ahead of it
+READ = Q(read_mark__isnull=False) | Q(created_at__lte=F("to_user__newsfeed_read_at"))
+UNREAD = Q(read_mark__isnull=True) & (
+    Q(to_user__newsfeed_read_at__isnull=True)
+    | Q(created_at__gt=F("to_user__newsfeed_read_at"))
+)
+
+
+def with_read_state(queryset):
+    return queryset.annotate(
+        is_read=Case(When(READ, then=Value(True)), default=Value(False))
+    )
+
+
+def inbox(user_id):
+    return with_read_state(NewsFeed.objects.filter(to_user_id=user_id))
+
+
+def is_unread(entry):
+    return NewsFeed.objects.filter(UNREAD, id=entry.id).exists()
+
+
+def count_unread(recipient_ids, created_at, count=1):
+    """
+    Add `count` entries created at `created_at` to each recipient's
+    unread_count, unless their watermark already covers that time. The
+    watermark is tested in the UPDATE itself, so the count agrees with
+    UNREAD even when mark_all_read moves it in between.
+    """
+    counters.adjust_many(
+        User,
+        recipient_ids,
+        condition=Q(newsfeed_read_at__isnull=True) | Q(newsfeed_read_at__lt=created_at),
+        unread_count=count,
+    )
+
+
+def _lock(user_id):
+    # serializes the read state changes of one user
+    User.objects.select_for_update().filter(id=user_id).values_list("id").first()
+
+
+def mark_all_read(user_id):
+    """
+    Move the user's watermark to now, a single row update however many
+    entries that reads. The time is taken once the user's row is locked,
+    after every entry already counted has committed.
+    """
+    with transaction.atomic():
+        _lock(user_id)
+        User.objects.filter(id=user_id).update(
+            newsfeed_read_at=timezone.now(), unread_count=0
+        )
+    entity_cache.invalidate(User, user_id)
+
+
+def mark_read(user_id, ids=None):
+    """
+    Mark the user's entries in `ids` read, or all of them when `ids` is
+    None, and return how many were unread.
+    """
+    if ids is None:
+        unread = User.objects.values_list("unread_count", flat=True).get(id=user_id)
+        mark_all_read(user_id)
+        return unread
+    with transaction.atomic():
+        # with the row locked a concurrent call sees these marks, and only
+        # entries still unread are marked and counted
+        _lock(user_id)
+        unread = NewsFeed.objects.filter(UNREAD, to_user_id=user_id, id__in=ids)
+        marks = NewsFeedRead.objects.bulk_create(
+            [
+                NewsFeedRead(user_id=user_id, newsfeed_id=pk)
+                for pk in unread.values_list("id", flat=True)
+            ]
+        )
+        if marks:
+            counters.adjust(User, user_id, unread_count=-len(marks))
+    return len(marks)
+
+
+def recount_unread(get_model=apps.get_model, chunk_size=1000):
+    User = get_model("accounts", "User")
+    NewsFeed = get_model("accounts", "NewsFeed")
+    return counters.recount(
+        User, "unread_count", NewsFeed, "to_user", chunk_size, condition=UNREAD
+    )
@@ -0,0 +1,240 @@
+import logging
+import os
+import socket
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = getattr(settings, "JOBS_LEASE_SECONDS", 300)
+BACKOFF_BASE = getattr(settings, "JOBS_BACKOFF_BASE", 5)
+BACKOFF_MAX = getattr(settings, "JOBS_BACKOFF_MAX", 3600)
+RETENTION = getattr(settings, "JOBS_RETENTION", 86400)
+
+
+def enqueue(
+    task,
+    kwargs=None,
+    queue="default",
+    priority=0,
+    delay=0,
+    max_attempts=5,
+):
+    """
+    Queue a call of `task`, a module level function or its dotted path,
+    with JSON serializable `kwargs`. The row commits with the surrounding
+    transaction, so a rolled back request queues nothing.
+    """
+    if callable(task):
+        task = f"{task.__module__}.{task.__qualname__}"
+    return Job.objects.create(
+        task=task,
+        kwargs=kwargs or {},
+        queue=queue,
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts,
+    )
+
+
+def worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def ready(queues=None, now=None):
+    now = now or timezone.now()
+    jobs = Job.objects.filter(
+        Q(status=Job.PENDING, run_at__lte=now)
+        | Q(
+            status=Job.RUNNING,
+            leased_until__lt=now,
+            attempts__lt=F("max_attempts"),
+        )
+    )
+    if queues:
+        jobs = jobs.filter(queue__in=queues)
+    return jobs.order_by("-priority", "run_at", "id")
+
+
+def _lease(candidates, worker, limit, now):
+    leased = []
+    for job in candidates:
+        won = Job.objects.filter(
+            id=job.id, status=job.status, attempts=job.attempts
+        ).update(
+            status=Job.RUNNING,
+            leased_by=worker,
+            leased_until=now + timedelta(seconds=LEASE_SECONDS),
+            attempts=F("attempts") + 1,
+        )
+        if won:
+            job.status, job.leased_by = Job.RUNNING, worker
+            job.attempts += 1
+            leased.append(job)
+            if len(leased) == limit:
+                break
+    return leased
+
+
+def claim(worker, queues=None, limit=1):
+    """
+    Lease up to `limit` ready jobs to `worker`. Each row is taken with an
+    UPDATE conditioned on the status and attempts it was read with, and
+    every lease bumps attempts, so of two workers racing for a job only
+    one wins, whether or not the database can SKIP LOCKED.
+    """
+    now = timezone.now()
+    # read a few extra rows in case other workers take some first
+    candidates = ready(queues, now)[: limit * 4]
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            candidates = candidates.select_for_update(skip_locked=True)
+            return _lease(candidates, worker, limit, now)
+    return _lease(candidates, worker, limit, now)
+
+
+def backoff(attempts):
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+
+
+def run(job):
+    """
+    Run a leased job, then mark it done, or schedule its retry with
+    exponential backoff, or move it to the dead letters once it has used
+    up its attempts. A worker that lost its lease records nothing.
+    """
+    try:
+        import_string(job.task)(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("job %s %s failed: %s", job.id, job.task, error)
+        if job.attempts >= job.max_attempts:
+            changes = {"status": Job.DEAD, "finished_at": timezone.now()}
+        else:
+            retry_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+            changes = {"status": Job.PENDING, "run_at": retry_at}
+        changes["last_error"] = error
+        succeeded = False
+    else:
+        changes = {"status": Job.DONE, "finished_at": timezone.now()}
+        succeeded = True
+    Job.objects.filter(id=job.id, status=Job.RUNNING, leased_by=job.leased_by).update(
+        leased_until=None, **changes
+    )
+    return succeeded
+
+
+def retry(jobs):
+    """
+    Give dead jobs a fresh set of attempts, starting now. Jobs that are
+    pending, running or done are left alone.
+    """
+    return jobs.filter(status=Job.DEAD).update(
+        status=Job.PENDING, attempts=0, run_at=timezone.now(), finished_at=None
+    )
+
+
+def reap(now=None):
+    """
+    Move jobs whose last allowed attempt lost its lease to the dead letters
+    and delete finished jobs older than RETENTION.
+    """
+    now = now or timezone.now()
+    Job.objects.filter(
+        status=Job.RUNNING, leased_until__lt=now, attempts__gte=F("max_attempts")
+    ).update(
+        status=Job.DEAD,
+        leased_until=None,
+        finished_at=now,
+        last_error="lease expired",
+    )
+    Job.objects.filter(
+        status=Job.DONE, finished_at__lt=now - timedelta(seconds=RETENTION)
+    ).delete()
+
+
+def stats(window=60):
+    """
+    Job counts per queue and status, with how many jobs each queue finished
+    and lost to the dead letters in the last `window` seconds and how long
+    its oldest ready job has been waiting.
+    """
+    now = timezone.now()
+    queues = defaultdict(
+        lambda: {
+            Job.PENDING: 0,
+            Job.RUNNING: 0,
+            Job.DONE: 0,
+            Job.DEAD: 0,
+            "done_recently": 0,
+            "dead_recently": 0,
+            "lag_seconds": 0.0,
+        }
+    )
+    counts = Job.objects.values_list("queue", "status").annotate(total=Count("id"))
+    for queue, status, total in counts.order_by():
+        queues[queue][status] = total
+    finished = (
+        Job.objects.filter(finished_at__gte=now - timedelta(seconds=window))
+        .values_list("queue", "status")
+        .annotate(total=Count("id"))
+    )
+    for queue, status, total in finished.order_by():
+        queues[queue][f"{status}_recently"] = total
+    for queue in queues.values():
+        queue["done_per_minute"] = queue["done_recently"] * 60 / window
+    waiting = (
+        Job.objects.filter(status=Job.PENDING, run_at__lte=now)
+        .values_list("queue")
+        .annotate(oldest=Min("run_at"))
+    )
+    for queue, oldest in waiting.order_by():
+        queues[queue]["lag_seconds"] = (now - oldest).total_seconds()
+    return {"window_seconds": window, "queues": dict(queues)}
+
+
+class Worker:
+    """
+    Claims and runs jobs from `queues`, all of them when empty, until `stop`
+    is set, or until none are ready when `burst`.
+    """
+
+    def __init__(self, name, stop, queues=None, poll_interval=1.0, burst=False):
+        self.name = name
+        self.stop = stop
+        self.queues = queues
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.processed = self.failed = 0
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                try:
+                    jobs = claim(self.name, self.queues)
+                except DatabaseError:
+                    # another writer holds SQLite's lock, try again shortly
+                    close_old_connections()
+                    jobs = None
+                if jobs:
+                    for job in jobs:
+                        self.processed += 1
+                        try:
+                            self.failed += not run(job)
+                        except DatabaseError:
+                            # unrecorded, the job runs again once its lease expires
+                            close_old_connections()
+                            self.failed += 1
+                elif jobs is not None and self.burst:
+                    return
+                else:
+                    self.stop.wait(self.poll_interval)
+        finally:
+            connection.close()
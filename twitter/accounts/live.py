@@ -0,0 +1,39 @@
+from django.db import transaction
+from .broker import broker
+from .models import User
+
+
+def newsfeed_channel(user_id):
+    return f"newsfeed:{user_id}"
+
+
+def activity_channel(user_id):
+    return f"activity:{user_id}"
+
+
+def tweets_channel(user_id):
+    return f"tweets:{user_id}"
+
+
+def publish_newsfeed(entry):
+    """
+    Announce a NewsFeed entry once it commits: to its recipient when it is
+    addressed, otherwise to whoever follows its author.
+    """
+    if entry.id is None:
+        return
+    if entry.to_user_id is not None:
+        channel = newsfeed_channel(entry.to_user_id)
+    else:
+        channel = activity_channel(entry.from_user_id)
+    transaction.on_commit(lambda: broker.publish(channel, entry.id))
+
+
+def publish_tweet(tweet):
+    transaction.on_commit(
+        lambda: broker.publish(tweets_channel(tweet.user_id), tweet.id)
+    )
+
+
+def followed_ids(user_id):
+    return list(User.objects.get(id=user_id).following.values_list("id", flat=True))
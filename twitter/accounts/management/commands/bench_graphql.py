@@ -0,0 +1,51 @@
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+
+QUERY = "{ tweets(first: 20) { edges { node { id owner likes replyCount } } } }"
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent GraphQL requests at a running server, e.g. "
+        "`uvicorn twitter.asgi:application`, and report throughput and latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/graphql/")
+        parser.add_argument("--query", default=QUERY)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=16)
+
+    def request(self, url, body):
+        started = time.perf_counter()
+        request = urllib.request.Request(
+            url, data=body, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request) as response:
+            payload = json.loads(response.read())
+        if payload.get("errors"):
+            raise RuntimeError(payload["errors"])
+        return time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        body = json.dumps({"query": options["query"]}).encode()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            latencies = list(
+                pool.map(
+                    lambda _: self.request(options["url"], body),
+                    range(options["requests"]),
+                )
+            )
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"{len(latencies) / elapsed:.0f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.1f}ms, "
+            f"p95 {p95 * 1000:.1f}ms at concurrency {options['concurrency']}"
+        )
@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from accounts.buffers import counter_buffer
+from accounts.management.testdb import test_database
+from accounts.models import Likes, Tweet, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure likes/second on a single hot tweet with and without the counter "
+        "buffer, in a throwaway test database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--likes", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=4)
+
+    def like(self, tweet_id, user_id):
+        try:
+            Likes.objects.create(user_id=user_id, tweet_id=tweet_id)
+        finally:
+            close_old_connections()
+
+    def run(self, tweet, user_ids, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda user_id: self.like(tweet.id, user_id), user_ids))
+        counter_buffer.flush()
+        elapsed = time.perf_counter() - started
+        tweet.refresh_from_db()
+        return len(user_ids) / elapsed, tweet.likes_count
+
+    def handle(self, *args, **options):
+        with test_database():
+            self.bench(options)
+
+    def bench(self, options):
+        User.objects.bulk_create(
+            User(username=f"bench-{i}", email=f"bench-{i}@example.com")
+            for i in range(options["likes"])
+        )
+        user_ids = list(User.objects.values_list("id", flat=True))
+        tweet = Tweet.objects.create(context="bench", user_id=user_ids[0])
+        enabled = counter_buffer.enabled
+        try:
+            for buffered in (False, True):
+                counter_buffer.enabled = buffered
+                rate, stored = self.run(tweet, user_ids, options["concurrency"])
+                mode = "buffered" if buffered else "direct"
+                self.stdout.write(
+                    f"{mode}: {rate:.0f} likes/s, stored likes_count={stored}"
+                )
+                tweet.likes.all().delete()
+                counter_buffer.flush()
+        finally:
+            counter_buffer.enabled = enabled
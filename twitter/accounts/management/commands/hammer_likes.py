@@ -0,0 +1,94 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.db.models import Count
+from accounts import engagement
+from accounts.buffers import counter_buffer
+from accounts.management.testdb import test_database
+from accounts.models import Likes, Tweet, User
+
+
+def check_then_insert(user, tweet):
+    # the pre-constraint write path, kept here as the baseline
+    if not Likes.objects.filter(user=user, tweet=tweet).exists():
+        Likes.objects.create(user=user, tweet=tweet)
+
+
+def insert_once(user, tweet):
+    engagement.like(user, tweet=tweet)
+
+
+@contextmanager
+def without_unique_likes():
+    """
+    Drop the Likes unique constraints for the block, as the table was
+    before them, so the baseline shows the duplicates it lets through.
+    """
+    constraints = Likes._meta.constraints
+    with connection.schema_editor() as editor:
+        for constraint in constraints:
+            editor.remove_constraint(Likes, constraint)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for constraint in constraints:
+                editor.add_constraint(Likes, constraint)
+
+
+class Command(BaseCommand):
+    help = "Hammer one tweet with repeated concurrent likes and check for duplicates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--attempts", type=int, default=5)
+        parser.add_argument("--concurrency", type=int, default=8)
+
+    def hammer(self, like, users, tweet, attempts, concurrency):
+        def run(user):
+            try:
+                like(user, tweet)
+            finally:
+                close_old_connections()
+
+        # a user's attempts are queued back to back, so they race each other
+        calls = [user for user in users for _ in range(attempts)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(run, calls))
+        counter_buffer.flush()
+        return len(users) * attempts / (time.perf_counter() - started)
+
+    def report(self, like, rate, tweet):
+        duplicates = (
+            Likes.objects.filter(tweet=tweet)
+            .values("user")
+            .annotate(total=Count("id"))
+            .filter(total__gt=1)
+            .count()
+        )
+        tweet.refresh_from_db()
+        self.stdout.write(
+            f"{like.__name__}: {rate:.0f} attempts/s, "
+            f"{tweet.likes.count()} likes, {duplicates} duplicated users, "
+            f"likes_count={tweet.likes_count}"
+        )
+        tweet.likes.all().delete()
+        counter_buffer.flush()
+
+    def handle(self, *args, **options):
+        with test_database():
+            User.objects.bulk_create(
+                User(username=f"hammer-{i}", email=f"hammer-{i}@example.com")
+                for i in range(options["users"])
+            )
+            users = list(User.objects.all())
+            tweet = Tweet.objects.create(context="hammer", user=users[0])
+            args = (users, tweet, options["attempts"], options["concurrency"])
+            with without_unique_likes():
+                rate = self.hammer(check_then_insert, *args)
+                self.report(check_then_insert, rate, tweet)
+            rate = self.hammer(insert_once, *args)
+            self.report(insert_once, rate, tweet)
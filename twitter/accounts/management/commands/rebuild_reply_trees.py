@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.threads import rebuild_paths
+
+
+class Command(BaseCommand):
+    help = "Recompute every reply's materialized path and depth from its parent"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_paths()
+        self.stdout.write("rebuilt materialized paths")
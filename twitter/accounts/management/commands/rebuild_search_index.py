@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from accounts import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from the tweet and reply tables"
+
+    def handle(self, *args, **options):
+        for model in search.rebuild():
+            self.stdout.write(f"rebuilt {search.SEARCH_TABLES[model]}")
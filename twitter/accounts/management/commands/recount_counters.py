@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from accounts import counters, inbox
+from accounts.buffers import counter_buffer
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized like, reply, vote, follow, tweet and unread counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        counter_buffer.flush()
+        for model, field, updated in counters.recount_all(
+            chunk_size=options["chunk_size"]
+        ):
+            self.stdout.write(f"{model.__name__}.{field}: {updated} rows recounted")
+        updated = inbox.recount_unread(chunk_size=options["chunk_size"])
+        self.stdout.write(f"User.unread_count: {updated} rows recounted")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from accounts.graphql import persisted
+
+
+class Command(BaseCommand):
+    help = (
+        "Register GraphQL documents as persisted queries, one document per "
+        "file, for clients to send by sha256 hash"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+")
+
+    def handle(self, *args, **options):
+        for path in options["files"]:
+            with open(path) as file:
+                key = persisted.register(file.read())
+            self.stdout.write(f"{key} {path}")
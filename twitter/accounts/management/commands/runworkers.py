@@ -0,0 +1,89 @@
+import multiprocessing
+import signal
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from accounts import jobs, outbox, pipeline
+
+
+def work(index, stop, queues, poll_interval, burst):
+    jobs.Worker(
+        jobs.worker_name(index),
+        stop,
+        queues=queues,
+        poll_interval=poll_interval,
+        burst=burst,
+    ).run()
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the Job table until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument(
+            "--queues", default="", help="comma separated, every queue by default"
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="run each worker in its own process instead of a thread",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument("--reap-interval", type=float, default=30.0)
+        parser.add_argument(
+            "--burst", action="store_true", help="exit once no job is ready"
+        )
+
+    def handle(self, *args, **options):
+        queues = [queue for queue in options["queues"].split(",") if queue]
+        concurrency = max(1, options["concurrency"])
+        if options["processes"]:
+            context = multiprocessing.get_context("fork")
+            stop = context.Event()
+            # children must not share the parent's database connections
+            connections.close_all()
+            workers = [
+                context.Process(
+                    target=work,
+                    args=(i, stop, queues, options["poll_interval"], options["burst"]),
+                    name=f"job-worker-{i}",
+                )
+                for i in range(concurrency)
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(
+                    target=work,
+                    args=(i, stop, queues, options["poll_interval"], options["burst"]),
+                    name=f"job-worker-{i}",
+                )
+                for i in range(concurrency)
+            ]
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+        for worker in workers:
+            worker.start()
+        if not queues or pipeline.QUEUE in queues:
+            # newsfeed jobs also go through the pipeline, a batch at a time
+            pipeline.newsfeed_pipeline.start()
+        mode = "processes" if options["processes"] else "threads"
+        self.stdout.write(
+            f"{concurrency} {mode} working on {', '.join(queues) or 'every queue'}"
+        )
+        reaped = 0.0
+        while any(worker.is_alive() for worker in workers):
+            if time.monotonic() - reaped >= options["reap_interval"]:
+                jobs.reap()
+                outbox.reap()
+                close_old_connections()
+                reaped = time.monotonic()
+            time.sleep(0.5)
+        for queue, counts in jobs.stats()["queues"].items():
+            self.stdout.write(
+                f"{queue}: {counts['done_recently']} done and "
+                f"{counts['dead_recently']} dead in the last minute, "
+                f"{counts['pending']} pending"
+            )
@@ -0,0 +1,25 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """
+    Run the block against a freshly migrated test database, as `manage.py
+    test` would, so benchmarks never write to the configured one.
+    """
+    for alias in connections:
+        config = connections[alias].settings_dict
+        if config["ENGINE"].endswith("sqlite3") and not config["TEST"]["NAME"]:
+            # in memory SQLite locks whole tables against concurrent threads
+            config["TEST"]["NAME"] = os.path.join(
+                tempfile.gettempdir(), f"test_{alias}_{os.getpid()}.sqlite3"
+            )
+    old_config = setup_databases(verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
@@ -0,0 +1,36 @@
+import asyncio
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from . import identity
+
+
+@sync_and_async_middleware
+class IdentityMapMiddleware:
+    """
+    Give every request its own identity map. With DEBUG on, the number of
+    repeated loads it saved is sent back in `X-Identity-Map-Avoided`.
+    Under ASGI the request stays on the event loop through here.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # tells Django to await this instance, as MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with identity.scope() as identity_map:
+            response = self.get_response(request)
+        return self.report(response, identity_map)
+
+    async def __acall__(self, request):
+        with identity.scope() as identity_map:
+            response = await self.get_response(request)
+        return self.report(response, identity_map)
+
+    def report(self, response, identity_map):
+        if settings.DEBUG:
+            response["X-Identity-Map-Avoided"] = str(identity_map.avoided)
+        return response
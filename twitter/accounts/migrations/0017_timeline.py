@@ -0,0 +1,99 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_timelines(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+    Tweet = apps.get_model("accounts", "Tweet")
+    Timeline = apps.get_model("accounts", "Timeline")
+    for user in User.objects.iterator():
+        author_ids = [user.id, *user.following.values_list("id", flat=True)]
+        tweets = Tweet.objects.filter(user_id__in=author_ids).values_list(
+            "id", "user_id", "created_at"
+        )
+        Timeline.objects.bulk_create(
+            [
+                Timeline(
+                    user_id=user.id,
+                    tweet_id=tweet_id,
+                    author_id=author_id,
+                    created_at=created_at,
+                )
+                for tweet_id, author_id, created_at in tweets.iterator()
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0016_alter_likes_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Timeline",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "tweet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to="accounts.tweet",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="timeline",
+            index=models.Index(
+                fields=["user", "-created_at"], name="accounts_ti_user_id_695247_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="timeline",
+            index=models.Index(
+                fields=["user", "author"], name="accounts_ti_user_id_d65f2d_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="timeline",
+            unique_together={("user", "tweet")},
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
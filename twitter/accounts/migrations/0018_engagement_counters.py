@@ -0,0 +1,87 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def recount(model, field, source, fk, condition=Q()):
+    total = (
+        source.objects.filter(condition, **{fk: OuterRef("pk")})
+        .order_by()
+        .values(fk)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    model.objects.update(**{field: Coalesce(Subquery(total), 0)})
+
+
+def recount_counters(apps):
+    # a copy of counters.recount_all as of this migration
+    User = apps.get_model("accounts", "User")
+    Tweet = apps.get_model("accounts", "Tweet")
+    Reply = apps.get_model("accounts", "Reply")
+    Choice = apps.get_model("accounts", "Choice")
+    Likes = apps.get_model("accounts", "Likes")
+    Vote = apps.get_model("accounts", "Vote")
+    Follow = User.followers.through
+    for model, field, source, fk in [
+        (Tweet, "likes_count", Likes, "tweet"),
+        (Tweet, "replies_count", Reply, "tweet"),
+        (Reply, "likes_count", Likes, "reply"),
+        (Choice, "votes_count", Vote, "choice"),
+        (User, "tweets_count", Tweet, "user"),
+        (User, "followers_count", Follow, "from_user"),
+        (User, "following_count", Follow, "to_user"),
+    ]:
+        recount(model, field, source, fk)
+
+
+def fill_counters(apps, schema_editor):
+    recount_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0017_timeline"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="choice",
+            name="votes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="reply",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="replies_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="tweets_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def recount(model, field, source, fk, condition=Q()):
+    total = (
+        source.objects.filter(condition, **{fk: OuterRef("pk")})
+        .order_by()
+        .values(fk)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    model.objects.update(**{field: Coalesce(Subquery(total), 0)})
+
+
+def recount_counters(apps):
+    # a copy of counters.recount_all as of this migration
+    User = apps.get_model("accounts", "User")
+    Tweet = apps.get_model("accounts", "Tweet")
+    Reply = apps.get_model("accounts", "Reply")
+    Choice = apps.get_model("accounts", "Choice")
+    Likes = apps.get_model("accounts", "Likes")
+    Vote = apps.get_model("accounts", "Vote")
+    Follow = User.followers.through
+    for model, field, source, fk in [
+        (Tweet, "likes_count", Likes, "tweet"),
+        (Tweet, "replies_count", Reply, "tweet"),
+        (Reply, "likes_count", Likes, "reply"),
+        (Choice, "votes_count", Vote, "choice"),
+        (User, "tweets_count", Tweet, "user"),
+        (User, "followers_count", Follow, "from_user"),
+        (User, "following_count", Follow, "to_user"),
+    ]:
+        recount(model, field, source, fk)
+
+
+def delete_duplicates(apps, schema_editor):
+    Likes = apps.get_model("accounts", "Likes")
+    Vote = apps.get_model("accounts", "Vote")
+    for model, fields in (
+        (Likes, ("user", "tweet")),
+        (Likes, ("user", "reply")),
+        (Vote, ("user", "choice")),
+    ):
+        keep = (
+            model.objects.filter(**{f"{fields[1]}__isnull": False})
+            .values(*fields)
+            .annotate(keep_id=models.Min("id"), total=models.Count("id"))
+            .filter(total__gt=1)
+        )
+        for row in keep:
+            model.objects.filter(**{field: row[field] for field in fields}).exclude(
+                id=row["keep_id"]
+            ).delete()
+    recount_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0018_engagement_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="likes",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("tweet__isnull", False)),
+                fields=("user", "tweet"),
+                name="unique_like_per_tweet",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="likes",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("reply__isnull", False)),
+                fields=("user", "reply"),
+                name="unique_like_per_reply",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="vote",
+            constraint=models.UniqueConstraint(
+                fields=("user", "choice"), name="unique_vote_per_choice"
+            ),
+        ),
+    ]
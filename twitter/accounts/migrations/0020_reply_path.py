@@ -0,0 +1,41 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    # a copy of threads.rebuild_paths as of this migration
+    Reply = apps.get_model("accounts", "Reply")
+    parents = dict(Reply.objects.values_list("id", "parent_id").iterator())
+    paths = {}
+    for reply_id in parents:
+        chain = []
+        while reply_id is not None and reply_id not in paths:
+            chain.append(reply_id)
+            reply_id = parents.get(reply_id)
+        prefix = paths.get(reply_id, "")
+        for node_id in reversed(chain):
+            prefix = paths[node_id] = f"{prefix}{node_id:010d}/"
+    Reply.objects.bulk_update(
+        [Reply(id=reply_id, path=path) for reply_id, path in paths.items()],
+        ["path"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0019_unique_likes_and_votes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reply",
+            name="path",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=255
+            ),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
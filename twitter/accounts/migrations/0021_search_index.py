@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def fts_sql(table, content):
+    return [
+        f"CREATE VIRTUAL TABLE {table} USING fts5("
+        f"context, content='{content}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {table}_insert AFTER INSERT ON {content} BEGIN "
+        f"INSERT INTO {table}(rowid, context) VALUES (new.id, new.context); END",
+        f"CREATE TRIGGER {table}_delete AFTER DELETE ON {content} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, context) "
+        "VALUES ('delete', old.id, old.context); END",
+        f"CREATE TRIGGER {table}_update AFTER UPDATE OF context ON {content} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, context) "
+        "VALUES ('delete', old.id, old.context); "
+        f"INSERT INTO {table}(rowid, context) VALUES (new.id, new.context); END",
+        f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+    ]
+
+
+def drop_sql(table):
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_insert",
+        f"DROP TRIGGER IF EXISTS {table}_delete",
+        f"DROP TRIGGER IF EXISTS {table}_update",
+        f"DROP TABLE IF EXISTS {table}",
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0020_reply_path"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            fts_sql("accounts_tweet_fts", "accounts_tweet"),
+            drop_sql("accounts_tweet_fts"),
+        ),
+        migrations.RunSQL(
+            fts_sql("accounts_reply_fts", "accounts_reply"),
+            drop_sql("accounts_reply_fts"),
+        ),
+    ]
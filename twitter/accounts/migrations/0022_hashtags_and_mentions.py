@@ -0,0 +1,154 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:27
+
+import re
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# copies of the tags.HASHTAG and tags.MENTION patterns as of this migration
+HASHTAG = re.compile(r"(?<![\w#])#(\w{1,100})")
+MENTION = re.compile(r"(?<![\w@])@(\w{1,150})")
+
+
+def index_existing(apps, schema_editor):
+    # a copy of tags.backfill as of this migration
+    Hashtag = apps.get_model("accounts", "Hashtag")
+    Mention = apps.get_model("accounts", "Mention")
+    User = apps.get_model("accounts", "User")
+    for owner in ("tweet", "reply"):
+        model = apps.get_model("accounts", owner.capitalize())
+        hashtags, mentions = [], {}
+        for pk, context in model.objects.values_list("id", "context").iterator():
+            hashtags += [
+                Hashtag(tag=tag, **{f"{owner}_id": pk})
+                for tag in {tag.lower() for tag in HASHTAG.findall(context or "")}
+            ]
+            for username in set(MENTION.findall(context or "")):
+                mentions.setdefault(username, []).append(pk)
+        users = User.objects.filter(username__in=mentions).values_list("username", "id")
+        Hashtag.objects.bulk_create(hashtags, batch_size=1000, ignore_conflicts=True)
+        Mention.objects.bulk_create(
+            [
+                Mention(user_id=user_id, **{f"{owner}_id": pk})
+                for username, user_id in users
+                for pk in mentions[username]
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0021_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Mention",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "reply",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mentions",
+                        to="accounts.reply",
+                    ),
+                ),
+                (
+                    "tweet",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mentions",
+                        to="accounts.tweet",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mentions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Hashtag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tag", models.CharField(max_length=100)),
+                (
+                    "reply",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hashtags",
+                        to="accounts.reply",
+                    ),
+                ),
+                (
+                    "tweet",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hashtags",
+                        to="accounts.tweet",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="mention",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("tweet__isnull", False)),
+                fields=("user", "tweet"),
+                name="unique_mention_per_tweet",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="mention",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("reply__isnull", False)),
+                fields=("user", "reply"),
+                name="unique_mention_per_reply",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="hashtag",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("tweet__isnull", False)),
+                fields=("tag", "tweet"),
+                name="unique_hashtag_per_tweet",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="hashtag",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("reply__isnull", False)),
+                fields=("tag", "reply"),
+                name="unique_hashtag_per_reply",
+            ),
+        ),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
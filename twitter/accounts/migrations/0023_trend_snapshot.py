@@ -0,0 +1,22 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_hashtags_and_mentions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('data', models.BinaryField()),
+                ('saved_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
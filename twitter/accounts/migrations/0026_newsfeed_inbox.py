@@ -0,0 +1,42 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def recount_unread(apps, schema_editor):
+    # a copy of counters.recount as of this migration
+    User = apps.get_model("accounts", "User")
+    NewsFeed = apps.get_model("accounts", "NewsFeed")
+    unread = (
+        NewsFeed.objects.filter(is_read=False, to_user=OuterRef("pk"))
+        .order_by()
+        .values("to_user")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    User.objects.update(unread_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0025_persisted_query"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="unread_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="newsfeed",
+            index=models.Index(
+                fields=["to_user", "-created_at", "-id"],
+                name="accounts_ne_to_user_a4a4de_idx",
+            ),
+        ),
+        migrations.RunPython(recount_unread, migrations.RunPython.noop),
+    ]
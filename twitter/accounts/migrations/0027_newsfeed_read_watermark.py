@@ -0,0 +1,95 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max, Min, Q
+import django.db.models.deletion
+
+
+def fold_read_flags(apps, schema_editor):
+    """
+    Move each recipient's watermark up to their newest read entry older
+    than their oldest unread one, and keep the entries read past it as
+    NewsFeedRead exceptions.
+    """
+    User = apps.get_model("accounts", "User")
+    NewsFeed = apps.get_model("accounts", "NewsFeed")
+    NewsFeedRead = apps.get_model("accounts", "NewsFeedRead")
+    received = NewsFeed.objects.exclude(to_user=None)
+    oldest_unread = dict(
+        received.filter(is_read=False)
+        .values("to_user")
+        .annotate(at=Min("created_at"))
+        .values_list("to_user", "at")
+    )
+    readers = received.filter(is_read=True).values_list("to_user", flat=True)
+    for user_id in set(readers):
+        read = received.filter(to_user=user_id, is_read=True)
+        unread_at = oldest_unread.get(user_id)
+        if unread_at is not None:
+            ahead = read.filter(created_at__gte=unread_at).values_list("id", flat=True)
+            NewsFeedRead.objects.bulk_create(
+                [NewsFeedRead(user_id=user_id, newsfeed_id=pk) for pk in ahead],
+                batch_size=1000,
+            )
+            read = read.filter(created_at__lt=unread_at)
+        watermark = read.aggregate(at=Max("created_at"))["at"]
+        if watermark is not None:
+            User.objects.filter(id=user_id).update(newsfeed_read_at=watermark)
+
+
+def unfold_read_flags(apps, schema_editor):
+    NewsFeed = apps.get_model("accounts", "NewsFeed")
+    NewsFeed.objects.filter(
+        Q(read_mark__isnull=False) | Q(created_at__lte=F("to_user__newsfeed_read_at"))
+    ).update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0026_newsfeed_inbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="newsfeed_read_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.CreateModel(
+            name="NewsFeedRead",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "newsfeed",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="read_mark",
+                        to="accounts.newsfeed",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(fold_read_flags, unfold_read_flags),
+        migrations.RemoveField(
+            model_name="newsfeed",
+            name="is_read",
+        ),
+    ]
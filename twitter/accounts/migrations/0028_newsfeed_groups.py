@@ -0,0 +1,35 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0027_newsfeed_read_watermark"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newsfeed",
+            name="actor_count",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="newsfeed",
+            name="group_key",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="newsfeed",
+            name="sample_actors",
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddIndex(
+            model_name="newsfeed",
+            index=models.Index(
+                fields=["to_user", "group_key", "-created_at"],
+                name="accounts_ne_to_user_529892_idx",
+            ),
+        ),
+    ]
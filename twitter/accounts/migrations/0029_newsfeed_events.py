@@ -0,0 +1,33 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0028_newsfeed_groups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newsfeed",
+            name="object_id",
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="newsfeed",
+            name="object_type",
+            field=models.CharField(blank=True, default="", max_length=8),
+        ),
+        migrations.AddField(
+            model_name="newsfeed",
+            name="verb",
+            field=models.CharField(blank=True, default="", max_length=8),
+        ),
+        migrations.AlterField(
+            model_name="newsfeed",
+            name="description",
+            field=models.CharField(blank=True, default="", max_length=250),
+        ),
+    ]
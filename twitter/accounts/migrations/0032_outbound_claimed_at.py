@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0031_outbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboundmessage",
+            name="claimed_at",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.0.6 on 2026-10-18 03:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def close_duplicate_groups(apps, schema_editor):
+    # only the latest entry of a group stays open
+    NewsFeed = apps.get_model("accounts", "NewsFeed")
+    latest = {}
+    grouped = NewsFeed.objects.exclude(group_key="").order_by("created_at", "id")
+    for pk, to_user_id, group_key in grouped.values_list(
+        "id", "to_user_id", "group_key"
+    ).iterator():
+        latest[(to_user_id, group_key)] = pk
+    grouped.exclude(id__in=latest.values()).update(group_key="")
+
+
+def record_sample_actors(apps, schema_editor):
+    # the samples are all that is known of earlier actors
+    NewsFeed = apps.get_model("accounts", "NewsFeed")
+    NewsFeedActor = apps.get_model("accounts", "NewsFeedActor")
+    User = apps.get_model("accounts", "User")
+    users = set(User.objects.values_list("id", flat=True))
+    grouped = NewsFeed.objects.exclude(group_key="").values_list("id", "sample_actors")
+    NewsFeedActor.objects.bulk_create(
+        (
+            NewsFeedActor(newsfeed_id=pk, actor_id=actor_id)
+            for pk, actors in grouped.iterator()
+            for actor_id in set(actors)
+            if actor_id in users
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0032_outbound_claimed_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NewsFeedActor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name="newsfeed",
+            name="accounts_ne_to_user_529892_idx",
+        ),
+        migrations.RunPython(close_duplicate_groups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="newsfeed",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("group_key", ""), _negated=True),
+                fields=("to_user", "group_key"),
+                name="unique_open_newsfeed_group",
+            ),
+        ),
+        migrations.AddField(
+            model_name="newsfeedactor",
+            name="actor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="newsfeedactor",
+            name="newsfeed",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="actors",
+                to="accounts.newsfeed",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="newsfeedactor",
+            constraint=models.UniqueConstraint(
+                fields=("newsfeed", "actor"), name="unique_newsfeed_actor"
+            ),
+        ),
+        migrations.RunPython(record_sample_actors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0033_newsfeed_group_actors"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="trendsnapshot",
+            name="name",
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
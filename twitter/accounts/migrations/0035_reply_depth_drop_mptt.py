@@ -0,0 +1,85 @@
+# Generated by Django 4.0.6 on 2026-10-18 03:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Length
+
+
+def fill_depths(apps, schema_editor):
+    # every path segment is a 10 digit id and a slash
+    Reply = apps.get_model("accounts", "Reply")
+    Reply.objects.exclude(path="").update(depth=Length("path") / 11 - 1)
+
+
+# SQLite rebuilds accounts_reply for the field changes below, which drops
+# the search index triggers 0021 created on it, so they are made again
+TRIGGERS = [
+    "CREATE TRIGGER accounts_reply_fts_insert AFTER INSERT ON accounts_reply "
+    "BEGIN INSERT INTO accounts_reply_fts(rowid, context) "
+    "VALUES (new.id, new.context); END",
+    "CREATE TRIGGER accounts_reply_fts_delete AFTER DELETE ON accounts_reply "
+    "BEGIN INSERT INTO accounts_reply_fts(accounts_reply_fts, rowid, context) "
+    "VALUES ('delete', old.id, old.context); END",
+    "CREATE TRIGGER accounts_reply_fts_update "
+    "AFTER UPDATE OF context ON accounts_reply "
+    "BEGIN INSERT INTO accounts_reply_fts(accounts_reply_fts, rowid, context) "
+    "VALUES ('delete', old.id, old.context); "
+    "INSERT INTO accounts_reply_fts(rowid, context) "
+    "VALUES (new.id, new.context); END",
+    "INSERT INTO accounts_reply_fts(accounts_reply_fts) VALUES ('rebuild')",
+]
+DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS accounts_reply_fts_insert",
+    "DROP TRIGGER IF EXISTS accounts_reply_fts_delete",
+    "DROP TRIGGER IF EXISTS accounts_reply_fts_update",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0034_trend_snapshot_per_process"),
+    ]
+
+    operations = [
+        # unapplying rebuilds the table again, this restores the triggers after
+        migrations.RunSQL(migrations.RunSQL.noop, TRIGGERS),
+        migrations.RemoveField(
+            model_name="reply",
+            name="level",
+        ),
+        migrations.RemoveField(
+            model_name="reply",
+            name="lft",
+        ),
+        migrations.RemoveField(
+            model_name="reply",
+            name="rght",
+        ),
+        migrations.RemoveField(
+            model_name="reply",
+            name="tree_id",
+        ),
+        migrations.AddField(
+            model_name="reply",
+            name="depth",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_depths, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="reply",
+            name="parent",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="children",
+                to="accounts.reply",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reply",
+            name="path",
+            field=models.TextField(blank=True, db_index=True, default=""),
+        ),
+        migrations.RunSQL(TRIGGERS, DROP_TRIGGERS),
+    ]
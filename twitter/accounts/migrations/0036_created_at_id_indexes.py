@@ -0,0 +1,25 @@
+# Generated by Django 4.0.6 on 2026-10-18 03:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0035_reply_depth_drop_mptt"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reply",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="accounts_re_created_3c2dba_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="accounts_tw_created_fdde42_idx"
+            ),
+        ),
+    ]
@@ -1,10 +1,14 @@
 from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser, UserManager
-from mptt.models import MPTTModel, TreeForeignKey
 from django.utils import timezone
 import datetime
 from django.urls import reverse
+from .counters import CounterFields, current
+
+# replies are stored as a materialized path, so an insert only writes the new
+# row, see accounts/threads.py
+REPLY_PATH_WIDTH = 10
 
 
 class ProfileImage(models.Model):
@@ -34,7 +38,7 @@ class Question(models.Model):
         return now - datetime.timedelta(days=1) <= self.pub_date <= now
 
 
-class Tweet(models.Model):
+class Tweet(CounterFields, models.Model):
     context = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -46,47 +50,46 @@ class Tweet(models.Model):
     question = models.OneToOneField(
         Question, on_delete=models.CASCADE, related_name="tweet", null=True
     )
+    likes_count = models.PositiveIntegerField(default=0)
+    replies_count = models.PositiveIntegerField(default=0)
+    counter_fields = ("likes_count", "replies_count")
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # serves pagination.CREATED_AT_ORDERING
+            models.Index(fields=["-created_at", "-id"]),
+        ]
 
     def __str__(self):
         return f"{self.user}"
 
-    def user_can_like(self, user):
-        user_likes = user.likes.all()
-        qs = user_likes.filter(tweet=self)
-        if qs.exists():
-            return False
-        return True
-
     @property
     def get_likes_count(self):
-        return self.likes.count()
+        return current(self, "likes_count")
+
+    @property
+    def get_replies_count(self):
+        return current(self, "replies_count")
 
     def get_absolute_url(self):
         return reverse("accounts:tweet", kwargs={"pk": self.pk})
 
 
-class Choice(models.Model):
+class Choice(CounterFields, models.Model):
     question = models.ForeignKey(
         Question, on_delete=models.CASCADE, related_name="choices", null=True
     )
     text = models.CharField(max_length=25)
+    votes_count = models.PositiveIntegerField(default=0)
+    counter_fields = ("votes_count",)
 
     def __str__(self):
         return self.text
 
     @property
     def get_vote_count(self):
-        return self.votes.count()
-
-    def user_can_vote(self, user):
-        user_votes = user.votes.all()
-        qs = user_votes.filter(choice=self)
-        if qs.exists():
-            return False
-        return True
+        return current(self, "votes_count")
 
 
 class Vote(models.Model):
@@ -95,6 +98,13 @@ class Vote(models.Model):
     )
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "choice"], name="unique_vote_per_choice"
+            )
+        ]
+
     def __str__(self):
         return f"{self.user} voted for {self.choice.text[:15]}"
 
@@ -110,11 +120,25 @@ class Likes(models.Model):
         "Reply", on_delete=models.CASCADE, null=True, related_name="likes"
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "tweet"],
+                condition=models.Q(tweet__isnull=False),
+                name="unique_like_per_tweet",
+            ),
+            models.UniqueConstraint(
+                fields=["user", "reply"],
+                condition=models.Q(reply__isnull=False),
+                name="unique_like_per_reply",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user} liked"
 
 
-class User(AbstractUser):
+class User(CounterFields, AbstractUser):
     is_online = models.BooleanField(default=False)
     profile = models.OneToOneField(
         Profile, on_delete=models.CASCADE, related_name="user", null=True
@@ -125,6 +149,19 @@ class User(AbstractUser):
     email = models.EmailField(verbose_name="email address", max_length=255, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    tweets_count = models.PositiveIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+    newsfeed_read_at = models.DateTimeField(null=True)
+    # the read watermark moves under inbox's row lock, like the counts
+    counter_fields = (
+        "followers_count",
+        "following_count",
+        "tweets_count",
+        "unread_count",
+        "newsfeed_read_at",
+    )
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
@@ -137,11 +174,11 @@ class User(AbstractUser):
         return f"{self.username}"
 
 
-class Reply(MPTTModel):
+class Reply(CounterFields, models.Model):
     context = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
-    parent = TreeForeignKey(
+    parent = models.ForeignKey(
         "self", on_delete=models.CASCADE, related_name="children", null=True
     )
     tweet = models.ForeignKey(
@@ -154,20 +191,32 @@ class Reply(MPTTModel):
         null=True,
     )
     file = models.FileField(upload_to="media/")
+    likes_count = models.PositiveIntegerField(default=0)
+    counter_fields = ("likes_count",)
+    # "<root id>/<child id>/.../<own id>/", written once the id is known
+    path = models.TextField(db_index=True, blank=True, default="")
+    depth = models.PositiveIntegerField(default=0)
 
-    class MPTTMeta:
-        order_insertion_by = ["-created_at"]
-
-    def user_can_like(self, user):
-        user_likes = user.likes.all()
-        qs = user_likes.filter(reply=self)
-        if qs.exists():
-            return False
-        return True
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding and self.parent_id is not None:
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+        if adding:
+            parent_path = ""
+            if self.parent_id is not None:
+                parent_path = self.parent.path
+            self.path = f"{parent_path}{self.pk:0{REPLY_PATH_WIDTH}d}/"
+            Reply.objects.filter(pk=self.pk).update(path=self.path)
 
     @property
     def get_likes_count(self):
-        return self.likes.count()
+        return current(self, "likes_count")
 
 
 class NewsFeed(models.Model):
@@ -177,11 +226,241 @@ class NewsFeed(models.Model):
         related_name="news_feed",
     )
     created_at = models.DateTimeField(default=timezone.now)
-    description = models.CharField(max_length=250)
-    is_read = models.BooleanField(default=False)
+    description = models.CharField(max_length=250, blank=True, default="")
     to_user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="received_news_feed",
         null=True,
     )
+    # typed events are described on read by accounts.events.render
+    verb = models.CharField(max_length=8, blank=True, default="")
+    object_type = models.CharField(max_length=8, blank=True, default="")
+    object_id = models.PositiveBigIntegerField(null=True)
+    # events sharing a group key fold into one entry, see inbox.coalesce;
+    # the key is cleared once the entry's window closes, so a recipient has
+    # at most one open entry per group
+    group_key = models.CharField(max_length=100, blank=True, default="")
+    actor_count = models.PositiveIntegerField(default=1)
+    sample_actors = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["to_user", "-created_at", "-id"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["to_user", "group_key"],
+                condition=~models.Q(group_key=""),
+                name="unique_open_newsfeed_group",
+            )
+        ]
+
+
+class NewsFeedActor(models.Model):
+    """
+    Every user counted in a grouped entry's actor_count, so a repeated
+    action is only counted once.
+    """
+
+    newsfeed = models.ForeignKey(
+        NewsFeed, on_delete=models.CASCADE, related_name="actors"
+    )
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["newsfeed", "actor"], name="unique_newsfeed_actor"
+            )
+        ]
+
+
+class NewsFeedRead(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    newsfeed = models.OneToOneField(
+        NewsFeed, on_delete=models.CASCADE, related_name="read_mark"
+    )
+
+    def __str__(self):
+        return f"{self.newsfeed_id} read by {self.user_id}"
+
+
+class Timeline(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline"
+    )
+    tweet = models.ForeignKey(
+        Tweet, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-created_at"]
+        unique_together = ("user", "tweet")
+        indexes = [
+            models.Index(fields=["user", "-created_at"]),
+            models.Index(fields=["user", "author"]),
+        ]
+
+    def __str__(self):
+        return f"{self.tweet_id} in {self.user}'s timeline"
+
+
+class Hashtag(models.Model):
+    tag = models.CharField(max_length=100)
+    tweet = models.ForeignKey(
+        Tweet, on_delete=models.CASCADE, null=True, related_name="hashtags"
+    )
+    reply = models.ForeignKey(
+        Reply, on_delete=models.CASCADE, null=True, related_name="hashtags"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tag", "tweet"],
+                condition=models.Q(tweet__isnull=False),
+                name="unique_hashtag_per_tweet",
+            ),
+            models.UniqueConstraint(
+                fields=["tag", "reply"],
+                condition=models.Q(reply__isnull=False),
+                name="unique_hashtag_per_reply",
+            ),
+        ]
+
+    def __str__(self):
+        return f"#{self.tag}"
+
+
+class Mention(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="mentions"
+    )
+    tweet = models.ForeignKey(
+        Tweet, on_delete=models.CASCADE, null=True, related_name="mentions"
+    )
+    reply = models.ForeignKey(
+        Reply, on_delete=models.CASCADE, null=True, related_name="mentions"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "tweet"],
+                condition=models.Q(tweet__isnull=False),
+                name="unique_mention_per_tweet",
+            ),
+            models.UniqueConstraint(
+                fields=["user", "reply"],
+                condition=models.Q(reply__isnull=False),
+                name="unique_mention_per_reply",
+            ),
+        ]
+
+    def __str__(self):
+        return f"@{self.user}"
+
+
+class TrendSnapshot(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    data = models.BinaryField()
+    saved_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} trends at {self.saved_at}"
+
+
+class BrokerEvent(models.Model):
+    channel = models.CharField(max_length=100)
+    message = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.channel}: {self.message}"
+
+
+class PersistedQuery(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    query = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.sha256
+
+
+class Job(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"
+
+    queue = models.CharField(max_length=50, default="default")
+    task = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, default=PENDING)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # a running job whose lease expired is up for grabs again, see accounts.jobs
+    leased_by = models.CharField(max_length=100, blank=True, default="")
+    leased_until = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "queue", "run_at"]),
+            models.Index(fields=["finished_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+
+class OutboundMessage(models.Model):
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="outbound_messages",
+        null=True,
+    )
+    # clients may send an Idempotency-Key header so a retried POST queues once
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
+    provider = models.CharField(max_length=20)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    provider_message_id = models.CharField(max_length=100, blank=True, default="")
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+    # when the current send started, a SENDING message older than
+    # OUTBOX_SEND_TIMEOUT lost its worker
+    claimed_at = models.DateTimeField(null=True)
+    sent_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["created_by", "idempotency_key"],
+                name="unique_outbound_idempotency_key",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.provider} message {self.id} ({self.status})"
@@ -0,0 +1,240 @@
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from sendgrid import SendGridAPIClient
+from sendgrid.helpers.mail import Content, CustomArg, From, Mail, Subject, To
+from twilio.rest import Client
+from . import jobs
+from .models import Job, OutboundMessage
+
+MAX_ATTEMPTS = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+BACKENDS = getattr(
+    settings,
+    "OUTBOX_BACKENDS",
+    {
+        "twilio": "accounts.outbox.TwilioBackend",
+        "sendgrid": "accounts.outbox.SendGridBackend",
+        "smtp": "accounts.outbox.SMTPBackend",
+    },
+)
+CONCURRENCY = getattr(settings, "OUTBOX_CONCURRENCY", {})
+DEFAULT_CONCURRENCY = 4
+BUSY_WAIT = getattr(settings, "OUTBOX_BUSY_WAIT", 5.0)
+SEND_TIMEOUT = getattr(settings, "OUTBOX_SEND_TIMEOUT", 600)
+
+
+class TwilioBackend:
+    def __init__(self):
+        self.client = Client(settings.ACCOUNTSID, settings.AUTHTOKEN)
+
+    def send(self, message):
+        sent = self.client.messages.create(
+            body=message.payload["body"],
+            messaging_service_sid=os.getenv("messaging_service_sid"),
+            from_=settings.TWILIOPHONENUMBER,
+            to=message.payload["to"],
+        )
+        return sent.sid
+
+
+class SendGridBackend:
+    def __init__(self):
+        self.client = SendGridAPIClient(os.environ.get("SENDGRID_API_KEY"))
+
+    def send(self, message):
+        payload = message.payload
+        mail = Mail(
+            from_email=From(payload["from_email"], payload.get("from_name")),
+            to_emails=[To(email) for email in payload["to_emails"]],
+            subject=Subject(payload["subject"]),
+        )
+        mail.add_content(Content(payload["mime_type"], payload["content"]))
+        # lets a resend after a lost response be matched to the first send
+        mail.add_custom_arg(CustomArg("outbox_id", str(message.id)))
+        response = self.client.send(mail)
+        return response.headers.get("X-Message-Id", "")
+
+
+class SMTPBackend:
+    def send(self, message):
+        payload = message.payload
+        send_mail(
+            subject=payload["subject"],
+            message=payload["message"],
+            from_email=payload["from_email"],
+            recipient_list=payload["to_emails"],
+            fail_silently=False,
+        )
+        return ""
+
+
+class FakeBackend:
+    """
+    Keeps messages in memory instead of sending them, for tests and
+    benchmarks. OUTBOX_FAKE_LATENCY seconds per send and an
+    OUTBOX_FAKE_FAILURE_RATE share of errors stand in for a provider.
+    """
+
+    sent = deque(maxlen=10000)
+
+    def __init__(self):
+        self.latency = getattr(settings, "OUTBOX_FAKE_LATENCY", 0.0)
+        self.failure_rate = getattr(settings, "OUTBOX_FAKE_FAILURE_RATE", 0.0)
+
+    def send(self, message):
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("fake provider unavailable")
+        self.sent.append((message.provider, message.payload))
+        return f"fake-{uuid.uuid4().hex}"
+
+
+_lock = threading.Lock()
+_backends = {}
+_limits = {}
+
+
+def backend(provider):
+    with _lock:
+        if provider not in _backends:
+            _backends[provider] = import_string(BACKENDS[provider])()
+        return _backends[provider]
+
+
+def limit(provider):
+    with _lock:
+        if provider not in _limits:
+            size = CONCURRENCY.get(provider, DEFAULT_CONCURRENCY)
+            _limits[provider] = threading.BoundedSemaphore(size)
+        return _limits[provider]
+
+
+def schedule(message, delay=0):
+    jobs.enqueue(
+        deliver,
+        {"message_id": message.id},
+        queue=f"outbox.{message.provider}",
+        delay=delay,
+        max_attempts=MAX_ATTEMPTS,
+    )
+
+
+def queue(provider, payload, created_by=None, idempotency_key=None):
+    """
+    Write a message to the outbox together with the job that delivers it.
+    A repeated idempotency key returns the message it first queued.
+    """
+    if provider not in BACKENDS:
+        raise ValueError(f"unknown provider {provider}")
+    if idempotency_key:
+        existing = OutboundMessage.objects.filter(
+            created_by=created_by, idempotency_key=idempotency_key
+        ).first()
+        if existing is not None:
+            return existing
+    try:
+        with transaction.atomic():
+            message = OutboundMessage.objects.create(
+                created_by=created_by,
+                idempotency_key=idempotency_key or None,
+                provider=provider,
+                payload=payload,
+            )
+            schedule(message)
+    except IntegrityError:
+        # the same key came in concurrently and won
+        return OutboundMessage.objects.get(
+            created_by=created_by, idempotency_key=idempotency_key
+        )
+    return message
+
+
+def deliver(message_id):
+    """
+    Job body sending one outbox message, with at most
+    OUTBOX_CONCURRENCY[provider] sends in flight per process. The message
+    is claimed by moving it from QUEUED to SENDING, so of two runs for the
+    same message only one sends. A failure is raised so the job queue
+    retries it with backoff.
+    """
+    message = OutboundMessage.objects.filter(
+        id=message_id, status=OutboundMessage.QUEUED
+    ).first()
+    if message is None:
+        return
+    slot = limit(message.provider)
+    if not slot.acquire(timeout=BUSY_WAIT):
+        # the provider is saturated here, come back without using an attempt
+        schedule(message, delay=1)
+        return
+    try:
+        claimed = OutboundMessage.objects.filter(
+            id=message.id, status=OutboundMessage.QUEUED, attempts=message.attempts
+        ).update(
+            status=OutboundMessage.SENDING,
+            attempts=F("attempts") + 1,
+            claimed_at=timezone.now(),
+        )
+        if not claimed:
+            # another run got here first
+            return
+        message.attempts += 1
+        # updates below only apply while this run still holds the claim
+        ours = OutboundMessage.objects.filter(
+            id=message.id, status=OutboundMessage.SENDING, attempts=message.attempts
+        )
+        try:
+            provider_message_id = backend(message.provider).send(message)
+        except Exception as e:
+            final = message.attempts >= MAX_ATTEMPTS
+            ours.update(
+                status=OutboundMessage.FAILED if final else OutboundMessage.QUEUED,
+                last_error=str(e),
+            )
+            raise
+        ours.update(
+            status=OutboundMessage.SENT,
+            provider_message_id=provider_message_id or "",
+            sent_at=timezone.now(),
+            last_error="",
+        )
+    finally:
+        slot.release()
+
+
+def reap(now=None):
+    """
+    Recover messages whose delivery stopped without an outcome. A message
+    SENDING for longer than SEND_TIMEOUT lost its worker mid-send and goes
+    back to QUEUED; the provider may or may not have it, so it can arrive
+    twice. A QUEUED message left without a pending or running job, because
+    its job went dead, is scheduled again, or failed once out of attempts.
+    """
+    now = now or timezone.now()
+    OutboundMessage.objects.filter(
+        status=OutboundMessage.SENDING,
+        claimed_at__lt=now - timedelta(seconds=SEND_TIMEOUT),
+    ).update(status=OutboundMessage.QUEUED, last_error="send timed out")
+    scheduled = Job.objects.filter(
+        task=f"{deliver.__module__}.{deliver.__qualname__}",
+        status__in=[Job.PENDING, Job.RUNNING],
+        kwargs__message_id=OuterRef("id"),
+    )
+    orphans = OutboundMessage.objects.filter(
+        ~Exists(scheduled),
+        status=OutboundMessage.QUEUED,
+        created_at__lt=now - timedelta(seconds=SEND_TIMEOUT),
+    )
+    orphans.filter(attempts__gte=MAX_ATTEMPTS).update(status=OutboundMessage.FAILED)
+    for message in orphans.filter(attempts__lt=MAX_ATTEMPTS):
+        schedule(message)
@@ -0,0 +1,117 @@
+import base64
+import json
+from dataclasses import dataclass
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = getattr(settings, "PAGINATION_DEFAULT_PAGE_SIZE", 20)
+MAX_PAGE_SIZE = getattr(settings, "PAGINATION_MAX_PAGE_SIZE", 100)
+CREATED_AT_ORDERING = ("-created_at", "-id")
+ID_ORDERING = ("-id",)
+
+
+@dataclass
+class Page:
+    items: list
+    ordering: tuple
+    has_next: bool
+    has_previous: bool
+
+    def cursor_for(self, item):
+        return encode_cursor(item, self.ordering)
+
+    @property
+    def start_cursor(self):
+        return self.cursor_for(self.items[0]) if self.items else None
+
+    @property
+    def end_cursor(self):
+        return self.cursor_for(self.items[-1]) if self.items else None
+
+
+def _field_name(field):
+    return field.lstrip("-")
+
+
+def _reverse(ordering):
+    return tuple(
+        _field_name(field) if field.startswith("-") else f"-{field}"
+        for field in ordering
+    )
+
+
+def encode_cursor(item, ordering):
+    values = [getattr(item, _field_name(field)) for field in ordering]
+    values = [
+        value.isoformat() if hasattr(value, "isoformat") else value for value in values
+    ]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_values(cursor, length):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != length:
+            raise ValueError
+        return values
+    except (ValueError, TypeError):
+        raise ValidationError("invalid cursor")
+
+
+def decode_cursor(cursor, model, ordering):
+    values = decode_values(cursor, len(ordering))
+    try:
+        return [
+            model._meta.get_field(_field_name(field)).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        raise ValidationError("invalid cursor")
+
+
+def _seek(ordering, values):
+    # rows strictly after `values` in `ordering`, as a lexicographic OR of ANDs
+    condition = Q()
+    for index, field in enumerate(ordering):
+        lookup = "lt" if field.startswith("-") else "gt"
+        step = Q(**{f"{_field_name(field)}__{lookup}": values[index]})
+        for previous, value in zip(ordering[:index], values[:index]):
+            step &= Q(**{_field_name(previous): value})
+        condition |= step
+    # a range on the leading column the index can seek to, the OR alone scans
+    first = ordering[0]
+    lookup = "lte" if first.startswith("-") else "gte"
+    return Q(**{f"{_field_name(first)}__{lookup}": values[0]}) & condition
+
+
+def page_size(first=None):
+    if not first or first < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(first, MAX_PAGE_SIZE)
+
+
+def paginate(
+    queryset, ordering=CREATED_AT_ORDERING, first=None, after=None, before=None
+):
+    size = page_size(first)
+    model = queryset.model
+    if before:
+        values = decode_cursor(before, model, ordering)
+        reverse = _reverse(ordering)
+        rows = list(
+            queryset.filter(_seek(reverse, values)).order_by(*reverse)[: size + 1]
+        )
+        has_previous = len(rows) > size
+        items = rows[:size][::-1]
+        # anything not before the cursor comes after this page
+        has_next = queryset.exclude(_seek(reverse, values)).exists()
+        return Page(items, ordering, has_next=has_next, has_previous=has_previous)
+    if after:
+        values = decode_cursor(after, model, ordering)
+        queryset = queryset.filter(_seek(ordering, values))
+    rows = list(queryset.order_by(*ordering)[: size + 1])
+    return Page(
+        rows[:size], ordering, has_next=len(rows) > size, has_previous=bool(after)
+    )
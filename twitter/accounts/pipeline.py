@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import defaultdict, namedtuple
+from itertools import chain
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+from . import events, inbox, jobs
+from .models import Job, Reply, Tweet
+
+QUEUE = "newsfeed"
+
+# what happened, by whom and to what; to_user_id is only set for events
+# addressed to one user, the others find their recipients when processed
+Event = namedtuple("Event", "verb actor_id object_type object_id to_user_id")
+
+
+def _groups(batch):
+    """
+    Map the (verb, object_type, object_id) of every reply and like in
+    `batch` to its recipient and group key, one query per model.
+    """
+    wanted = defaultdict(set)
+    for event in batch:
+        if event.verb in (events.REPLIED, events.LIKED):
+            wanted[(event.verb, event.object_type)].add(event.object_id)
+    groups = {}
+    replies = Reply.objects.filter(id__in=wanted[(events.REPLIED, "reply")])
+    for pk, parent_id, parent_owner, tweet_id, tweet_owner in replies.values_list(
+        "id", "parent_id", "parent__user_id", "tweet_id", "tweet__user_id"
+    ):
+        if parent_id is not None:
+            group = (parent_owner, f"reply:reply:{parent_id}")
+        else:
+            group = (tweet_owner, f"reply:tweet:{tweet_id}")
+        groups[(events.REPLIED, "reply", pk)] = group
+    for object_type, model in (("tweet", Tweet), ("reply", Reply)):
+        liked = model.objects.filter(id__in=wanted[(events.LIKED, object_type)])
+        for pk, owner in liked.values_list("id", "user_id"):
+            groups[(events.LIKED, object_type, pk)] = (
+                owner,
+                f"like:{object_type}:{pk}",
+            )
+    return groups
+
+
+def process(batch):
+    """
+    Write the NewsFeed entries for a batch of events: replies, likes and
+    follows fold into their groups one by one, tweets and mentions are
+    inserted together, streaming followers INBOX_BATCH_SIZE rows at a time.
+    """
+    groups = _groups(batch)
+    plain = []
+    for event in batch:
+        target = (event.object_type, event.object_id)
+        if event.verb == events.TWEETED:
+            followers = inbox.followers_of(event.actor_id).iterator(
+                chunk_size=inbox.BATCH_SIZE
+            )
+            plain.append(inbox.entries(event.actor_id, followers, event.verb, *target))
+        elif event.verb == events.MENTIONED:
+            recipients = [event.to_user_id]
+            plain.append(inbox.entries(event.actor_id, recipients, event.verb, *target))
+        elif event.verb == events.FOLLOWED:
+            inbox.coalesce(event.actor_id, event.to_user_id, "follow", event.verb)
+        else:
+            group = groups.get((event.verb, *target))
+            if group is not None:
+                inbox.coalesce(event.actor_id, *group, event.verb, *target)
+    # the generators are only consumed here, one insert batch at a time
+    inbox.write(chain.from_iterable(plain))
+
+
+def handle(verb, actor_id, object_type="", object_id=None, to_user_id=None):
+    """
+    Job body for a single event, for a newsfeed job retried on its own or
+    run by `manage.py runworkers`.
+    """
+    with transaction.atomic():
+        process([Event(verb, actor_id, object_type, object_id, to_user_id)])
+
+
+class NewsfeedPipeline:
+    """
+    Moves newsfeed generation off the request path. Each event is written
+    as a job on the QUEUE queue in the transaction that caused it, so
+    nothing is written for a rolled back tweet and a committed one survives
+    a crash. `manage.py runworkers` claims those jobs `batch_size` at a
+    time; with `in_process` each web process runs a thread doing the same,
+    for a single process setup such as runserver. Disabled, each event is
+    processed in the committing thread.
+    """
+
+    def __init__(
+        self,
+        enabled=True,
+        batch_size=200,
+        interval=0.5,
+        max_attempts=3,
+        in_process=False,
+    ):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.in_process = in_process
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def publish(self, verb, actor_id, object_type="", object_id=None, to_user_id=None):
+        event = Event(verb, actor_id, object_type, object_id, to_user_id)
+        if not self.enabled:
+            transaction.on_commit(lambda: process([event]))
+            return
+        jobs.enqueue(
+            handle, event._asdict(), queue=QUEUE, max_attempts=self.max_attempts
+        )
+        if self.in_process:
+            transaction.on_commit(self.start)
+
+    def drain(self, worker=None):
+        """
+        Process every ready newsfeed job in the calling thread, a batch at
+        a time, and return how many were claimed. Events that fail are
+        retried with the job queue's backoff.
+        """
+        worker = worker or jobs.worker_name()
+        claimed = 0
+        while True:
+            batch = jobs.claim(worker, [QUEUE], limit=self.batch_size)
+            if not batch:
+                return claimed
+            claimed += len(batch)
+            self._run(batch)
+
+    def _run(self, batch):
+        try:
+            with transaction.atomic():
+                process([Event(**job.kwargs) for job in batch])
+                # done in the same transaction, so a crash can't write twice
+                Job.objects.filter(
+                    id__in=[job.id for job in batch],
+                    status=Job.RUNNING,
+                    leased_by=batch[0].leased_by,
+                ).update(status=Job.DONE, finished_at=timezone.now(), leased_until=None)
+        except Exception:
+            # one by one, so a single bad event doesn't hold up the batch
+            for job in batch:
+                jobs.run(job)
+
+    def stats(self):
+        """
+        The newsfeed queue's counts from jobs.stats(), the same whichever
+        process serves the request.
+        """
+        stats = jobs.stats()
+        queue = stats["queues"].get(QUEUE, {})
+        return {"window_seconds": stats["window_seconds"], **queue}
+
+    def start(self):
+        """
+        Start this process's draining thread unless it is running already.
+        """
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run_worker, name="newsfeed-pipeline", daemon=True
+                )
+                self._worker.start()
+
+    def _run_worker(self):
+        worker = jobs.worker_name("newsfeed")
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.drain(worker)
+            except DatabaseError:
+                # another writer holds SQLite's lock, try again shortly
+                pass
+            finally:
+                close_old_connections()
+
+
+newsfeed_pipeline = NewsfeedPipeline(
+    enabled=getattr(settings, "NEWSFEED_PIPELINE_ENABLED", True),
+    batch_size=getattr(settings, "NEWSFEED_PIPELINE_BATCH_SIZE", 200),
+    interval=getattr(settings, "NEWSFEED_PIPELINE_INTERVAL", 0.5),
+    max_attempts=getattr(settings, "NEWSFEED_PIPELINE_MAX_ATTEMPTS", 3),
+    in_process=getattr(settings, "NEWSFEED_PIPELINE_IN_PROCESS", False),
+)
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .. import pagination
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination seeking on the view's `keyset_ordering`,
+    `(created_at, id)` unless the view says otherwise.
+    """
+
+    ordering = pagination.CREATED_AT_ORDERING
+    page_size_query_param = "page_size"
+    after_query_param = "after"
+    before_query_param = "before"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, "keyset_ordering", self.ordering)
+        return self.paginate_with(
+            request, lambda **params: pagination.paginate(queryset, ordering, **params)
+        )
+
+    def paginate_with(self, request, paginate):
+        """
+        Run any `paginate(first=, after=, before=)` returning a Page, such as
+        a search, with this paginator's query params and links.
+        """
+        self.request = request
+        try:
+            first = int(request.query_params.get(self.page_size_query_param, 0))
+        except ValueError:
+            first = None
+        try:
+            self.page = paginate(
+                first=first,
+                after=request.query_params.get(self.after_query_param),
+                before=request.query_params.get(self.before_query_param),
+            )
+        except ValidationError:
+            raise NotFound("Invalid cursor")
+        return self.page.items
+
+    def _page_link(self, param, cursor):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.after_query_param)
+        url = remove_query_param(url, self.before_query_param)
+        return replace_query_param(url, param, cursor)
+
+    def get_next_link(self):
+        if not self.page.has_next or not self.page.items:
+            return None
+        return self._page_link(self.after_query_param, self.page.end_cursor)
+
+    def get_previous_link(self):
+        if not self.page.has_previous or not self.page.items:
+            return None
+        return self._page_link(self.before_query_param, self.page.start_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
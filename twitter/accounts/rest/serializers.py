@@ -1,8 +1,8 @@
-import os
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from ..graphql.schema import get_like_by_reply, get_tweet_by_id, get_user_by_id
+from ..graphql.schema import get_user_by_id
+from .. import engagement, identity, outbox, timelines
 from ..models import (
     User,
     Tweet,
@@ -14,14 +14,11 @@ from ..models import (
     Likes,
     Vote,
     NewsFeed,
+    OutboundMessage,
 )
 import logging
-from twilio.rest import Client
 from django.conf import settings
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import *
-from django.core.mail import send_mail
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
@@ -77,6 +74,9 @@ class UserSerializer(serializers.ModelSerializer):
             "is_active",
             "created_at",
             "updated_at",
+            "followers_count",
+            "following_count",
+            "tweets_count",
         ]
 
         extra_kwargs = {
@@ -84,6 +84,9 @@ class UserSerializer(serializers.ModelSerializer):
             "followers": {"read_only": True},
             "is_online": {"read_only": True},
             "following": {"read_only": True},
+            "followers_count": {"read_only": True},
+            "following_count": {"read_only": True},
+            "tweets_count": {"read_only": True},
         }
 
     def create(self, validated_data):
@@ -249,12 +252,12 @@ class ReplySerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         tweet = validated_data.get("tweet")
-        user = validated_data.get("user")
-        tweet = get_tweet_by_id(id=tweet.id)
-        reply_owner = get_user_by_id(id=user.id)
+        reply_owner = validated_data.get("user")
+        # DRF already loaded these, let the lookup helpers and signals reuse them
+        identity.add(tweet, reply_owner, validated_data.get("parent"))
         if (
             tweet.people_you_follow is True
-            and reply_owner not in tweet.user.following.all()
+            and reply_owner not in get_user_by_id(id=tweet.user_id).following.all()
         ):
             raise ValidationError(
                 "this tweet is for people who are followed by the owner"
@@ -283,15 +286,69 @@ class ReplyOutSerializer(serializers.ModelSerializer):
         ]
 
 
+class ConversationReplySerializer(serializers.ModelSerializer):
+    user = serializers.SlugRelatedField(read_only=True, slug_field="username")
+    likes = serializers.IntegerField(source="get_likes_count", read_only=True)
+    level = serializers.IntegerField(source="depth", read_only=True)
+    descendant_count = serializers.IntegerField(read_only=True)
+    children = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Reply
+        fields = [
+            "id",
+            "context",
+            "created_at",
+            "user",
+            "level",
+            "likes",
+            "descendant_count",
+            "children",
+        ]
+
+    def get_children(self, instance):
+        return ConversationReplySerializer(instance.thread_children, many=True).data
+
+
+class TrendSerializer(serializers.Serializer):
+    tag = serializers.CharField()
+    count = serializers.IntegerField()
+
+
 class NewsFeedSerializer(serializers.ModelSerializer):
     from_user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     to_user = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), required=False
     )
+    # annotated by inbox.with_read_state, entries just created are unread
+    is_read = serializers.BooleanField(read_only=True, default=False)
 
     class Meta:
         model = NewsFeed
-        fields = ["id", "from_user", "created_at", "description", "to_user"]
+        fields = [
+            "id",
+            "from_user",
+            "created_at",
+            "description",
+            "is_read",
+            "to_user",
+            "actor_count",
+            "sample_actors",
+            "verb",
+            "object_type",
+            "object_id",
+        ]
+        read_only_fields = [
+            "actor_count",
+            "sample_actors",
+            "verb",
+            "object_type",
+            "object_id",
+        ]
+
+
+class MarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
 
 
 class NewsFeedOutSerializer(serializers.ModelSerializer):
@@ -299,10 +356,23 @@ class NewsFeedOutSerializer(serializers.ModelSerializer):
     to_user = serializers.SlugRelatedField(
         read_only=True, slug_field="username", required=False
     )
+    is_read = serializers.BooleanField(read_only=True, default=False)
 
     class Meta:
         model = NewsFeed
-        fields = ["id", "from_user", "created_at", "description", "is_read", "to_user"]
+        fields = [
+            "id",
+            "from_user",
+            "created_at",
+            "description",
+            "is_read",
+            "to_user",
+            "actor_count",
+            "sample_actors",
+            "verb",
+            "object_type",
+            "object_id",
+        ]
 
 
 class VoteSerializer(serializers.ModelSerializer):
@@ -317,10 +387,8 @@ class VoteSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = self.context["request"].user
-        choice = validated_data["choice"]
-        if choice.user_can_vote(user) is True:
-            return Vote.objects.create(user=user, choice=choice)
-        raise ValidationError("you already voted for that choice")
+        vote, self.created = engagement.vote(user, validated_data["choice"])
+        return vote
 
 
 class UnVoteSerializer(serializers.ModelSerializer):
@@ -352,6 +420,7 @@ class UserFollowSerializer(serializers.Serializer):
                 f"message: you already have {user_to_follow.username} followed"
             )
         user.following.add(user_to_follow)
+        timelines.backfill(user, user_to_follow)
         return validated_data
 
 
@@ -363,6 +432,7 @@ class UserUnFollowSerializer(serializers.Serializer):
         user_to_unfollow = validated_data.get("id")
         if user.following.filter(id=user_to_unfollow.id).exists():
             user.following.remove(user_to_unfollow)
+            timelines.prune(user, user_to_unfollow)
             return validated_data
         raise ValidationError(
             f"message: you already have {user_to_unfollow.username} unfollowed"
@@ -491,11 +561,8 @@ class DisLikeReplySerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = self.context["request"].user
-        reply = validated_data["reply"]
-        if reply.user_can_like(user) is True:
-            raise ValidationError("user already disliked that reply")
-        like = get_like_by_reply(user=user, reply=reply)
-        return like.delete()
+        like, _ = engagement.unlike(user, reply=validated_data["reply"])
+        return like
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -512,18 +579,17 @@ class LikeSerializer(serializers.ModelSerializer):
 
         extra_kwargs = {"user": {"required": False}}
 
+    def validate(self, attrs):
+        if bool(attrs.get("reply")) == bool(attrs.get("tweet")):
+            raise ValidationError("like either a tweet or a reply")
+        return attrs
+
     def create(self, validated_data):
         user = self.context["request"].user
-        try:
-            reply = validated_data.get("reply")
-            tweet = validated_data.get("tweet")
-            if reply and reply.user_can_like(user) is True:
-                return Likes.objects.create(user=user, reply=reply)
-        except:
-            raise ValidationError("user already liked that reply")
-        if tweet and tweet.user_can_like(user) is True:
-            return Likes.objects.create(user=user, tweet=tweet)
-        raise ValidationError("user already liked that tweet")
+        like, self.created = engagement.like(
+            user, tweet=validated_data.get("tweet"), reply=validated_data.get("reply")
+        )
+        return like
 
 
 class UnLikeSerializer(serializers.ModelSerializer):
@@ -571,86 +637,75 @@ class SocialSerializer(serializers.Serializer):
     )
 
 
-client = Client(settings.ACCOUNTSID, settings.AUTHTOKEN)
+class OutboxSerializer(serializers.Serializer):
+    """
+    Validates a message and queues it in the outbox for `provider`, see
+    accounts.outbox.
+    """
 
+    provider = None
 
-class TwilioMessageSerializer(serializers.Serializer):
-    body = serializers.CharField()
-    to = serializers.CharField()
+    def payload(self, validated_data):
+        return validated_data
 
     def create(self, validated_data):
-        phone_number = settings.TWILIOPHONENUMBER
-        try:
-            client.messages.create(
-            body=validated_data.get("body"),
-            messaging_service_sid=os.getenv("messaging_service_sid"),
-            from_=phone_number,
-            to=validated_data.get("to"),
+        created_by = validated_data.pop("created_by", None)
+        idempotency_key = validated_data.pop("idempotency_key", None)
+        return outbox.queue(
+            self.provider, self.payload(validated_data), created_by, idempotency_key
         )
-        except Exception as e:
-            raise ValidationError(e)
 
 
-class TwilioEmailSerializer(serializers.Serializer):
+class OutboundMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OutboundMessage
+        fields = [
+            "id",
+            "provider",
+            "status",
+            "attempts",
+            "provider_message_id",
+            "last_error",
+            "created_at",
+            "sent_at",
+        ]
+
+
+class TwilioMessageSerializer(OutboxSerializer):
+    provider = "twilio"
+    body = serializers.CharField()
+    to = serializers.CharField()
+
+
+class TwilioEmailSerializer(OutboxSerializer):
+    provider = "sendgrid"
     content = serializers.CharField()
     to_emails = serializers.ListSerializer(child=serializers.EmailField())
     from_email = serializers.EmailField()
     subject = serializers.CharField()
     mime_type = serializers.CharField()
-    def create(self, validated_data):
-        try:
-            sg = SendGridAPIClient(api_key=os.environ.get('SENDGRID_API_KEY'))
-            from_email = Email(email=validated_data["from_email"]),
-            to_emails = To(validated_data["to_emails"]),
-            subject = Subject(validated_data["subject"]),
-            content = Content(validated_data["mime_type"], validated_data["content"])
-
-            mail = Mail(from_email, to_emails, subject, content)
-            mail_json = mail.get()
-            return sg.client.mail.send.post(request_body=mail_json)
-        except Exception as e:
-            raise ValidationError(e)
-        
-        
-class TwilioEmail2Serializer(serializers.Serializer):
+
+
+class TwilioEmail2Serializer(OutboxSerializer):
+    provider = "sendgrid"
     content = serializers.CharField()
     to_emails = serializers.ListSerializer(child=serializers.EmailField())
     subject = serializers.CharField()
     mime_type = serializers.CharField()
-    def create(self, validated_data):
-        try:
-            message = Mail()
-            message.to = [
-            To(
-        email=validated_data["to_emails"],
-        p=0
-        )
-    ]
-            message.from_email = From(
-            email=settings.FROM_EMAIL_SENDGRID,
-            name="KhaledTarek",
-            p=1,
-        )
-            message.subject = Subject(validated_data["subject"])
 
-            message.content = [
-        Content(
-            mime_type=validated_data["mime_type"],
-            content=validated_data["content"]
-        )
-    ]
-            sendgrid_client = SendGridAPIClient(os.environ.get("SENDGRID_API_KEY"))
-            return sendgrid_client.send(message)
-        except Exception as e:
-            raise ValidationError(e)
+    def payload(self, validated_data):
+        return {
+            **validated_data,
+            "from_email": settings.FROM_EMAIL_SENDGRID,
+            "from_name": "KhaledTarek",
+        }
 
-class TwilioEmail3Serializer(serializers.Serializer): # working but api doesnt cus sender isnt verifed
+
+class TwilioEmail3Serializer(OutboxSerializer): # working but api doesnt cus sender isnt verifed
+    provider = "smtp"
     message = serializers.CharField()
     to_emails = serializers.ListSerializer(child=serializers.EmailField())
     subject = serializers.CharField()
-    def create(self, validated_data):
-        try:
-            return send_mail(subject=validated_data['subject'], message=validated_data['message'],
-                            from_email=settings.FROM_EMAIL_SENDGRID, recipient_list=validated_data["to_emails"], fail_silently=False)
-        except Exception as e:
-            raise ValidationError(e)
\ No newline at end of file
+
+    def payload(self, validated_data):
+        return {**validated_data, "from_email": settings.FROM_EMAIL_SENDGRID}
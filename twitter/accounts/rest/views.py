@@ -1,11 +1,21 @@
 import logging
 from rest_framework import status, generics
-from rest_framework.generics import CreateAPIView, DestroyAPIView, ListAPIView
-from rest_framework.permissions import IsAuthenticated
+from django.urls import reverse
+from rest_framework.generics import (
+    CreateAPIView,
+    DestroyAPIView,
+    ListAPIView,
+    RetrieveAPIView,
+    get_object_or_404,
+)
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.authtoken.models import Token
 from rest_framework_simplejwt.views import TokenObtainPairView
+from .pagination import KeysetPagination
 from .serializers import (
     ActivateAccountSerializer,
     DeActivateAccountSerializer,
@@ -18,6 +28,7 @@ from .serializers import (
     TwilioEmail3Serializer,
     TwilioEmailSerializer,
     TwilioMessageSerializer,
+    OutboundMessageSerializer,
     UnLikeSerializer,
     UnVoteSerializer,
     UserSerializer,
@@ -26,8 +37,11 @@ from .serializers import (
     TweetOutSerializer,
     ReplySerializer,
     ReplyOutSerializer,
+    ConversationReplySerializer,
+    TrendSerializer,
     NewsFeedSerializer,
     NewsFeedOutSerializer,
+    MarkReadSerializer,
     ChoiceOutSerializer,
     ChoiceQSerializer,
     QuestionSerializer,
@@ -45,6 +59,10 @@ from requests.exceptions import HTTPError
 from social_django.utils import psa
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
+from ..pagination import ID_ORDERING
+from .. import engagement, events, inbox, jobs, search, tags, threads, trends
+from ..caching import entity_cache
+from ..pipeline import newsfeed_pipeline
 from ..models import (
     Profile,
     User,
@@ -55,6 +73,7 @@ from ..models import (
     Question,
     Likes,
     Vote,
+    OutboundMessage,
 )
 
 
@@ -77,6 +96,7 @@ class TweetViewSet(ModelViewSet):
     serializer_class = TweetSerializer
     queryset = Tweet.objects.all()
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -88,11 +108,48 @@ class TweetViewSet(ModelViewSet):
             tweet_serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
+    @action(detail=True, methods=["get"])
+    def conversation(self, request, pk=None):
+        def int_param(name):
+            try:
+                return int(request.query_params[name])
+            except (KeyError, ValueError):
+                return None
+
+        replies = threads.conversation(
+            pk, int_param("max_depth"), int_param("max_children")
+        )
+        return Response(ConversationReplySerializer(replies, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        tweets = self.paginator.paginate_with(
+            request,
+            lambda **params: search.search(
+                request.query_params.get("q", ""), Tweet, **params
+            ),
+        )
+        serializer = self.get_serializer(tweets, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"], url_path=r"hashtag/(?P<tag>\w+)")
+    def hashtag(self, request, tag=None):
+        tweets = self.paginate_queryset(tags.tagged(tag))
+        serializer = self.get_serializer(tweets, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"], url_path=r"mentions/(?P<user_id>\d+)")
+    def mentions(self, request, user_id=None):
+        tweets = self.paginate_queryset(tags.mentioning(user_id))
+        serializer = self.get_serializer(tweets, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class ReplyViewSet(ModelViewSet):
     serializer_class = ReplySerializer
     queryset = Reply.objects.all()
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -104,11 +161,54 @@ class ReplyViewSet(ModelViewSet):
             reply_serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        replies = self.paginator.paginate_with(
+            request,
+            lambda **params: search.search(
+                request.query_params.get("q", ""), Reply, **params
+            ),
+        )
+        serializer = self.get_serializer(replies, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class NewsFeedViewSet(ModelViewSet):
     serializer_class = NewsFeedSerializer
     queryset = NewsFeed.objects.all()
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return inbox.inbox(self.request.user.id)
+
+    def paginate_queryset(self, queryset):
+        return events.render(super().paginate_queryset(queryset))
+
+    def get_object(self):
+        return events.render([super().get_object()])[0]
+
+    def unread_count(self):
+        return User.objects.values_list("unread_count", flat=True).get(
+            id=self.request.user.id
+        )
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data["unread_count"] = self.unread_count()
+        return response
+
+    @action(detail=False, methods=["post"])
+    def read(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        marked = inbox.mark_read(request.user.id, serializer.validated_data.get("ids"))
+        return Response({"marked": marked, "unread_count": self.unread_count()})
+
+    @action(detail=False, methods=["post"], url_path="read-all")
+    def read_all(self, request):
+        inbox.mark_all_read(request.user.id)
+        return Response({"unread_count": 0})
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -180,12 +280,15 @@ class UserLikeTweetView(CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        like = serializer.save()
         headers = self.get_success_headers(serializer.data)
-        like = Likes.objects.get(tweet_id=serializer.data["tweet"])
         likes_serializer = LikeTweetOutSerializer(like)
         return Response(
-            likes_serializer.data, status=status.HTTP_201_CREATED, headers=headers
+            likes_serializer.data,
+            status=(
+                status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK
+            ),
+            headers=headers,
         )
 
 
@@ -197,12 +300,15 @@ class UserLikeReplyView(CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        like = serializer.save()
         headers = self.get_success_headers(serializer.data)
-        like = Likes.objects.get(reply=serializer.data["reply"])
         likes_serializer = LikeReplyOutSerializer(like)
         return Response(
-            likes_serializer.data, status=status.HTTP_201_CREATED, headers=headers
+            likes_serializer.data,
+            status=(
+                status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK
+            ),
+            headers=headers,
         )
 
 
@@ -211,25 +317,73 @@ class UserUnLikeTweetView(DestroyAPIView):
     serializer_class = UnLikeSerializer
     permission_classes = (IsAuthenticated,)
     lookup_field = "tweet_id"
+    target_model, target_field = Tweet, "tweet"
+
+    def destroy(self, request, *args, **kwargs):
+        target = get_object_or_404(self.target_model, id=self.kwargs[self.lookup_field])
+        engagement.unlike(request.user, **{self.target_field: target})
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class LikesView(ListAPIView):
     queryset = Likes.objects.all()
     serializer_class = LikeSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ID_ORDERING
 
 
-class UserUnLikeReplyView(DestroyAPIView):
-    serializer_class = UnLikeSerializer
-    permission_classes = (IsAuthenticated,)
-    queryset = Likes.objects.all()
+class UserUnLikeReplyView(UserUnLikeTweetView):
     lookup_field = "reply_id"
+    target_model, target_field = Reply, "reply"
+
+
+class TrendsView(generics.GenericAPIView):
+    serializer_class = TrendSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        window = request.query_params.get("window", trends.DEFAULT_WINDOW)
+        if window not in trends.WINDOWS:
+            raise ValidationError({"window": f"one of {', '.join(trends.WINDOWS)}"})
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 10)), 50))
+        except ValueError:
+            limit = 10
+        top = trends.trends.top(window, limit)
+        serializer = self.get_serializer(
+            [{"tag": tag, "count": count} for tag, count in top], many=True
+        )
+        return Response({"window": window, "trends": serializer.data})
+
+
+class CacheStatsView(generics.GenericAPIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(entity_cache.stats())
+
+
+class NewsfeedPipelineStatsView(generics.GenericAPIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(newsfeed_pipeline.stats())
+
+
+class JobStatsView(generics.GenericAPIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(jobs.stats())
 
 
 class ListVoteView(ListAPIView):
     queryset = Vote.objects.all()
     serializer_class = VoteSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ID_ORDERING
 
 
 class VoteView(CreateAPIView):
@@ -241,12 +395,15 @@ class VoteView(CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        vote = serializer.save()
         headers = self.get_success_headers(serializer.data)
-        vote = Vote.objects.get(choice=serializer.data["choice"])
         vote_serializer = VoteOutSerializer(vote)
         return Response(
-            vote_serializer.data, status=status.HTTP_201_CREATED, headers=headers
+            vote_serializer.data,
+            status=(
+                status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK
+            ),
+            headers=headers,
         )
 
 
@@ -256,6 +413,11 @@ class UnVoteView(DestroyAPIView):
     permission_classes = (IsAuthenticated,)
     lookup_field = "choice_id"
 
+    def destroy(self, request, *args, **kwargs):
+        choice = get_object_or_404(Choice, id=self.kwargs["choice_id"])
+        engagement.unvote(request.user, choice)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class ActivateAccountView(CreateAPIView):
     queryset = User.objects.all()
@@ -304,22 +466,49 @@ class ReTweetReplyView(CreateAPIView):
         )
 
 
-class TwilioMessagesView(CreateAPIView):
-    serializer_class = TwilioMessageSerializer
+class OutboxView(CreateAPIView):
+    """
+    Queues the message in the outbox and answers 202 with its delivery
+    status, which stays readable at the Location returned.
+    """
+
     permission_classes = (IsAuthenticated,)
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        message = serializer.save(
+            created_by=request.user,
+            idempotency_key=request.headers.get("Idempotency-Key"),
+        )
+        location = reverse("outbound_message", args=[message.id])
+        return Response(
+            OutboundMessageSerializer(message).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": location},
+        )
 
-class TwilioEmailsView(CreateAPIView):
-    serializer_class = TwilioEmailSerializer
+
+class OutboundMessageView(RetrieveAPIView):
+    serializer_class = OutboundMessageSerializer
     permission_classes = (IsAuthenticated,)
 
-class TwilioEmails2View(CreateAPIView):
+    def get_queryset(self):
+        return OutboundMessage.objects.filter(created_by=self.request.user)
+
+
+class TwilioMessagesView(OutboxView):
+    serializer_class = TwilioMessageSerializer
+
+
+class TwilioEmailsView(OutboxView):
+    serializer_class = TwilioEmailSerializer
+
+class TwilioEmails2View(OutboxView):
     serializer_class = TwilioEmail2Serializer
-    permission_classes = (IsAuthenticated,)
     
-class TwilioEmails3View(CreateAPIView):
+class TwilioEmails3View(OutboxView):
     serializer_class = TwilioEmail3Serializer
-    permission_classes = (IsAuthenticated,)
     
 
 @api_view(http_method_names=["POST"])
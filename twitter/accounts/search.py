@@ -0,0 +1,84 @@
+import re
+from django.core.exceptions import ValidationError
+from django.db import connection
+from .models import Reply, Tweet
+from .pagination import Page, decode_values, page_size
+
+# external content FTS5 tables kept in sync by the triggers in migration 0021
+SEARCH_TABLES = {Tweet: "accounts_tweet_fts", Reply: "accounts_reply_fts"}
+SEARCH_ORDERING = ("search_rank", "id")
+TERM = re.compile(r"\w+\*?")
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 MATCH expression: every word must match and
+    a trailing `*` makes it a prefix query, anything else is dropped so user
+    input can't produce an FTS5 syntax error.
+    """
+    terms = []
+    for term in TERM.findall(query or ""):
+        prefix = term.endswith("*")
+        terms.append(f'"{term.rstrip("*")}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def _seek(table, reverse):
+    lookup = "<" if reverse else ">"
+    return (
+        f" AND (bm25({table}) {lookup} %s"
+        f" OR (bm25({table}) = %s AND rowid {lookup} %s))"
+    )
+
+
+def search(query, model=Tweet, first=None, after=None, before=None):
+    """
+    BM25 ranked matches for `query`, best first, as a keyset Page over
+    `(search_rank, id)`.
+    """
+    size = page_size(first)
+    expression = match_expression(query)
+    if not expression:
+        return Page([], SEARCH_ORDERING, has_next=False, has_previous=False)
+    table = SEARCH_TABLES[model]
+    sql = f"SELECT rowid, bm25({table}) FROM {table} WHERE {table} MATCH %s"
+    params = [expression]
+    cursor = before or after
+    if cursor:
+        rank, pk = decode_values(cursor, len(SEARCH_ORDERING))
+        if not isinstance(rank, (int, float)) or not isinstance(pk, int):
+            raise ValidationError("invalid cursor")
+        sql += _seek(table, reverse=bool(before))
+        params += [rank, rank, pk]
+    direction = "DESC" if before else "ASC"
+    sql += f" ORDER BY bm25({table}) {direction}, rowid {direction} LIMIT %s"
+    params.append(size + 1)
+    with connection.cursor() as db:
+        db.execute(sql, params)
+        rows = db.fetchall()
+    more = len(rows) > size
+    rows = rows[:size]
+    if before:
+        rows.reverse()
+    objects = model.objects.select_related("user").in_bulk([pk for pk, _ in rows])
+    items = []
+    for pk, rank in rows:
+        if pk in objects:
+            objects[pk].search_rank = rank
+            items.append(objects[pk])
+    if before:
+        return Page(items, SEARCH_ORDERING, has_next=True, has_previous=more)
+    return Page(items, SEARCH_ORDERING, has_next=more, has_previous=bool(after))
+
+
+def rebuild(model=None):
+    """
+    Re-read every row from the content tables, to backfill rows written
+    before the index existed or repair it after a restore.
+    """
+    models = [model] if model else list(SEARCH_TABLES)
+    with connection.cursor() as db:
+        for model in models:
+            table = SEARCH_TABLES[model]
+            db.execute(f"INSERT INTO {table}({table}) VALUES('rebuild')")
+    return models
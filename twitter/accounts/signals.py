@@ -1,37 +1,147 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from .models import Tweet, Reply, NewsFeed
-from .graphql.schema import get_user_by_id
+from .models import Choice, Likes, Tweet, Reply, NewsFeed, Question, User, Vote
+from . import counters, events, inbox, live, tags, timelines
+from .caching import entity_cache
+from .pipeline import newsfeed_pipeline
+from .trends import trends
 
 
 @receiver(post_save, sender=Tweet)
 def create_newsfeed_for_tweet(sender, instance, created, **kwargs):
     if created:
-        from_user_id = instance.user.id
-        data = instance.context
-        text = data[:30]
-        from_user = get_user_by_id(id=from_user_id)
-        description = f"{from_user} tweeted {text}..."
-        NewsFeed.objects.create(from_user=from_user, description=description)
+        newsfeed_pipeline.publish(
+            events.TWEETED, instance.user_id, *events.target(instance)
+        )
+
+
+@receiver(post_save, sender=Tweet)
+def push_tweet_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        timelines.push_tweet(instance)
+        live.publish_tweet(instance)
+
+
+@receiver(post_save, sender=NewsFeed)
+def publish_newsfeed(sender, instance, created, **kwargs):
+    if created:
+        live.publish_newsfeed(instance)
+
+
+@receiver(post_save, sender=Tweet)
+@receiver(post_save, sender=Reply)
+def index_tags_and_mentions(sender, instance, created, **kwargs):
+    tags.index(instance, created)
+
+
+@receiver(post_save, sender=Tweet)
+def count_trending_hashtags(sender, instance, created, **kwargs):
+    if created:
+        hashtags = tags.extract_hashtags(instance.context)
+        if hashtags:
+            transaction.on_commit(lambda: trends.record(hashtags))
 
 
 @receiver(post_save, sender=Reply)
 def create_newsfeed_for_reply(sender, instance, created, **kwargs):
     if created:
-        from_user_id = instance.user.id
-        data = instance.context
-        text = data[:30]
-        from_user = get_user_by_id(id=from_user_id)
-        description = f"{from_user} replied with {text}..."
-        if instance.parent is not None:
-            to_user_id = instance.parent.user.id
-            to_user = get_user_by_id(id=to_user_id)
-            description = f"{from_user} replied with {text} to {to_user}..."
-            NewsFeed.objects.create(
-                from_user=from_user, description=description, to_user=to_user
-            )
+        newsfeed_pipeline.publish(
+            events.REPLIED, instance.user_id, *events.target(instance)
+        )
+
+
+@receiver(post_save, sender=Likes)
+def create_newsfeed_for_like(sender, instance, created, **kwargs):
+    if created:
+        if instance.tweet_id is not None:
+            liked = ("tweet", instance.tweet_id)
         else:
-            NewsFeed.objects.create(from_user=from_user, description=description)
+            liked = ("reply", instance.reply_id)
+        newsfeed_pipeline.publish(events.LIKED, instance.user_id, *liked)
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def create_newsfeed_for_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add" or not pk_set:
+        return
+    if reverse:
+        # instance started following everyone in pk_set
+        follows = [(instance.pk, target_id) for target_id in pk_set]
+    else:
+        follows = [(follower_id, instance.pk) for follower_id in pk_set]
+    for follower_id, target_id in follows:
+        newsfeed_pipeline.publish(events.FOLLOWED, follower_id, to_user_id=target_id)
+
+
+@receiver(post_save, sender=NewsFeed)
+@receiver(pre_delete, sender=NewsFeed)
+def count_unread_newsfeed(sender, instance, created=True, **kwargs):
+    # inbox.write bulk-creates and counts its own entries; deletes are
+    # counted before the entry's read mark cascades away
+    if not created or instance.to_user_id is None:
+        return
+    if kwargs["signal"] is not pre_delete:
+        inbox.count_unread([instance.to_user_id], instance.created_at)
+    elif inbox.is_unread(instance):
+        counters.adjust(User, instance.to_user_id, unread_count=-1)
+
+
+@receiver(post_save, sender=Tweet)
+@receiver(post_delete, sender=Tweet)
+def count_tweet(sender, instance, created=True, **kwargs):
+    if created:
+        delta = -1 if kwargs["signal"] is post_delete else 1
+        counters.adjust(User, instance.user_id, tweets_count=delta)
+
+
+@receiver(post_save, sender=Reply)
+@receiver(post_delete, sender=Reply)
+def count_reply(sender, instance, created=True, **kwargs):
+    if created:
+        delta = -1 if kwargs["signal"] is post_delete else 1
+        counters.adjust_buffered(Tweet, instance.tweet_id, replies_count=delta)
+
+
+@receiver(post_save, sender=Likes)
+@receiver(post_delete, sender=Likes)
+def count_like(sender, instance, created=True, **kwargs):
+    if created:
+        delta = -1 if kwargs["signal"] is post_delete else 1
+        counters.adjust_buffered(Tweet, instance.tweet_id, likes_count=delta)
+        counters.adjust_buffered(Reply, instance.reply_id, likes_count=delta)
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def count_vote(sender, instance, created=True, **kwargs):
+    if created:
+        delta = -1 if kwargs["signal"] is post_delete else 1
+        counters.adjust_buffered(Choice, instance.choice_id, votes_count=delta)
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def count_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove") or not pk_set:
+        return
+    delta = len(pk_set) if action == "post_add" else -len(pk_set)
+    step = 1 if action == "post_add" else -1
+    if reverse:
+        # instance.following changed, so every target gained or lost a follower
+        counters.adjust(User, instance.pk, following_count=delta)
+        counters.adjust_many(User, pk_set, followers_count=step)
+    else:
+        counters.adjust(User, instance.pk, followers_count=delta)
+        counters.adjust_many(User, pk_set, following_count=step)
+
+
+def invalidate_cached_entity(sender, instance, **kwargs):
+    entity_cache.invalidate(sender, instance.pk)
+
+
+for model in (User, Tweet, Reply, Question, Choice, NewsFeed):
+    post_save.connect(invalidate_cached_entity, sender=model)
+    post_delete.connect(invalidate_cached_entity, sender=model)
 
 
 # @receiver(post_save, sender=Question)
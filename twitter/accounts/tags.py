@@ -0,0 +1,101 @@
+import re
+from django.apps import apps
+from . import events
+from .models import Hashtag, Mention, Tweet, User
+from .pipeline import newsfeed_pipeline
+
+HASHTAG = re.compile(r"(?<![\w#])#(\w{1,100})")
+MENTION = re.compile(r"(?<![\w@])@(\w{1,150})")
+
+
+def extract_hashtags(text):
+    return {tag.lower() for tag in HASHTAG.findall(text or "")}
+
+
+def extract_mentions(text):
+    return set(MENTION.findall(text or ""))
+
+
+def _owner(obj):
+    return "tweet" if isinstance(obj, Tweet) else "reply"
+
+
+def _sync(model, key, obj, wanted, created):
+    """
+    Make `obj`'s index rows of `model` hold exactly `wanted` values of `key`
+    and return the values that were added.
+    """
+    owner = {_owner(obj): obj}
+    existing = set()
+    if not created:
+        existing = set(model.objects.filter(**owner).values_list(key, flat=True))
+    if existing - wanted:
+        model.objects.filter(**owner, **{f"{key}__in": existing - wanted}).delete()
+    added = wanted - existing
+    model.objects.bulk_create(
+        [model(**owner, **{key: value}) for value in added], ignore_conflicts=True
+    )
+    return added
+
+
+def index(obj, created=False):
+    """
+    Write the hashtag and mention index rows for a tweet or reply, and a
+    mention event for every user it newly mentions.
+    """
+    tags = extract_hashtags(obj.context)
+    usernames = extract_mentions(obj.context)
+    if created and not tags and not usernames:
+        return
+    _sync(Hashtag, "tag", obj, tags, created)
+    mentioned = set()
+    if usernames:
+        mentioned = set(
+            User.objects.filter(username__in=usernames).values_list("id", flat=True)
+        )
+    added = _sync(Mention, "user_id", obj, mentioned, created)
+    added.discard(obj.user_id)
+    for user_id in added:
+        newsfeed_pipeline.publish(
+            events.MENTIONED, obj.user_id, *events.target(obj), user_id
+        )
+
+
+def tagged(tag):
+    return Tweet.objects.filter(hashtags__tag=tag.lstrip("#").lower())
+
+
+def mentioning(user_id):
+    return Tweet.objects.filter(mentions__user_id=user_id)
+
+
+def backfill(get_model=apps.get_model, batch_size=1000):
+    """
+    Index every existing tweet and reply without notifying anyone.
+    """
+    Hashtag = get_model("accounts", "Hashtag")
+    Mention = get_model("accounts", "Mention")
+    User = get_model("accounts", "User")
+    for owner in ("tweet", "reply"):
+        model = get_model("accounts", owner.capitalize())
+        hashtags, mentions = [], {}
+        for pk, context in model.objects.values_list("id", "context").iterator():
+            hashtags += [
+                Hashtag(tag=tag, **{f"{owner}_id": pk})
+                for tag in extract_hashtags(context)
+            ]
+            for username in extract_mentions(context):
+                mentions.setdefault(username, []).append(pk)
+        users = User.objects.filter(username__in=mentions).values_list("username", "id")
+        Hashtag.objects.bulk_create(
+            hashtags, batch_size=batch_size, ignore_conflicts=True
+        )
+        Mention.objects.bulk_create(
+            [
+                Mention(user_id=user_id, **{f"{owner}_id": pk})
+                for username, user_id in users
+                for pk in mentions[username]
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
@@ -1,3 +1,793 @@
-from django.test import TestCase
+import asyncio
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+import jwt
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection
+from django.db.backends.utils import CursorWrapper
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from api.schema import schema
+from api.views import GraphQLWebSocketApp, socket_user
+from . import (
+    engagement,
+    events,
+    inbox,
+    jobs,
+    outbox,
+    pagination,
+    search,
+    tags,
+    threads,
+    timelines,
+    trends,
+)
+from .buffers import CounterBuffer, counter_buffer
+from .caching import EntityCache
+from .graphql import persisted
+from .graphql.loaders import in_thread
+from .graphql.schema import get_payload
+from .models import (
+    Job,
+    Likes,
+    NewsFeed,
+    OutboundMessage,
+    PersistedQuery,
+    Reply,
+    Tweet,
+    User,
+)
+from .pipeline import newsfeed_pipeline
 
-# Create your tests here.
+
+@mock.patch.dict(outbox.BACKENDS, {"fake": "accounts.outbox.FakeBackend"})
+class OutboxTests(TestCase):
+    def setUp(self):
+        outbox._backends.clear()
+        outbox.FakeBackend.sent.clear()
+
+    def queue(self):
+        return outbox.queue("fake", {"to": "+15550100", "body": "hi"})
+
+    def test_delivers_once(self):
+        message = self.queue()
+        outbox.deliver(message.id)
+        outbox.deliver(message.id)
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundMessage.SENT)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(len(outbox.FakeBackend.sent), 1)
+
+    def test_claimed_message_is_not_sent_again(self):
+        message = self.queue()
+        OutboundMessage.objects.filter(id=message.id).update(
+            status=OutboundMessage.SENDING, claimed_at=timezone.now()
+        )
+        outbox.deliver(message.id)
+        self.assertEqual(len(outbox.FakeBackend.sent), 0)
+
+    def test_failure_requeues(self):
+        message = self.queue()
+        with self.settings(OUTBOX_FAKE_FAILURE_RATE=1.0):
+            with self.assertRaises(ConnectionError):
+                outbox.deliver(message.id)
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundMessage.QUEUED)
+        self.assertEqual(message.attempts, 1)
+
+    def test_reap_recovers_stale_send(self):
+        message = self.queue()
+        Job.objects.update(status=Job.DONE)
+        OutboundMessage.objects.filter(id=message.id).update(
+            status=OutboundMessage.SENDING,
+            attempts=1,
+            claimed_at=timezone.now() - timedelta(seconds=outbox.SEND_TIMEOUT + 1),
+        )
+        outbox.reap(now=timezone.now() + timedelta(seconds=outbox.SEND_TIMEOUT + 1))
+        job = Job.objects.get(status=Job.PENDING)
+        self.assertTrue(jobs.run(job))
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundMessage.SENT)
+        self.assertEqual(message.attempts, 2)
+
+    def test_reap_fails_orphan_out_of_attempts(self):
+        message = self.queue()
+        Job.objects.update(status=Job.DEAD)
+        OutboundMessage.objects.filter(id=message.id).update(
+            attempts=outbox.MAX_ATTEMPTS
+        )
+        outbox.reap(now=timezone.now() + timedelta(seconds=outbox.SEND_TIMEOUT + 1))
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundMessage.FAILED)
+        self.assertFalse(Job.objects.filter(status=Job.PENDING).exists())
+
+    def test_reap_leaves_scheduled_messages(self):
+        self.queue()
+        outbox.reap(now=timezone.now() + timedelta(seconds=outbox.SEND_TIMEOUT + 1))
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+
+class CoalesceTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="owner", email="owner@example.com", password="p"
+        )
+        self.fans = [
+            User.objects.create_user(
+                username=f"fan{i}", email=f"fan{i}@example.com", password="p"
+            )
+            for i in range(4)
+        ]
+
+    def like(self, user):
+        inbox.coalesce(user.id, self.owner.id, "like:tweet:1", "like", "tweet", 1)
+
+    def test_repeat_actor_counted_once(self):
+        for fan in self.fans:
+            self.like(fan)
+        # the first fan unlikes and likes again, long out of the sample
+        self.like(self.fans[0])
+        entry = NewsFeed.objects.get(to_user=self.owner)
+        self.assertEqual(entry.actor_count, 4)
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.unread_count, 1)
+
+    def test_closed_window_starts_new_entry(self):
+        self.like(self.fans[0])
+        NewsFeed.objects.update(
+            created_at=timezone.now() - timedelta(seconds=inbox.GROUP_WINDOW + 1)
+        )
+        self.like(self.fans[1])
+        entries = NewsFeed.objects.filter(to_user=self.owner).order_by("id")
+        self.assertEqual([e.group_key for e in entries], ["", "like:tweet:1"])
+        self.assertEqual([e.actor_count for e in entries], [1, 1])
+
+
+class ReadStateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="p"
+        )
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="p"
+        )
+        inbox.write(inbox.entries(self.author.id, [self.user.id] * 3, "tweet"))
+
+    def unread_count(self):
+        self.user.refresh_from_db()
+        return self.user.unread_count
+
+    def test_marking_twice_counts_once(self):
+        ids = list(NewsFeed.objects.values_list("id", flat=True)[:2])
+        self.assertEqual(inbox.mark_read(self.user.id, ids), 2)
+        self.assertEqual(inbox.mark_read(self.user.id, ids), 0)
+        self.assertEqual(self.unread_count(), 1)
+
+    def test_entry_older_than_watermark_is_not_counted(self):
+        before = timezone.now()
+        inbox.mark_all_read(self.user.id)
+        # an entry stamped before the watermark that commits after it
+        entry = NewsFeed.objects.create(
+            from_user=self.author, to_user=self.user, created_at=before
+        )
+        self.assertFalse(inbox.is_unread(entry))
+        self.assertEqual(self.unread_count(), 0)
+        self.assertEqual(inbox.recount_unread(), 2)
+        self.assertEqual(self.unread_count(), 0)
+
+
+class TrendSnapshotTests(TestCase):
+    def process(self, name):
+        counts = trends.Trends()
+        counts.snapshot_name = lambda: name
+        return counts
+
+    def test_processes_add_up(self):
+        now = 1_000_000
+        first, second = self.process("hashtags:a:1"), self.process("hashtags:b:2")
+        first.record(["django"] * 3 + ["python"], now=now)
+        second.record(["python"] * 3, now=now)
+        first.save()
+        second.save()
+        self.assertEqual(first.top("1h", now=now), [("python", 4), ("django", 3)])
+        self.assertEqual(second.top("1h", now=now), [("python", 4), ("django", 3)])
+
+    def test_restart_resumes_own_snapshot(self):
+        now = 1_000_000
+        before = self.process("hashtags:a:1")
+        before.record(["django"], now=now)
+        before.save()
+        after = self.process("hashtags:a:1")
+        self.assertEqual(after.top("1h", now=now), [("django", 1)])
+
+
+class CommittingTestCase(TransactionTestCase):
+    """
+    For tests whose writes commit, from other threads or through GraphQL
+    resolvers that run on pool threads. Counters are written in the
+    writer's transaction instead of the process wide buffer.
+    """
+
+    def setUp(self):
+        patch = mock.patch.object(counter_buffer, "enabled", False)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def graphql(self, query, variables=None):
+        response = self.client.post(
+            "/graphql/",
+            {"query": query, "variables": variables or {}},
+            content_type="application/json",
+        )
+        return response.json()
+
+
+class ConcurrentLikeTests(CommittingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user(
+                username=f"liker{i}", email=f"liker{i}@example.com", password="p"
+            )
+            for i in range(10)
+        ]
+        self.tweet = Tweet.objects.create(context="hot", user=self.users[0])
+
+    def like(self, user):
+        try:
+            while True:
+                try:
+                    return engagement.like(user, tweet=self.tweet)[1]
+                except OperationalError:
+                    # the shared in memory test database locks whole tables
+                    continue
+        finally:
+            # an idle connection left open keeps its shared cache table locks
+            connection.close()
+
+    def test_repeated_likes_are_stored_once(self):
+        calls = [user for user in self.users for _ in range(5)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            created = list(pool.map(self.like, calls))
+        self.assertEqual(created.count(True), len(self.users))
+        self.assertEqual(Likes.objects.filter(tweet=self.tweet).count(), 10)
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 10)
+
+    def test_missing_tweet_is_not_a_duplicate(self):
+        missing = Tweet(id=self.tweet.id + 1000)
+        with self.assertRaises(IntegrityError):
+            engagement.like(self.users[0], tweet=missing)
+
+
+class DataLoaderTests(CommittingTestCase):
+    def setUp(self):
+        super().setUp()
+        users = [
+            User.objects.create_user(
+                username=f"loaded{i}", email=f"loaded{i}@example.com", password="p"
+            )
+            for i in range(6)
+        ]
+        for author, replier in zip(users[:3], users[3:]):
+            tweet = Tweet.objects.create(context="batched", user=author)
+            for _ in range(2):
+                Reply.objects.create(context="reply", user=replier, tweet=tweet)
+
+    def test_relations_load_in_one_query_per_field(self):
+        query = "{ tweets { edges { node { owner replies { owner } } } } }"
+        statements = []
+        execute = CursorWrapper.execute
+
+        def counting(cursor, sql, params=None):
+            # resolvers query from pool threads, so count on every connection
+            statements.append(sql)
+            return execute(cursor, sql, params)
+
+        with mock.patch.object(CursorWrapper, "execute", counting):
+            result = self.graphql(query)
+        nodes = [edge["node"] for edge in result["data"]["tweets"]["edges"]]
+        self.assertEqual(len(nodes), 3)
+        self.assertEqual(sum(len(node["replies"]) for node in nodes), 6)
+        # the page, tweet owners, replies and reply owners
+        self.assertEqual(len(statements), 4)
+
+
+class InThreadTests(TestCase):
+    def test_calls_run_concurrently_off_the_event_loop(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        @in_thread
+        def meet(name):
+            # only returns once both calls are running at the same time
+            barrier.wait()
+            return name, threading.get_ident()
+
+        async def main():
+            loop = threading.get_ident()
+            results = await asyncio.gather(meet("a"), meet("b"))
+            return loop, results
+
+        loop, results = async_to_sync(main)()
+        self.assertEqual([name for name, _ in results], ["a", "b"])
+        self.assertNotIn(loop, [ident for _, ident in results])
+        self.assertEqual(list(inspect.signature(meet).parameters), ["name"])
+
+
+class QueryLimitTests(CommittingTestCase):
+    query = """
+        query($first: Int) { tweets(first: $first) { edges { node { ...T } } } }
+        fragment T on Tweet { owner replies { owner } }
+    """
+
+    def test_cost_counts_page_sizes_through_fragments(self):
+        result = self.graphql(self.query, {"first": 10})
+        self.assertNotIn("errors", result)
+        self.assertEqual(result["extensions"]["cost"]["cost"], 221)
+        # 50 tweets, each with its owner and 20 replies and their owners
+        result = self.graphql(self.query, {"first": 50})
+        self.assertIsNone(result["data"])
+        self.assertEqual(
+            result["errors"][0]["message"],
+            "Query cost 1101 exceeds the budget of 1000.",
+        )
+
+    def test_depth_limit(self):
+        with self.settings(GRAPHQL_MAX_DEPTH=3):
+            error = self.graphql(self.query)["errors"][0]
+        self.assertEqual(error["message"], "Query depth 5 exceeds the limit of 3.")
+        self.assertEqual(error["extensions"]["code"], "QUERY_TOO_DEEP")
+
+
+class PersistedQueryTests(TestCase):
+    query = "{ trending { tag } }"
+
+    def setUp(self):
+        persisted.documents.clear()
+        self.addCleanup(persisted.documents.clear)
+
+    def request(self, query=None, key=None):
+        data = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": key}}}
+        if query is not None:
+            data["query"] = query
+        return data
+
+    def resolve(self, data):
+        try:
+            return persisted.resolve(data)
+        except persisted.PersistedQueryError as error:
+            return error.code
+
+    def test_hashes_sent_with_their_query_are_cached_not_allowed(self):
+        key = persisted.sha256(self.query)
+        self.assertEqual(
+            self.resolve(self.request(key=key)), "PERSISTED_QUERY_NOT_FOUND"
+        )
+        self.assertEqual(
+            self.resolve(self.request("{ other }", key)),
+            "PERSISTED_QUERY_HASH_MISMATCH",
+        )
+        self.resolve(self.request(self.query, key))
+        self.assertEqual(self.resolve(self.request(key=key))["query"], self.query)
+        self.assertFalse(PersistedQuery.objects.exists())
+        with self.settings(GRAPHQL_PERSISTED_QUERIES_ONLY=True):
+            self.assertEqual(
+                self.resolve(self.request(key=key)), "PERSISTED_QUERY_NOT_FOUND"
+            )
+            self.assertEqual(
+                self.resolve(self.request(self.query, key)),
+                "PERSISTED_QUERY_NOT_ALLOWED",
+            )
+            self.assertEqual(
+                self.resolve({"query": self.query}), "PERSISTED_QUERY_NOT_ALLOWED"
+            )
+
+    def test_allow_list(self):
+        key = persisted.register(self.query)
+        persisted.documents.clear()
+        with self.settings(GRAPHQL_PERSISTED_QUERIES_ONLY=True):
+            self.assertEqual(self.resolve(self.request(key=key))["query"], self.query)
+            self.assertEqual(self.resolve({"query": self.query})["query"], self.query)
+        self.assertTrue(persisted.documents.get(key).persisted)
+
+
+class BatchTests(CommittingTestCase):
+    def post(self, operations):
+        return self.client.post(
+            "/graphql/", operations, content_type="application/json"
+        )
+
+    def test_operations_run_in_order(self):
+        user = User.objects.create_user(
+            username="batcher", email="batcher@example.com", password="p"
+        )
+        tweet = Tweet.objects.create(context="batched", user=user)
+        variables = {"id": tweet.id, "user": user.id}
+        like, dislike = (
+            {
+                "query": f"mutation($id: ID!, $user: ID!) "
+                f"{{ {name}(id: $id, userId: $user) {{ id }} }}",
+                "variables": variables,
+            }
+            for name in ("likeTweet", "dislikeTweet")
+        )
+        response = self.post([dislike, like, dislike, dislike])
+        self.assertEqual(response.status_code, 200)
+        failed = ["errors" in result for result in response.json()]
+        self.assertEqual(failed, [True, False, False, True])
+
+    def test_batch_size_is_capped(self):
+        operation = {"query": "{ trending { tag } }"}
+        with self.settings(GRAPHQL_MAX_BATCH_SIZE=2):
+            self.assertEqual(self.post([operation] * 3).status_code, 400)
+            self.assertEqual(self.post([]).status_code, 400)
+            response = self.post([operation] * 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(
+            username="talker", email="talker@example.com", password="p"
+        )
+        self.tweet = Tweet.objects.create(context="thread", user=user)
+        self.replies = self.thread(user, 4)
+
+    def thread(self, user, levels):
+        replies, parent = [], None
+        for i in range(levels):
+            parent = Reply.objects.create(
+                context=f"level {i}",
+                user=user,
+                tweet=self.tweet if parent is None else None,
+                parent=parent,
+            )
+            replies.append(parent)
+        return replies
+
+    def test_depth_is_bounded_but_counts_whole_subtree(self):
+        (root,) = threads.conversation(self.tweet.id, max_depth=1)
+        (child,) = root.thread_children
+        self.assertEqual(child.thread_children, [])
+        self.assertEqual((root.depth, child.depth), (0, 1))
+        self.assertEqual((root.descendant_count, child.descendant_count), (3, 2))
+
+    def test_deep_thread(self):
+        deepest = self.thread(self.replies[0].user, 40)[-1]
+        self.assertEqual(deepest.depth, 39)
+        deepest.refresh_from_db()
+        self.assertEqual(deepest.path.count("/"), 40)
+
+    def test_new_reply_is_searchable(self):
+        reply = Reply.objects.create(context="a zebracorn", parent=self.replies[-1])
+        self.assertEqual(search.search("zebracorn", Reply).items, [reply])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="searcher", email="searcher@example.com", password="p"
+        )
+
+    def tweet(self, context):
+        return Tweet.objects.create(context=context, user=self.user)
+
+    def test_ranks_pages_and_follows_edits(self):
+        once = self.tweet("a walk with one penguin and a long story about the sea")
+        twice = self.tweet("penguin penguin")
+        self.tweet("nothing to see")
+        page = search.search("penguin", Tweet, first=1)
+        self.assertEqual((page.items, page.has_next), ([twice], True))
+        page = search.search("penguin", Tweet, first=1, after=page.end_cursor)
+        self.assertEqual((page.items, page.has_next), ([once], False))
+        self.assertEqual(search.search("peng*", Tweet).items, [twice, once])
+        once.context = "a walk by the sea"
+        once.save()
+        twice.delete()
+        self.assertEqual(search.search("penguin", Tweet).items, [])
+        self.assertEqual(search.search("walk", Tweet).items, [once])
+
+    def test_replies_and_junk_input(self):
+        tweet = self.tweet("the original penguin")
+        reply = Reply.objects.create(
+            context="penguin reply", user=self.user, tweet=tweet
+        )
+        self.assertEqual(search.search("penguin", Reply).items, [reply])
+        self.assertEqual(search.search('") OR *:(', Tweet).items, [])
+        self.assertEqual(search.search("OR penguin", Tweet).items, [])
+
+
+class TagTests(TestCase):
+    def setUp(self):
+        self.author, self.bob = (
+            User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="p"
+            )
+            for name in ("tagger", "bob")
+        )
+
+    def test_tag_and_mention_timelines_follow_edits(self):
+        tweet = Tweet.objects.create(
+            context="#Django tips for @bob and @tagger, not email@bob", user=self.author
+        )
+        other = Tweet.objects.create(context="more #django", user=self.bob)
+        self.assertEqual(set(tags.tagged("#DJANGO")), {tweet, other})
+        self.assertEqual(list(tags.mentioning(self.bob.id)), [tweet])
+        tweet.context = "#python now"
+        tweet.save()
+        self.assertEqual(list(tags.tagged("django")), [other])
+        self.assertEqual(list(tags.tagged("python")), [tweet])
+        self.assertFalse(tags.mentioning(self.bob.id).exists())
+
+    def test_mentioned_users_are_notified_once(self):
+        tweet = Tweet.objects.create(context="hi @bob @tagger", user=self.author)
+        tweet.save()
+        newsfeed_pipeline.drain()
+        mentions = NewsFeed.objects.filter(verb=events.MENTIONED)
+        self.assertEqual(
+            list(mentions.values_list("to_user", flat=True)), [self.bob.id]
+        )
+
+
+class EventRenderTests(TestCase):
+    def test_renders_current_text_in_one_query_per_model(self):
+        alice, bob = (
+            User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="p"
+            )
+            for name in ("alice", "bob")
+        )
+        tweet = Tweet.objects.create(context="a" * 40, user=bob)
+        reply = Reply.objects.create(context="first", user=bob, tweet=tweet)
+        answer = Reply.objects.create(
+            context="second", user=alice, tweet=tweet, parent=reply
+        )
+        alice.username = "alicia"
+        alice.save()
+
+        def entry(verb, obj=None, **fields):
+            object_type, object_id = events.target(obj)
+            return NewsFeed(
+                verb=verb,
+                from_user=alice,
+                to_user=bob,
+                object_type=object_type,
+                object_id=object_id,
+                **fields,
+            )
+
+        entries = [
+            entry(events.TWEETED, tweet),
+            entry(events.REPLIED, answer),
+            entry(events.LIKED, reply, actor_count=3),
+            entry(events.FOLLOWED, actor_count=2),
+            entry(events.MENTIONED, Tweet(id=tweet.id + 1)),
+            NewsFeed(from_user=alice, description="kept as written"),
+        ]
+        with self.assertNumQueries(3):
+            events.render(entries)
+        self.assertEqual(
+            [entry.description for entry in entries],
+            [
+                f"alicia tweeted {'a' * 30}...",
+                "alicia replied with second to bob...",
+                "alicia and 2 others liked your reply first...",
+                "alicia and 1 other followed you",
+                "alicia mentioned you in [deleted]",
+                "kept as written",
+            ],
+        )
+
+
+class CounterFieldsTests(TestCase):
+    def test_saving_a_stale_row_keeps_its_counters(self):
+        user = User.objects.create_user(
+            username="stale", email="stale@example.com", password="p"
+        )
+        tweet = Tweet.objects.create(context="before", user=user)
+        User.objects.filter(id=user.id).update(unread_count=3)
+        Tweet.objects.filter(id=tweet.id).update(likes_count=5)
+        user.set_password("changed")
+        user.save()
+        tweet.context = "after"
+        tweet.save()
+        user.refresh_from_db()
+        tweet.refresh_from_db()
+        self.assertEqual((user.unread_count, user.tweets_count), (3, 1))
+        self.assertTrue(user.check_password("changed"))
+        self.assertEqual((tweet.context, tweet.likes_count), ("after", 5))
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(
+            username="pager", email="pager@example.com", password="p"
+        )
+        now = timezone.now()
+        # two tweets share a timestamp so the id breaks the tie
+        for i, minutes in enumerate([5, 4, 4, 3, 2]):
+            Tweet.objects.create(
+                context=f"tweet {i}",
+                user=user,
+                created_at=now - timedelta(minutes=minutes),
+            )
+
+    def test_pages_forward_and_back(self):
+        tweets = list(Tweet.objects.order_by("-created_at", "-id"))
+        first = pagination.paginate(Tweet.objects.all(), first=2)
+        second = pagination.paginate(
+            Tweet.objects.all(), first=2, after=first.end_cursor
+        )
+        self.assertEqual(first.items + second.items, tweets[:4])
+        self.assertTrue(second.has_next)
+        back = pagination.paginate(
+            Tweet.objects.all(), first=2, before=second.start_cursor
+        )
+        self.assertEqual(back.items, tweets[:2])
+        self.assertEqual((back.has_previous, back.has_next), (False, True))
+
+    def test_before_a_deleted_oldest_has_no_next(self):
+        oldest = Tweet.objects.order_by("-created_at", "-id").last()
+        cursor = pagination.encode_cursor(oldest, pagination.CREATED_AT_ORDERING)
+        oldest.delete()
+        page = pagination.paginate(Tweet.objects.all(), first=10, before=cursor)
+        self.assertEqual(len(page.items), 4)
+        self.assertFalse(page.has_next)
+
+
+class CounterBufferTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(
+            username="counted", email="counted@example.com", password="p"
+        )
+        self.tweet = Tweet.objects.create(context="counted", user=user)
+        self.buffer = CounterBuffer(flush_interval=3600, max_pending=1000)
+        # no background flusher, flushes only happen when the test asks
+        self.buffer._ensure_flusher = lambda: None
+
+    def test_failed_flush_keeps_deltas(self):
+        self.buffer.add(Tweet, self.tweet.id, likes_count=2)
+        with mock.patch.object(
+            Tweet.objects, "filter", side_effect=OperationalError("locked")
+        ):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.buffer.add(Tweet, self.tweet.id, likes_count=1)
+        self.assertEqual(self.buffer.pending(Tweet, self.tweet.id, "likes_count"), 3)
+        self.buffer.flush()
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 3)
+
+
+class SocketAuthTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="socket", email="socket@example.com", password="p"
+        )
+
+    def scope(self, query_string=b"", headers=()):
+        return {
+            "type": "websocket",
+            "query_string": query_string,
+            "headers": list(headers),
+            "subprotocols": ["graphql-transport-ws"],
+        }
+
+    def test_token_and_session(self):
+        token = jwt.encode(get_payload(self.user), settings.SECRET_KEY, "HS256")
+        self.assertEqual(socket_user(self.scope(f"token={token}".encode())), self.user)
+        bearer = (b"authorization", f"Bearer {token}".encode())
+        self.assertEqual(socket_user(self.scope(headers=[bearer])), self.user)
+        self.client.force_login(self.user)
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        cookie = (b"cookie", f"{settings.SESSION_COOKIE_NAME}={session}".encode())
+        self.assertEqual(socket_user(self.scope(headers=[cookie])), self.user)
+        self.assertFalse(socket_user(self.scope(b"token=forged")).is_authenticated)
+
+    def test_anonymous_socket_is_refused(self):
+        sent = []
+
+        async def receive():
+            return {"type": "websocket.connect"}
+
+        async def send(message):
+            sent.append(message)
+
+        app = GraphQLWebSocketApp(schema)
+        async_to_sync(app)(self.scope(), receive, send)
+        self.assertEqual(
+            [(m["type"], m["code"]) for m in sent], [("websocket.close", 4401)]
+        )
+
+
+class UnlikeTests(CommittingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username="unliker", email="unliker@example.com", password="p"
+        )
+        self.tweet = Tweet.objects.create(context="liked", user=self.user)
+        engagement.like(self.user, tweet=self.tweet)
+
+    def dislike(self):
+        query = "mutation($id: ID!, $user: ID!) { dislikeTweet(id: $id, userId: $user) { id } }"
+        return self.graphql(query, {"id": self.tweet.id, "user": self.user.id})
+
+    def test_rest_unlike_is_idempotent(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for _ in range(2):
+            response = client.delete(f"/accounts/tweets/unlike/{self.tweet.id}/")
+            self.assertEqual(response.status_code, 204)
+        self.assertFalse(Likes.objects.exists())
+        response = client.delete(f"/accounts/tweets/unlike/{self.tweet.id + 1}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_second_dislike_is_an_error(self):
+        self.assertNotIn("errors", self.dislike())
+        self.assertEqual(
+            self.dislike()["errors"][0]["message"],
+            "user already disliked that tweet",
+        )
+
+
+class NewsfeedPipelineTests(TestCase):
+    def test_jobs_wait_for_a_worker(self):
+        author, follower = (
+            User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="p"
+            )
+            for name in ("writer", "reader")
+        )
+        author.followers.add(follower)
+        Tweet.objects.create(context="news", user=author)
+        self.assertIsNone(newsfeed_pipeline._worker)
+        self.assertFalse(NewsFeed.objects.filter(verb="tweet").exists())
+        self.assertEqual(newsfeed_pipeline.drain(), 2)
+        entry = NewsFeed.objects.get(verb="tweet")
+        self.assertEqual((entry.from_user, entry.to_user), (author, follower))
+        self.assertEqual(newsfeed_pipeline.stats()[Job.DONE], 2)
+
+
+class EntityCacheTests(TestCase):
+    def test_password_stays_out_of_the_cache(self):
+        user = User.objects.create_user(
+            username="cached", email="cached@example.com", password="secret"
+        )
+        cache = EntityCache(private_fields={"accounts.user": ["password"]})
+        self.addCleanup(cache.l2.clear)
+        cache.get(User, user.id)
+        blob = cache.l2.get(cache._key(User, user.id))[1]
+        self.assertNotIn(user.password.encode(), blob)
+        cached = cache.get(User, user.id)
+        self.assertEqual(cached.get_deferred_fields(), {"password"})
+        self.assertTrue(cached.check_password("secret"))
+
+
+class TimelineTests(TestCase):
+    def test_fan_out_runs_on_a_worker_and_reads_page(self):
+        author, follower = (
+            User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="p"
+            )
+            for name in ("poster", "follower")
+        )
+        author.followers.add(follower)
+        for i in range(3):
+            Tweet.objects.create(context=f"post {i}", user=author)
+        home = timelines.home_timeline(follower)
+        self.assertFalse(home.exists())
+        self.assertEqual(timelines.home_timeline(author).count(), 3)
+        for job in jobs.claim("test", [timelines.QUEUE], limit=10):
+            self.assertTrue(jobs.run(job))
+        tweets = list(Tweet.objects.order_by("-created_at", "-id"))
+        first = pagination.paginate(home, first=2)
+        second = pagination.paginate(home, first=2, after=first.end_cursor)
+        self.assertEqual(first.items + second.items, tweets)
+        self.assertEqual((first.has_next, second.has_next), (True, False))
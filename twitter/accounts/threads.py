@@ -0,0 +1,149 @@
+from collections import defaultdict
+from itertools import chain
+from django.conf import settings
+from django.db.models import Q
+from .models import REPLY_PATH_WIDTH, Reply
+
+MAX_DEPTH = getattr(settings, "THREAD_MAX_DEPTH", 5)
+MAX_CHILDREN = getattr(settings, "THREAD_MAX_CHILDREN", 20)
+# sorts after every digit and "/", so [prefix, prefix + END) is a subtree
+END = "~"
+
+
+class PathTree:
+    """
+    Reads the materialized `path` column, "<root id>/<child id>/...", and
+    the `depth` next to it, both written once when a reply is inserted.
+    A subtree is the index range [path, path + END).
+    """
+
+    def conversation(self, roots, max_depth):
+        prefixes = [
+            f"{root_id:0{REPLY_PATH_WIDTH}d}/"
+            for root_id in roots.values_list("id", flat=True)
+        ]
+        if not prefixes:
+            return []
+        under = self._under(prefixes)
+        replies = list(
+            Reply.objects.filter(under, depth__lte=max_depth)
+            .select_related("user")
+            .order_by("path")
+        )
+        # deeper replies only count towards descendant_count
+        deeper = Reply.objects.filter(under, depth__gt=max_depth).values_list(
+            "path", flat=True
+        )
+        sizes = self._sizes(
+            chain((reply.path for reply in replies), deeper.iterator()), max_depth
+        )
+        for reply in replies:
+            reply.descendant_count = sizes[reply.path]
+        return replies
+
+    def descendants(self, replies):
+        nodes = list(
+            Reply.objects.filter(self._under(reply.path for reply in replies)).order_by(
+                "path"
+            )
+        )
+        return [
+            [
+                node
+                for node in nodes
+                if node.path.startswith(reply.path) and node.id != reply.id
+            ]
+            for reply in replies
+        ]
+
+    def _under(self, prefixes):
+        condition = Q()
+        for prefix in prefixes:
+            condition |= Q(path__gte=prefix, path__lt=prefix + END)
+        return condition
+
+    def _sizes(self, paths, max_depth):
+        step = REPLY_PATH_WIDTH + 1
+        deepest = (max_depth + 1) * step
+        sizes = defaultdict(int)
+        for path in paths:
+            for end in range(step, min(len(path), deepest + 1), step):
+                sizes[path[:end]] += 1
+        return sizes
+
+
+tree = PathTree()
+
+
+def _clamp(value, default):
+    if value is None or value < 0:
+        return default
+    return min(value, default)
+
+
+def conversation(tweet_id, max_depth=None, max_children=None):
+    """
+    Every reply to a tweet nested in memory, newest first at each level.
+    Each node gets `thread_children` and `descendant_count`; nodes deeper
+    than `max_depth` or past the first `max_children` of their parent are
+    left out.
+    """
+    max_depth = _clamp(max_depth, MAX_DEPTH)
+    max_children = _clamp(max_children, MAX_CHILDREN)
+    roots = Reply.objects.filter(tweet_id=tweet_id, parent=None).order_by(
+        "-created_at"
+    )[:max_children]
+    return nest(tree.conversation(roots, max_depth), max_children)
+
+
+def nest(replies, max_children):
+    nodes, roots = {}, []
+    for reply in replies:
+        reply.thread_children = []
+        nodes[reply.id] = reply
+        if reply.parent_id is None:
+            roots.append(reply)
+        elif reply.parent_id in nodes:
+            nodes[reply.parent_id].thread_children.append(reply)
+    return _trim(roots, max_children)
+
+
+def _trim(siblings, max_children):
+    siblings = sorted(siblings, key=lambda reply: reply.created_at, reverse=True)
+    siblings = siblings[:max_children]
+    for reply in siblings:
+        reply.thread_children = _trim(reply.thread_children, max_children)
+    return siblings
+
+
+def descendants(replies):
+    """
+    Flat descendants of several replies from a single query.
+    """
+    if not replies:
+        return []
+    return tree.descendants(replies)
+
+
+def rebuild_paths(model=Reply, batch_size=1000):
+    """
+    Recompute every `path` and `depth` from the parent links alone.
+    """
+    parents = dict(model.objects.values_list("id", "parent_id").iterator())
+    paths = {}
+    for reply_id in parents:
+        lineage = []
+        while reply_id is not None and reply_id not in paths:
+            lineage.append(reply_id)
+            reply_id = parents.get(reply_id)
+        prefix = paths.get(reply_id, "")
+        for node_id in reversed(lineage):
+            prefix = paths[node_id] = f"{prefix}{node_id:0{REPLY_PATH_WIDTH}d}/"
+    model.objects.bulk_update(
+        [
+            model(id=reply_id, path=path, depth=path.count("/") - 1)
+            for reply_id, path in paths.items()
+        ],
+        ["path", "depth"],
+        batch_size=batch_size,
+    )
@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.db.models import Q
+from . import jobs
+from .models import Tweet, Timeline
+
+# authors with at least this many followers are not fanned out on write,
+# their tweets are merged into the home timeline on read instead
+FANOUT_FOLLOWER_LIMIT = getattr(settings, "TIMELINE_FANOUT_FOLLOWER_LIMIT", 10000)
+BACKFILL_LIMIT = getattr(settings, "TIMELINE_BACKFILL_LIMIT", 200)
+BATCH_SIZE = getattr(settings, "TIMELINE_BATCH_SIZE", 500)
+QUEUE = "timelines"
+
+
+def is_high_fanout(user):
+    return user.followers_count >= FANOUT_FOLLOWER_LIMIT
+
+
+def high_fanout_following(user):
+    return user.following.filter(
+        followers_count__gte=FANOUT_FOLLOWER_LIMIT
+    ).values_list("id", flat=True)
+
+
+def push_tweet(tweet):
+    """
+    Put a new tweet in its author's timeline and queue the fan-out to their
+    followers, which runs on a job worker rather than in the request.
+    """
+    Timeline.objects.bulk_create(
+        [
+            Timeline(
+                user_id=tweet.user_id,
+                tweet=tweet,
+                author_id=tweet.user_id,
+                created_at=tweet.created_at,
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    if not is_high_fanout(tweet.user):
+        jobs.enqueue(fan_out, {"tweet_id": tweet.id}, queue=QUEUE)
+
+
+def fan_out(tweet_id):
+    tweet = Tweet.objects.filter(id=tweet_id).select_related("user").first()
+    if tweet is None:
+        # deleted before the job ran
+        return
+    follower_ids = tweet.user.followers.values_list("id", flat=True).iterator()
+    Timeline.objects.bulk_create(
+        (
+            Timeline(
+                user_id=follower_id,
+                tweet=tweet,
+                author_id=tweet.user_id,
+                created_at=tweet.created_at,
+            )
+            for follower_id in follower_ids
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    if is_high_fanout(author):
+        return
+    tweets = author.tweets.values_list("id", "created_at")[:BACKFILL_LIMIT]
+    Timeline.objects.bulk_create(
+        [
+            Timeline(user=user, tweet_id=tweet_id, author=author, created_at=created_at)
+            for tweet_id, created_at in tweets
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user, author):
+    Timeline.objects.filter(user=user, author=author).delete()
+
+
+def home_timeline(user):
+    """
+    Tweets in `user`'s materialized timeline together with those of the high
+    fan-out accounts they follow, which are pulled on read. Page it with
+    pagination.paginate.
+    """
+    materialized = Timeline.objects.filter(user=user).values("tweet_id")
+    return Tweet.objects.filter(
+        Q(id__in=materialized) | Q(user__in=list(high_fanout_following(user)))
+    )
@@ -0,0 +1,303 @@
+import atexit
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+from .models import TrendSnapshot
+
+WINDOWS = {"5m": (300, 60), "1h": (3600, 300), "24h": (86400, 3600)}
+DEFAULT_WINDOW = "1h"
+# every process saves its counts under "hashtags:<host>:<pid>"
+SNAPSHOT_PREFIX = "hashtags"
+
+
+class CountMinSketch:
+    """
+    Approximate counts in `depth` rows of `width` counters. An estimate is
+    the smallest of a key's counters, so it can overcount on collisions but
+    never undercount.
+    """
+
+    def __init__(self, width=1024, depth=4, rows=None):
+        self.width = width
+        self.depth = depth
+        self.rows = rows or [[0] * width for _ in range(depth)]
+
+    def _columns(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        for row in range(self.depth):
+            value = int.from_bytes(digest[row * 4 : row * 4 + 4], "little")
+            yield row, value % self.width
+
+    def add(self, key, count=1):
+        estimate = None
+        for row, column in self._columns(key):
+            self.rows[row][column] += count
+            value = self.rows[row][column]
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate
+
+    def estimate(self, key):
+        return min(self.rows[row][column] for row, column in self._columns(key))
+
+    def to_sparse(self):
+        return [
+            [[i, value] for i, value in enumerate(row) if value] for row in self.rows
+        ]
+
+    @classmethod
+    def from_sparse(cls, width, depth, cells):
+        sketch = cls(width, depth)
+        for row, pairs in zip(sketch.rows, cells):
+            for column, value in pairs:
+                row[column] = value
+        return sketch
+
+
+class Bucket:
+    """
+    One slice of a window: a sketch of every tag seen in it, plus the
+    `capacity` tags with the highest estimates as top-k candidates.
+    """
+
+    def __init__(self, start, width, depth, capacity, sketch=None, heavy=None):
+        self.start = start
+        self.capacity = capacity
+        self.sketch = sketch or CountMinSketch(width, depth)
+        self.heavy = heavy or {}
+
+    def add(self, tag, count=1):
+        estimate = self.sketch.add(tag, count)
+        if tag in self.heavy or len(self.heavy) < self.capacity:
+            self.heavy[tag] = estimate
+            return
+        smallest = min(self.heavy, key=self.heavy.get)
+        if estimate > self.heavy[smallest]:
+            del self.heavy[smallest]
+            self.heavy[tag] = estimate
+
+
+class SlidingWindow:
+    """
+    A window of `span` seconds kept as a ring of `step`-second buckets;
+    buckets that slide out are dropped whole.
+    """
+
+    def __init__(self, span, step, width, depth, capacity):
+        self.span = span
+        self.step = step
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.buckets = deque()
+
+    def _expire(self, now):
+        oldest = (int(now) // self.step) * self.step - self.span + self.step
+        while self.buckets and self.buckets[0].start < oldest:
+            self.buckets.popleft()
+
+    def add(self, tag, now, count=1):
+        start = (int(now) // self.step) * self.step
+        if not self.buckets or self.buckets[-1].start < start:
+            self.buckets.append(Bucket(start, self.width, self.depth, self.capacity))
+            self._expire(now)
+        self.buckets[-1].add(tag, count)
+
+    def candidates(self, now):
+        self._expire(now)
+        candidates = set()
+        for bucket in self.buckets:
+            candidates.update(bucket.heavy)
+        return candidates
+
+    def count(self, tag):
+        return sum(bucket.sketch.estimate(tag) for bucket in self.buckets)
+
+    def top(self, limit, now):
+        return top([self], limit, now)
+
+
+def top(windows, limit, now):
+    """
+    The `limit` most counted tags across `windows`, the same window as kept
+    by different processes, adding up each one's estimate.
+    """
+    candidates = set()
+    for window in windows:
+        candidates.update(window.candidates(now))
+    counts = [(tag, sum(window.count(tag) for window in windows)) for tag in candidates]
+    counts.sort(key=lambda item: (-item[1], item[0]))
+    return counts[:limit]
+
+
+class Trends:
+    """
+    Heavy-hitter hashtag counts over every window in WINDOWS. Each process
+    counts its own share in memory and saves it as a compressed
+    TrendSnapshot row of its own every `snapshot_interval` seconds; top()
+    adds the other processes' latest snapshots to the local counts, and a
+    process restarted under the same name resumes its row.
+    """
+
+    def __init__(self, width=1024, depth=4, capacity=100, snapshot_interval=60.0):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.Lock()
+        self._windows = None
+        self._others = []
+        self._others_read_at = None
+        self._dirty = False
+        self._saver = None
+
+    def _new_windows(self):
+        return {
+            name: SlidingWindow(span, step, self.width, self.depth, self.capacity)
+            for name, (span, step) in WINDOWS.items()
+        }
+
+    def _loaded(self):
+        # restore lazily so importing the module never touches the database
+        if self._windows is None:
+            self._windows = self._new_windows()
+            try:
+                self.restore()
+            except DatabaseError:
+                pass
+        return self._windows
+
+    def record(self, tags, now=None):
+        if not tags:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            for window in self._loaded().values():
+                for tag in tags:
+                    window.add(tag, now)
+            self._dirty = True
+        self._ensure_saver()
+
+    def top(self, window=DEFAULT_WINDOW, limit=10, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            windows = [self._loaded()[window]]
+            windows += [others[window] for others in self._other_processes()]
+            return top(windows, limit, now)
+
+    @staticmethod
+    def snapshot_name():
+        # read on every call, a forked worker saves under its own pid
+        return f"{SNAPSHOT_PREFIX}:{socket.gethostname()}:{os.getpid()}"
+
+    def _other_processes(self):
+        # reread at most once per snapshot interval, they change no faster
+        read_at = self._others_read_at
+        if read_at is not None and time.monotonic() - read_at < self.snapshot_interval:
+            return self._others
+        try:
+            blobs = (
+                TrendSnapshot.objects.filter(name__startswith=SNAPSHOT_PREFIX)
+                .exclude(name=self.snapshot_name())
+                .values_list("data", flat=True)
+            )
+            self._others = [
+                windows
+                for windows in (self.parse(bytes(blob)) for blob in blobs)
+                if windows is not None
+            ]
+        except DatabaseError:
+            pass
+        self._others_read_at = time.monotonic()
+        return self._others
+
+    def dump(self):
+        data = {"shape": [self.width, self.depth]}
+        with self._lock:
+            for name, window in self._loaded().items():
+                data[name] = [
+                    [bucket.start, bucket.sketch.to_sparse(), bucket.heavy]
+                    for bucket in window.buckets
+                ]
+            self._dirty = False
+        return zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+
+    def load(self, blob):
+        windows = self.parse(blob)
+        if windows is not None:
+            self._windows = windows
+
+    def parse(self, blob):
+        data = json.loads(zlib.decompress(blob))
+        if data.pop("shape", None) != [self.width, self.depth]:
+            # sketch dimensions changed, the old counts can't be reused
+            return None
+        windows = self._new_windows()
+        for name, buckets in data.items():
+            if name not in windows:
+                continue
+            window = windows[name]
+            for start, cells, heavy in buckets:
+                sketch = CountMinSketch.from_sparse(self.width, self.depth, cells)
+                window.buckets.append(
+                    Bucket(start, self.width, self.depth, self.capacity, sketch, heavy)
+                )
+        return windows
+
+    def save(self):
+        TrendSnapshot.objects.update_or_create(
+            name=self.snapshot_name(), defaults={"data": self.dump()}
+        )
+        # rows of processes gone for longer than the widest window count nothing
+        span = max(span for span, _ in WINDOWS.values())
+        TrendSnapshot.objects.filter(
+            name__startswith=SNAPSHOT_PREFIX,
+            saved_at__lt=timezone.now() - timedelta(seconds=span),
+        ).delete()
+
+    def restore(self):
+        snapshot = TrendSnapshot.objects.filter(name=self.snapshot_name()).first()
+        if snapshot is not None:
+            self.load(bytes(snapshot.data))
+
+    def _ensure_saver(self):
+        if self._saver is not None:
+            return
+        with self._lock:
+            if self._saver is None:
+                self._saver = threading.Thread(
+                    target=self._run_saver, name="trend-snapshots", daemon=True
+                )
+                self._saver.start()
+
+    def _run_saver(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            if self._dirty:
+                self.save_quietly()
+                close_old_connections()
+
+    def save_quietly(self):
+        if not self._dirty:
+            return
+        try:
+            self.save()
+        except DatabaseError:
+            pass
+
+
+trends = Trends(
+    width=getattr(settings, "TRENDS_SKETCH_WIDTH", 1024),
+    depth=getattr(settings, "TRENDS_SKETCH_DEPTH", 4),
+    capacity=getattr(settings, "TRENDS_CANDIDATES", 100),
+    snapshot_interval=getattr(settings, "TRENDS_SNAPSHOT_INTERVAL", 60.0),
+)
+atexit.register(trends.save_quietly)
@@ -16,6 +16,11 @@ from .rest.views import (
     ProfileViewSet,
     NewsFeedViewSet,
     ReplyViewSet,
+    TrendsView,
+    CacheStatsView,
+    NewsfeedPipelineStatsView,
+    JobStatsView,
+    OutboundMessageView,
     ChoiceViewSet,
     QuestionViewSet,
     UserFollowView,
@@ -59,12 +64,19 @@ urlpatterns = [
     path("replies/unlike/<int:reply_id>/", view=UserUnLikeReplyView.as_view()),
     path("votes/", view=ListVoteView.as_view()),
     path("likes/", view=LikesView.as_view()),
+    path("trends/", view=TrendsView.as_view()),
+    path("cache-stats/", view=CacheStatsView.as_view()),
+    path("newsfeed-stats/", view=NewsfeedPipelineStatsView.as_view()),
+    path("job-stats/", view=JobStatsView.as_view()),
     path("choices/vote/<int:choice_id>/", view=VoteView.as_view()),
     path("choices/unvote/<int:choice_id>/", view=UnVoteView.as_view()),
     path("twilio/message/", view=TwilioMessagesView.as_view(), name="send_message"),
     path("twilio/email/", view=TwilioEmailsView.as_view(), name="send_email"),
     path("twilio/email/v2/", view=TwilioEmails2View.as_view(), name="send_email_v2"),
     path("twilio/email/v3/", view=TwilioEmails3View.as_view(), name="send_email_v3"),
+    path(
+        "outbox/<int:pk>/", view=OutboundMessageView.as_view(), name="outbound_message"
+    ),
     path("api/token/", view=MyObtainTokenPairView.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", view=TokenRefreshView.as_view(), name="token_refresh"),
     path("api/token/verify/", view=TokenVerifyView.as_view(), name="token_verify"),
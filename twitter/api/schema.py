@@ -1,6 +1,12 @@
 import strawberry
 from accounts.graphql.schema import Query as AccountQuery
 from accounts.graphql.schema import Mutation as AccountMutation
+from accounts.graphql.schema import Subscription as AccountSubscription
+from accounts.graphql.extensions import (
+    DocumentCacheExtension,
+    IdentityMapExtension,
+    QueryCostExtension,
+)
 
 
 @strawberry.type
@@ -13,4 +19,14 @@ class Mutation(AccountMutation):
     pass
 
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+@strawberry.type
+class Subscription(AccountSubscription):
+    pass
+
+
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    subscription=Subscription,
+    extensions=[DocumentCacheExtension, QueryCostExtension, IdentityMapExtension],
+)
@@ -0,0 +1,162 @@
+import json
+from dataclasses import dataclass, field
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from strawberry.django.context import StrawberryDjangoContext
+from starlette.websockets import WebSocket
+from strawberry.asgi import GraphQL
+from strawberry.django.views import AsyncGraphQLView, TemporalHttpResponse
+from strawberry.types.graphql import OperationType
+from accounts import identity
+from accounts.graphql import persisted
+from accounts.graphql.loaders import Loaders, in_thread
+from accounts.graphql.schema import get_payload_from_token
+from accounts.models import User
+
+
+@dataclass
+class GraphQLContext(StrawberryDjangoContext):
+    loaders: Loaders = field(default_factory=Loaders)
+
+
+class GraphQLView(AsyncGraphQLView):
+    @method_decorator(csrf_exempt)
+    async def dispatch(self, request, *args, **kwargs):
+        data = self.read_body(request)
+        if isinstance(data, list):
+            return await self.execute_batch(request, data)
+        if isinstance(data, dict):
+            try:
+                request.graphql_data = await in_thread(persisted.resolve)(data)
+            except persisted.PersistedQueryError as error:
+                return JsonResponse(error.as_response_data(), status=error.status)
+        return await super().dispatch(request, *args, **kwargs)
+
+    def read_body(self, request):
+        if not self.is_request_allowed(request) or self.should_render_graphiql(request):
+            return None
+        try:
+            return self.parse_body(request)
+        except json.JSONDecodeError:
+            # left for the base view to reject
+            return None
+
+    async def execute_batch(self, request, operations):
+        """
+        Run a list of operations under one context, so they share its
+        loaders and identity map, and answer with a list of their results.
+        Operations run one after another in list order, so a mutation sees
+        the effects of those before it.
+        """
+        max_size = getattr(settings, "GRAPHQL_MAX_BATCH_SIZE", 10)
+        if request.method != "POST" or not 0 < len(operations) <= max_size:
+            return JsonResponse(
+                {"errors": [{"message": f"Batches take 1 to {max_size} operations."}]},
+                status=400,
+            )
+        sub_response = TemporalHttpResponse()
+        context = await self.get_context(request, response=sub_response)
+        root_value = await self.get_root_value(request)
+        results = []
+        with identity.scope():
+            for data in operations:
+                results.append(
+                    await self.execute_operation(request, data, context, root_value)
+                )
+        response = JsonResponse(
+            results,
+            safe=False,
+            encoder=self.json_encoder,
+            json_dumps_params=self.json_dumps_params,
+        )
+        for name, value in sub_response.items():
+            response[name] = value
+        if sub_response.status_code is not None:
+            response.status_code = sub_response.status_code
+        for name, value in sub_response.cookies.items():
+            response.cookies[name] = value
+        return response
+
+    async def execute_operation(self, request, data, context, root_value):
+        try:
+            if isinstance(data, dict):
+                data = await in_thread(persisted.resolve)(data)
+        except persisted.PersistedQueryError as error:
+            return error.as_response_data()
+        if not isinstance(data, dict) or data.get("query") is None:
+            return {"errors": [{"message": "No GraphQL query found in the request"}]}
+        result = await self.schema.execute(
+            data["query"],
+            root_value=root_value,
+            variable_values=data.get("variables"),
+            context_value=context,
+            operation_name=data.get("operationName"),
+            allowed_operation_types=OperationType.from_http("POST"),
+        )
+        return await self.process_result(request=request, result=result)
+
+    def parse_body(self, request):
+        if hasattr(request, "graphql_data"):
+            return request.graphql_data
+        return super().parse_body(request)
+
+    async def get_context(self, request, response):
+        return GraphQLContext(request=request, response=response)
+
+
+def socket_user(scope):
+    """
+    The user opening a WebSocket: from a createJwt token, sent as an
+    `Authorization: Bearer` header or, for browsers that can't set one,
+    the `token` query parameter, or else from the Django session cookie.
+    """
+    headers = {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in scope.get("headers", [])
+    }
+    query = parse_qs(scope.get("query_string", b"").decode())
+    token = query.get("token", [""])[0]
+    authorization = headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer ") :]
+    if token:
+        try:
+            email = get_payload_from_token(token).get("email")
+        except ValidationError:
+            return AnonymousUser()
+        return User.objects.filter(email=email, is_active=True).first() or (
+            AnonymousUser()
+        )
+    cookie = SimpleCookie(headers.get("cookie", "")).get(settings.SESSION_COOKIE_NAME)
+    if cookie is None:
+        return AnonymousUser()
+    session = import_module(settings.SESSION_ENGINE).SessionStore(cookie.value)
+    return get_user(SimpleNamespace(session=session))
+
+
+class GraphQLWebSocketApp(GraphQL):
+    """
+    Serves subscriptions over WebSocket next to Django's HTTP views, see
+    twitter/asgi.py. A connection is authenticated as it opens and refused
+    without a user; subscriptions then follow `request.user`.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            scope["user"] = await in_thread(socket_user)(scope)
+            if not scope["user"].is_authenticated:
+                await WebSocket(scope, receive, send).close(code=4401)
+                return
+        await super().__call__(scope, receive, send)
+
+    async def get_context(self, request, response=None):
+        return GraphQLContext(request=request, response=response)
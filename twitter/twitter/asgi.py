@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "twitter.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.schema import schema  # noqa: E402, needs the apps loaded above
+from api.views import GraphQLWebSocketApp  # noqa: E402
+
+graphql_websockets = GraphQLWebSocketApp(schema)
+
+
+async def application(scope, receive, send):
+    # GraphQL subscriptions arrive as WebSockets, everything else is Django
+    if scope["type"] == "websocket":
+        return await graphql_websockets(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -48,14 +48,11 @@ INSTALLED_APPS = [
     "django",
     "rest_framework",
     "strawberry.django",
-    "mptt",
     "rest_framework_simplejwt",
     "accounts",
     "social_django",
 ]
 
-os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
-
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -64,6 +61,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "accounts.middleware.IdentityMapMiddleware",
 ]
 
 REST_FRAMEWORK = {
@@ -141,6 +139,85 @@ EMAIL_HOST_USER = 'apikey'
 EMAIL_HOST_PASSWORD = os.environ.get('SENDGRID_API_KEY')
 
 FROM_EMAIL_SENDGRID = os.environ.get("FROM_EMAIL_SENDGRID")
+
+# like, vote and reply counters are buffered in memory and flushed in batches
+COUNTER_BUFFER_ENABLED = True
+COUNTER_BUFFER_FLUSH_INTERVAL = 1.0
+COUNTER_BUFFER_MAX_PENDING = 500
+
+# trending hashtag windows live in memory and are snapshotted to the database
+TRENDS_SNAPSHOT_INTERVAL = 60.0
+
+# get_*_by_id lookups go through a per-process LRU in front of CACHES["default"];
+# set REDIS_URL so that cache, its invalidations and its rebuild locks are
+# shared between workers, without it each process caches on its own. Other
+# processes may serve a changed row from their LRU for up to L1_TTL seconds
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+ENTITY_CACHE_ENABLED = True
+ENTITY_CACHE_L1_TTL = 5.0
+# left out of cached rows, the cache may be shared with other services
+ENTITY_CACHE_PRIVATE_FIELDS = {"accounts.user": ["password"]}
+
+# subscriptions fan out through the broker, "accounts.broker.DatabaseBackend"
+# shares events between workers
+BROKER_BACKEND = "accounts.broker.LocalBackend"
+
+# GraphQL operations estimated over these limits are rejected unexecuted
+GRAPHQL_MAX_COST = 1000
+GRAPHQL_MAX_DEPTH = 10
+
+# parsed documents are kept per query hash, up to DOCUMENT_CACHE_SIZE of them
+# besides the allow-list; with PERSISTED_QUERIES_ONLY the endpoint only runs
+# queries put in the PersistedQuery table by `register_persisted_queries`,
+# hashes clients register on the fly are never allowed
+GRAPHQL_DOCUMENT_CACHE_SIZE = 500
+GRAPHQL_PERSISTED_QUERIES_ONLY = False
+
+# a POST of a JSON list runs up to this many operations in one request
+GRAPHQL_MAX_BATCH_SIZE = 10
+
+# likes, replies and follows aimed at the same thing within this many seconds
+# share one newsfeed entry naming up to SAMPLE_SIZE of the actors
+INBOX_GROUP_WINDOW = 86400
+INBOX_GROUP_SAMPLE_SIZE = 3
+
+# newsfeed entries are written by `manage.py runworkers` from "newsfeed" jobs
+# queued in the request's transaction, an event failing MAX_ATTEMPTS times is
+# dead lettered, `newsfeed-stats/` reports the queue's depth and lag;
+# IN_PROCESS also drains them from a thread in every web process
+NEWSFEED_PIPELINE_ENABLED = True
+NEWSFEED_PIPELINE_IN_PROCESS = False
+NEWSFEED_PIPELINE_BATCH_SIZE = 200
+NEWSFEED_PIPELINE_INTERVAL = 0.5
+NEWSFEED_PIPELINE_MAX_ATTEMPTS = 3
+
+# `manage.py runworkers` runs Job rows; a job whose worker doesn't finish it
+# within the lease is picked up again, failures retry after BACKOFF_BASE *
+# 2**attempt seconds up to BACKOFF_MAX, and done jobs are kept for RETENTION
+JOBS_LEASE_SECONDS = 300
+JOBS_BACKOFF_BASE = 5
+JOBS_BACKOFF_MAX = 3600
+JOBS_RETENTION = 86400
+
+# the twilio/ endpoints queue messages in the outbox and jobs on the
+# "outbox.<provider>" queues deliver them, point a provider at
+# "accounts.outbox.FakeBackend" to send nowhere
+OUTBOX_BACKENDS = {
+    "twilio": "accounts.outbox.TwilioBackend",
+    "sendgrid": "accounts.outbox.SendGridBackend",
+    "smtp": "accounts.outbox.SMTPBackend",
+}
+OUTBOX_CONCURRENCY = {"twilio": 4, "sendgrid": 4, "smtp": 2}
+OUTBOX_MAX_ATTEMPTS = 5
+# runworkers requeues a message still sending after this many seconds
+OUTBOX_SEND_TIMEOUT = 600
+
 ROOT_URLCONF = "twitter.urls"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/"
@@ -15,8 +15,8 @@ Including another URL conf
 """
 from django.contrib import admin
 from django.urls import path, include
-from strawberry.django.views import GraphQLView
 from api.schema import schema
+from api.views import GraphQLView
 
 
 urlpatterns = [